@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# benchmarks/bench_multi.py
+"""
+Benchmark of concurrent multi-analyzer acquisition. Starts 1 to 16 local fake analyzers in a separate process, polls
+them with one AcquisitionLoop over the HTTP backend and reports throughput, read latency, CPU time and memory of the
+acquisition process.
+
+Run it with:  python benchmarks/bench_multi.py [--period 0.1] [--duration 5] [--latency 0.02]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from xstream.acquisition import AcquisitionLoop  # noqa: E402
+from xstream.backends import HttpBackend, device_name  # noqa: E402
+from xstream.fakeanalyzer import FakeAnalyzer  # noqa: E402
+
+
+def serve_fake_analyzers(count, latency, connection, stop_event):
+    servers = [FakeAnalyzer(latency=latency).start() for _ in range(count)]
+    connection.send([server.login_url for server in servers])
+    stop_event.wait()
+    for server in servers:
+        server.stop()
+
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux), otherwise the peak RSS."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+class TimedBackend(HttpBackend):
+    """HTTP backend that records the duration of every read."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.durations = []
+
+    def read_raw(self):
+        start = time.perf_counter()
+        try:
+            return super().read_raw()
+        finally:
+            self.durations.append(time.perf_counter() - start)
+
+
+def run(count, period, duration, latency):
+    parent_connection, child_connection = multiprocessing.Pipe()
+    stop_event = multiprocessing.Event()
+    process = multiprocessing.Process(target=serve_fake_analyzers,
+                                      args=(count, latency, child_connection, stop_event))
+    process.start()
+    try:
+        urls = parent_connection.recv()
+        backends = {device_name(url): TimedBackend(url, "admin", "admin") for url in urls}
+        for backend in backends.values():
+            backend.connect()
+            backend.durations.clear()
+
+        samples = []
+        lock = threading.Lock()
+
+        def on_sample(sample):
+            with lock:
+                samples.append(sample)
+
+        rss_before = rss_mb()
+        threads_before = threading.active_count()
+        loop = AcquisitionLoop(backends, period, on_sample=on_sample)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        loop.start()
+        time.sleep(duration)
+        threads = threading.active_count() - threads_before
+        loop.stop(wait=True)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        rss = rss_mb()
+        for backend in backends.values():
+            backend.close()
+
+        durations = [d for backend in backends.values() for d in backend.durations]
+        return {
+            "devices": count,
+            "samples_per_s": len(samples) / wall,
+            "target_per_s": count / period,
+            "p50_ms": percentile(durations, 50) * 1000,
+            "p95_ms": percentile(durations, 95) * 1000,
+            "cpu_percent": 100 * cpu / wall,
+            "threads": threads,
+            "rss_mb": rss,
+            "rss_delta_mb": rss - rss_before,
+        }
+    finally:
+        stop_event.set()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-analyzer acquisition benchmark")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--period", type=float, default=0.1, help="polling period in seconds")
+    parser.add_argument("--duration", type=float, default=5.0, help="measuring time per step in seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="response delay of the fake analyzers")
+    args = parser.parse_args()
+
+    print(f"period {args.period} s, device latency {args.latency * 1000:.0f} ms, {args.duration} s per step")
+    print(f"{'devices':>7} {'samples/s':>10} {'target/s':>9} {'p50 ms':>7} {'p95 ms':>7} {'CPU %':>6} "
+          f"{'threads':>7} {'RSS MB':>7} {'dRSS MB':>8}")
+    for count in args.devices:
+        result = run(count, args.period, args.duration, args.latency)
+        print(f"{result['devices']:>7} {result['samples_per_s']:>10.1f} {result['target_per_s']:>9.1f} "
+              f"{result['p50_ms']:>7.2f} {result['p95_ms']:>7.2f} {result['cpu_percent']:>6.1f} "
+              f"{result['threads']:>7} {result['rss_mb']:>7.1f} {result['rss_delta_mb']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of the acquisition pipeline. A recording is replayed through the same path as a live run,
+ReplayBackend -> AcquisitionLoop -> MainWindow.handle_sample (live values, plot) -> recorders, and the latency of
+every stage is reported as percentiles together with the sustained number of samples per second:
+
+    parse        parsing of the bottom line on the acquisition thread
+    queue        from the read to the start of handle_sample on the GUI thread
+    plot         DevicePanel.update_plot, one redraw for all samples of a frame (see --max-fps)
+    persistence  from the read until the row has been written and flushed by the recorder thread
+    end-to-end   from the read until handle_sample has finished
+
+Without a recording, a synthetic raw log is generated. With --no-gui the recorders are fed directly from the
+acquisition thread, as in the headless record command.
+
+Run it with:  python benchmarks/bench_pipeline.py [RECORDING] [--samples 20000] [--speed 0] [--formats csv xsb]
+                                                 [--max-fps 10] [--opengl]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_multi import percentile, rss_mb  # noqa: E402
+from xstream.acquisition import AcquisitionLoop  # noqa: E402
+from xstream.fakeanalyzer import bottom_line  # noqa: E402
+from xstream.parser import DEFAULT_CHANNELS, channel_keys  # noqa: E402
+from xstream.recorder import open_recorders  # noqa: E402
+from xstream.replay import ReplayBackend  # noqa: E402
+from xstream.stats import StatisticsStage  # noqa: E402
+
+STAGES = ["parse", "queue", "plot", "persistence", "end-to-end"]
+
+
+class TimedReplay(ReplayBackend):
+    """Replay backend that records the read time of every sample and the duration of every parse."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_times = {}  # Zeitstempel der Messung -> perf_counter beim Lesen
+        self.durations = {stage: [] for stage in STAGES}
+
+    def read_raw(self):
+        raw_text = super().read_raw()
+        self.read_times[self.timestamp()] = time.perf_counter()
+        return raw_text
+
+    def parse(self, raw_text):
+        start = time.perf_counter()
+        result = super().parse(raw_text)
+        self.durations["parse"].append(time.perf_counter() - start)
+        return result
+
+
+def write_synthetic_log(path, samples, start=1.7e9):
+    """Writes a raw bottom-line log with one sample per second."""
+    with open(path, "w", encoding="utf-8", newline="\n") as file:
+        for i in range(samples):
+            timestamp = start + i
+            file.write(f"{timestamp:.3f}\t\t{bottom_line(timestamp).replace('&nbsp;', ' ')}\n")
+
+
+def time_recorders(recorders, backend):
+    """Measures the time from the read of a sample until its row has been flushed."""
+    for recorder in recorders:
+        write_rows, flush = recorder._write_rows, recorder._flush
+        batch = []
+
+        def timed_write_rows(samples, write_rows=write_rows, batch=batch):
+            batch[:] = samples
+            write_rows(samples)
+
+        def timed_flush(flush=flush, batch=batch):
+            flush()
+            now = time.perf_counter()
+            backend.durations["persistence"].extend(now - backend.read_times[sample.timestamp] for sample in batch)
+
+        recorder._write_rows, recorder._flush = timed_write_rows, timed_flush
+
+
+def run_headless(backend, recorders):
+    def on_sample(sample):
+        for recorder in recorders:
+            recorder.write(sample)
+        backend.durations["end-to-end"].append(time.perf_counter() - backend.read_times[sample.timestamp])
+
+    loop = AcquisitionLoop(backend, backend.period, on_sample=on_sample, statistics=StatisticsStage(DEFAULT_CHANNELS))
+    loop.start()
+    while loop.is_running():
+        time.sleep(0.01)
+    loop.stop(wait=True)
+
+
+def run_gui(backend, recorders, max_fps, opengl):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from xstream.views import MainWindow
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow(backend, max_fps=max_fps, opengl=opengl)
+    window.show()  # Verdeckte Fenster werden nicht gezeichnet
+    window.recorders = recorders
+    panel = window.panels[""]
+    update_plot = panel.update_plot
+
+    def timed_update_plot():
+        start = time.perf_counter()
+        update_plot()
+        backend.durations["plot"].append(time.perf_counter() - start)
+
+    panel.update_plot = timed_update_plot
+
+    # Verbunden vor bzw. nach MainWindow.handle_sample, Slots laufen in Verbindungsreihenfolge
+    window.worker.sample_ready.disconnect(window.handle_sample)
+    window.worker.sample_ready.connect(
+        lambda sample: backend.durations["queue"].append(time.perf_counter() - backend.read_times[sample.timestamp]))
+    window.worker.sample_ready.connect(window.handle_sample)
+    window.worker.sample_ready.connect(
+        lambda sample: backend.durations["end-to-end"].append(
+            time.perf_counter() - backend.read_times[sample.timestamp]))
+    window.worker.finished.connect(lambda device, message: app.quit())
+    window.worker.start()
+    app.exec()
+    window.worker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("recording", nargs="?", help=".csv, .xsb or .log recording, default: synthetic raw log")
+    parser.add_argument("--samples", type=int, default=20000, help="samples of the synthetic raw log")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed, 0 for maximum speed")
+    parser.add_argument("--formats", nargs="*", default=["csv", "xsb"], help="recording formats")
+    parser.add_argument("--no-gui", action="store_true", help="without MainWindow, as the headless recorder")
+    parser.add_argument("--max-fps", type=float, default=10.0, help="maximum plot redraws per second")
+    parser.add_argument("--opengl", action="store_true", help="draw the curves with OpenGL")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        recording = args.recording
+        if recording is None:
+            recording = os.path.join(directory, "synthetic.log")
+            write_synthetic_log(recording, args.samples)
+        backend = TimedReplay(recording, speed=args.speed, channels=DEFAULT_CHANNELS)
+        backend.connect()
+        recorders = open_recorders(os.path.join(directory, "bench"), args.formats, channel_keys(DEFAULT_CHANNELS),
+                                   flush_rows=100, flush_interval=1.0)
+        time_recorders(recorders, backend)
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        if args.no_gui:
+            run_headless(backend, recorders)
+        else:
+            run_gui(backend, recorders, args.max_fps, args.opengl)
+        for recorder in recorders:
+            recorder.close()
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+    samples = len(backend.durations["end-to-end"])
+    print(f"{samples} samples of {os.path.basename(recording)} in {elapsed:.2f} s: {samples / elapsed:.0f} samples/s "
+          f"(speed {args.speed or 'max'}, {'headless' if args.no_gui else 'GUI'}, formats {' '.join(args.formats)}, "
+          f"CPU {cpu:.2f} s, RSS {rss_mb():.0f} MB)")
+    print(f"{'stage':<12} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage in STAGES:
+        durations = [1000 * duration for duration in backend.durations[stage]]
+        if not durations:
+            continue
+        print(f"{stage:<12} {len(durations):>7} {percentile(durations, 50):>8.3f} {percentile(durations, 95):>8.3f} "
+              f"{percentile(durations, 99):>8.3f} {max(durations):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
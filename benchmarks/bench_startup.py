@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# benchmarks/bench_startup.py
+"""
+Benchmark of the startup imports. Imports the startup-relevant modules in fresh interpreters with -X importtime and
+reports the median cumulative import time of each module together with the slowest imports it pulls in. Everything
+imported before the splash screen is shown (xstream.main, xstream.splash) should stay small; --budget makes the run
+fail if the modules before the splash exceed the given number of milliseconds.
+
+Run it with:  python benchmarks/bench_startup.py [--repeat 5] [--top 10] [--budget 150]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Module vor dem SplashScreen und die danach nachgeladenen
+BEFORE_SPLASH = ["xstream.main", "xstream.splash"]
+AFTER_SPLASH = ["xstream.backends", "xstream.views", "xstream.cli"]
+
+
+def import_times(module):
+    """
+    Imports the module in a fresh interpreter with -X importtime.
+
+    Returns:
+        Tuple: Cumulative import time of the module in µs and {imported module: cumulative µs} of everything the
+        module pulled in.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+    # Untermodule stehen unmittelbar vor ihrem Elternmodul und sind tiefer eingerückt
+    index = max(i for i, entry in enumerate(entries) if entry[1] == module)
+    depth = entries[index][0]
+    children = {}
+    for indent, name, cumulative in reversed(entries[:index]):
+        if indent <= depth:
+            break
+        children[name] = cumulative
+    return entries[index][2], children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="interpreter runs per module")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports listed per module")
+    parser.add_argument("--budget", type=float, help="maximum ms of the imports before the splash screen")
+    args = parser.parse_args()
+
+    print(f"{'module':<20}{'import ms':>11}   slowest imports (cumulative ms)")
+    before_splash = 0.0
+    for module in BEFORE_SPLASH + AFTER_SPLASH:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        total = statistics.median(run[0] for run in runs) / 1000
+        if module in BEFORE_SPLASH:
+            before_splash = max(before_splash, total)
+        children = runs[-1][1]
+        slowest = sorted(children, key=lambda name: -children[name])[:args.top]
+        print(f"{module:<20}{total:>11.1f}   " + ", ".join(f"{name} {children[name] / 1000:.0f}" for name in slowest))
+
+    if args.budget is not None and before_splash > args.budget:
+        print(f"Imports before the splash screen take {before_splash:.1f} ms, budget {args.budget:.1f} ms.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
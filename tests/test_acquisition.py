@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# tests/test_acquisition.py
+import time
+
+from xstream.acquisition import AcquisitionLoop
+from xstream.backends import AcquisitionBackend, AcquisitionError
+from xstream.connection import RECONNECTING, Backoff
+
+LINE = "Ch1/R4: 0.02 Vol% Ch2/R4: 0.00 Vol% Ch3/R4: 0.01 Vol% Ch4/R4: 0.11 Vol% Ch5/R4: 20.95 Vol%"
+
+
+class FakeBackend(AcquisitionBackend):
+    def __init__(self, parse_error=None):
+        self.parse_error = parse_error
+        self.reads = 0
+
+    def connect(self):
+        pass
+
+    def read_raw(self):
+        self.reads += 1
+        return LINE
+
+    def parse(self, raw_text):
+        if self.parse_error is not None:
+            raise self.parse_error
+        return super().parse(raw_text)
+
+
+def _run(backends, period, seconds):
+    samples, errors = [], []
+    loop = AcquisitionLoop(backends, period, on_sample=samples.append,
+                           on_error=lambda device, error: errors.append((device, str(error))))
+    loop.start()
+    time.sleep(seconds)
+    running = loop.is_running()
+    loop.stop()
+    return samples, errors, running
+
+
+def test_unexpected_error_ends_only_the_failing_device():
+    failing, healthy = FakeBackend(ValueError("boom")), FakeBackend()
+    samples, errors, running = _run({"a": failing, "b": healthy}, 0.02, 0.3)
+    assert running
+    assert errors == [("a", "Unexpected error: ValueError('boom')")]
+    assert failing.reads == 1
+    assert healthy.reads > 3 and len(samples) == healthy.reads
+
+
+def test_unexpected_error_of_the_only_device_stops_the_loop():
+    samples, errors, running = _run({"": FakeBackend(KeyError("x"))}, 0.02, 0.2)
+    assert not running
+    assert len(errors) == 1 and samples == []
+
+
+class LostBackend(FakeBackend):
+    def read_raw(self):
+        raise AcquisitionError("down")
+
+    def reconnect(self):
+        raise AcquisitionError("still down")
+
+
+def test_without_period_a_lost_device_gets_one_gap_per_reconnect_attempt():
+    # Versuche nach 0, 0.2 und 0.6 s; früher entstand je Schleifendurchlauf eine Lücke
+    samples = []
+    loop = AcquisitionLoop({"": LostBackend()}, 0, on_sample=samples.append,
+                           backoff=lambda: Backoff(initial=0.2, factor=2.0, maximum=1.0))
+    loop.start()
+    time.sleep(0.8)
+    loop.stop()
+    gaps = [sample for sample in samples if sample.gap]
+    assert len(gaps) == len(samples)
+    assert 2 <= len(gaps) <= 5
+
+
+def test_a_lost_device_gets_one_gap_per_tick():
+    samples, statuses = [], []
+    loop = AcquisitionLoop({"": LostBackend()}, 0.05, on_sample=samples.append,
+                           on_status=lambda device, state, message: statuses.append(state),
+                           backoff=lambda: Backoff(initial=0.2, factor=2.0, maximum=1.0))
+    loop.start()
+    time.sleep(0.5)
+    loop.stop(wait=True)
+    assert all(sample.gap for sample in samples)
+    assert 6 <= len(samples) <= 12
+    assert statuses == [RECONNECTING]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# tests/test_backends.py
+import pytest
+
+from xstream.backends import AcquisitionError, HttpBackend
+from xstream.fakeanalyzer import FakeAnalyzer, FakeAnalyzerHandler
+
+
+@pytest.fixture
+def analyzer():
+    server = FakeAnalyzer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def connect(analyzer):
+    backends = []
+
+    def create(username="admin", password="admin"):
+        backend = HttpBackend(analyzer.login_url, username, password, timeout=2.0)
+        backends.append(backend)
+        backend.connect()
+        return backend
+
+    yield create
+    for backend in backends:
+        backend.close()
+
+
+def test_reads_the_bottom_line_after_the_login(analyzer, connect):
+    backend = connect()
+    assert backend.frame_url.endswith("/unten.htm") and "session" in backend.cookies
+    result = backend.parser.parse(backend.read_raw())
+    assert result.errors == () and 20.0 < result.values["O2"] < 21.5
+    assert backend.timestamp() is not None
+    # Eine vom Gerät getrennte Keep-Alive-Verbindung wird beim nächsten Lesen neu aufgebaut
+    analyzer.drop_connections()
+    assert backend.parser.parse(backend.read_raw()).errors == ()
+
+
+def test_an_expired_session_is_renewed_by_reconnect(analyzer, connect):
+    backend = connect()
+    session = backend.cookies["session"]
+    analyzer.expire_sessions()
+    with pytest.raises(AcquisitionError, match="session may have expired"):
+        backend.read_raw()
+    backend.reconnect()
+    assert backend.cookies["session"] != session and analyzer.sessions == {backend.cookies["session"]}
+    assert backend.parser.parse(backend.read_raw()).errors == ()
+
+
+def test_wrong_credentials_are_reported(analyzer, connect):
+    with pytest.raises(AcquisitionError, match="Frame \"unten\" not found"):
+        connect(password="wrong")
+    assert analyzer.sessions == set()
+
+
+class _InvalidCookieHandler(FakeAnalyzerHandler):
+    def _redirect(self, location, headers=None):
+        super()._redirect(location, {"Set-Cookie": "sess@ion=1; Path=/"})
+
+
+def test_an_invalid_cookie_is_reported_as_acquisition_error(analyzer, connect):
+    analyzer.RequestHandlerClass = _InvalidCookieHandler
+    with pytest.raises(AcquisitionError, match="Invalid cookie"):
+        connect()
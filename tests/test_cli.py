@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# tests/test_cli.py
+import csv
+import glob
+import signal
+
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.cli import build_parser
+from xstream.parser import DEFAULT_CHANNELS, channel_keys
+from xstream.recorder import CsvRecorder
+
+
+@pytest.fixture(autouse=True)
+def signal_handlers():
+    # record installiert eigene Handler für SIGINT und SIGTERM
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+def _run(*argv):
+    args = build_parser().parse_args(list(argv))
+    return args.func(args)
+
+
+@pytest.mark.parametrize("command", [["record", "--url", "http://127.0.0.1:1/login.htm"], ["report", "."]])
+def test_an_invalid_channel_schema_ends_the_command_with_a_message(tmp_path, command):
+    schema = tmp_path / "channels.json"
+    schema.write_text('[{"key": "CO2"}]', encoding="utf-8")
+    with pytest.raises(SystemExit, match="Invalid channel schema .*channels.json: 'id'"):
+        _run(*command, "--schema", str(schema))
+
+
+def test_a_zero_period_is_rejected_instead_of_replaced_by_the_default(tmp_path):
+    with pytest.raises(SystemExit, match="The period must be positive, got 0.0"):
+        _run("record", "--url", "http://127.0.0.1:1/login.htm", "--period", "0", "--out", str(tmp_path))
+
+
+@pytest.mark.parametrize("isolate", [[], ["--isolate"]])
+def test_an_invalid_url_fails_before_anything_is_recorded(tmp_path, isolate):
+    assert _run("record", "--url", "ftp://analyzer/login.htm", "--out", str(tmp_path), *isolate) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_replay_is_recorded_completely(tmp_path):
+    source = str(tmp_path / "source.csv")
+    recorder = CsvRecorder(source, channel_keys(DEFAULT_CHANNELS))
+    recorder.write_many([Sample(1.7e9 + i, {"CO2": 0.01 * i, "O2": 20.9}) for i in range(50)])
+    recorder.close()
+    out = tmp_path / "out"
+    assert _run("record", "--replay", source, "--speed", "0", "--period", "0", "--out", str(out)) == 0
+    recordings = glob.glob(str(out / "*.csv"))
+    assert len(recordings) == 1
+    with open(recordings[0], newline="") as file:
+        assert len(list(csv.reader(file))) == 51
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# tests/test_connection.py
+import pytest
+
+from xstream.backends import AcquisitionBackend, AcquisitionError
+from xstream.connection import CONNECTED, FAILED, RECONNECTING, Backoff, ConnectionManager
+
+
+class FlakyBackend(AcquisitionBackend):
+    def __init__(self, failures):
+        self.failures = failures
+
+    def reconnect(self):
+        if self.failures:
+            self.failures -= 1
+            raise AcquisitionError("still down")
+
+
+def test_backoff_grows_to_the_maximum_and_resets():
+    backoff = Backoff(initial=0.5, factor=2.0, maximum=3.0)
+    assert [backoff.next_delay() for _ in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    backoff.reset()
+    assert backoff.next_delay() == 0.5
+
+
+def test_reconnect_attempts_follow_the_backoff():
+    manager = ConnectionManager(FlakyBackend(2), Backoff(initial=1.0, factor=2.0, maximum=10.0))
+    manager.lost(AcquisitionError("lost"), now=100.0)
+    assert manager.state == RECONNECTING and manager.due(now=100.0)
+    assert not manager.try_reconnect()
+    assert not manager.due(now=manager._next_attempt - 0.01)
+    assert not manager.try_reconnect()
+    assert manager.try_reconnect()
+    assert manager.state == CONNECTED and manager.attempts == 3 and manager.outage() == 0.0
+
+
+def test_gives_up_after_the_limit():
+    manager = ConnectionManager(FlakyBackend(10), give_up_after=0.0)
+    manager.lost(AcquisitionError("lost"))
+    with pytest.raises(AcquisitionError):
+        manager.try_reconnect()
+    assert manager.state == FAILED
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# tests/test_decimation.py
+import numpy as np
+
+from xstream.decimation import MinMaxPyramid
+
+
+def _pyramid(count, factor=4, levels=4):
+    pyramid = MinMaxPyramid(["a"], factor=factor, levels=levels)
+    values = np.sin(np.arange(count) / 7.0) * 10
+    for i, value in enumerate(values):
+        pyramid.append(float(i), {"a": value})
+    return pyramid, values
+
+
+def test_small_ranges_are_returned_at_full_resolution():
+    pyramid, values = _pyramid(100)
+    x, y = pyramid.query(10, 20, max_points=1000)
+    assert x.tolist() == list(range(9, 22))
+    np.testing.assert_allclose(y["a"], values[9:22], rtol=1e-6)
+
+
+def test_decimated_query_keeps_extremes_and_the_point_limit():
+    pyramid, values = _pyramid(4096)
+    x, y = pyramid.query(0, 4095, max_points=200)
+    assert len(x) <= 2 * 200
+    assert np.all(np.diff(x) >= 0)
+    assert y["a"].min() == np.float32(values.min())
+    assert y["a"].max() == np.float32(values.max())
+
+
+def test_raw_and_time_range():
+    pyramid, values = _pyramid(50)
+    assert pyramid.time_range() == (0.0, 49.0)
+    times, rows = pyramid.raw(5, 7)
+    assert times.tolist() == [5.0, 6.0, 7.0]
+    assert rows.shape == (3, 1)
+
+
+def test_empty_pyramid():
+    pyramid = MinMaxPyramid(["a"])
+    assert pyramid.time_range() is None
+    x, y = pyramid.query(0, 10)
+    assert len(x) == 0 and len(y["a"]) == 0
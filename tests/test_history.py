@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# tests/test_history.py
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.history import BLOCK_ROWS, index_path, open_history
+from xstream.recorder import BinaryRecorder, CsvRecorder
+
+CHANNELS = ["CO2", "O2"]
+START = 1.7e9
+
+
+def _record(path, values, devices=None, start=0, recorder_class=CsvRecorder):
+    """Records values[i] (CO2, O2 = -CO2) at START + i seconds, alternating between the devices if given."""
+    recorder = recorder_class(path, CHANNELS, devices=devices, flush_rows=1000)
+    recorder.write_many([Sample(START + i, {"CO2": float(value), "O2": -float(value)},
+                                device=devices[i % len(devices)] if devices else "")
+                         for i, value in enumerate(values, start)])
+    recorder.close()
+    return path
+
+
+@pytest.mark.parametrize("max_points", [50, 3000])
+def test_decimated_queries_keep_the_direction_of_edges(tmp_path, max_points):
+    # 50 Punkte kommen aus der Pyramide der Blöcke, 3000 aus den dezimierten Rohdaten
+    history = open_history(_record(str(tmp_path / "run.csv"), np.arange(10000, 0, -1)), use_cache=False)
+    try:
+        x, y = history.query(START, START + 9999, max_points=max_points)
+        assert len(x) <= 2 * max_points + 4 and np.all(np.diff(x) >= 0)
+        # Fallender Verlauf in CO2, steigender in O2
+        assert np.all(np.diff(y["CO2"]) <= 0) and np.all(np.diff(y["O2"]) >= 0)
+        assert y["CO2"].max() == 10000 and y["CO2"].min() == 1
+    finally:
+        history.close()
+
+
+@pytest.mark.parametrize("rows", [1000, 3000])
+def test_the_index_is_cached_and_extended_when_the_recording_grows(tmp_path, rows):
+    # Auch Aufzeichnungen kleiner als der zur Erkennung benutzte Dateianfang
+    path = _record(str(tmp_path / "run.csv"), np.arange(rows))
+    history = open_history(path)
+    assert not history.from_cache and os.path.exists(index_path(path))
+    history.close()
+    _record(path, np.arange(rows, rows + 500), start=rows)
+    history = open_history(path)
+    try:
+        assert history.from_cache and history.rows == rows + 500
+        assert history.time_range() == (START, START + rows + 499)
+        timestamps, values = history.raw(START + rows - 10, START + rows + 10)
+        assert values[:, 0].tolist() == list(range(rows - 10, rows + 11))
+    finally:
+        history.close()
+
+
+def test_the_index_is_rebuilt_for_a_different_recording(tmp_path):
+    path = _record(str(tmp_path / "run.csv"), np.arange(1000))
+    open_history(path).close()
+    # Gleich große, aber andere Aufzeichnung unter demselben Namen
+    os.remove(path)
+    _record(path, np.arange(1000, 0, -1))
+    history = open_history(path)
+    try:
+        assert not history.from_cache
+        assert history.raw(START, START)[1][0, 0] == 1000
+    finally:
+        history.close()
+
+
+def test_compressed_segments_are_read_and_their_index_cached(tmp_path):
+    path = _record(str(tmp_path / "run.csv"), np.arange(3000))
+    with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    for from_cache in (False, True):
+        history = open_history(path + ".gz")
+        try:
+            assert history.from_cache is from_cache and history.rows == 3000
+            # Ein breiter Bereich kommt aus dem Index, ohne zu entpacken
+            x, y = history.query(START, START + 2999, max_points=100)
+            assert not history._source.loaded and y["CO2"].max() == 2999
+            assert history.raw(START + 2000, START + 2002)[1][:, 0].tolist() == [2000, 2001, 2002]
+            assert history._source.loaded
+        finally:
+            history.close()
+
+
+@pytest.mark.parametrize("recorder_class", [CsvRecorder, BinaryRecorder])
+def test_queries_return_only_the_rows_of_the_device(tmp_path, recorder_class):
+    path = _record(str(tmp_path / ("run." + recorder_class.extension)), np.arange(20 * BLOCK_ROWS), ["a", "b"],
+                   recorder_class=recorder_class)
+    history = open_history(path, use_cache=False)
+    try:
+        assert sorted(history.devices) == ["a", "b"]
+        timestamps, values = history.raw(START, START + 99, device="b")
+        assert values[:, 0].tolist() == list(range(1, 100, 2))
+        x, y = history.query(START, START + 20 * BLOCK_ROWS, device="a", max_points=20)
+        assert y["CO2"].min() == 0 and y["CO2"].max() == 20 * BLOCK_ROWS - 2
+        assert np.all(y["CO2"] % 2 == 0)
+    finally:
+        history.close()
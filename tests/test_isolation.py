@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# tests/test_isolation.py
+import subprocess
+import sys
+import time
+
+import pytest
+
+from xstream.isolation import _RECORD, ProcessTree, SharedRing
+
+
+def test_records_are_returned_in_order():
+    ring = SharedRing(1024)
+    assert ring.put([(1.0, "Ch1/R4: 0.02 Vol%"), (2.0, "Temperatur 23 °C")]) == 2
+    assert ring.get() == [(1.0, "Ch1/R4: 0.02 Vol%"), (2.0, "Temperatur 23 °C")]
+    assert ring.get() == []
+
+
+@pytest.mark.parametrize("size", [61, 64, 70, 75])
+def test_records_are_never_split_at_the_end_of_the_ring(size):
+    # Verschiedene Größen und Längen lassen am Ende 0 bis 11 Bytes frei, also mit und ohne Platz für die Marke
+    ring = SharedRing(size)
+    for i in range(200):
+        records = [(float(i), "x" * (i % 7)), (i + 0.5, "y" * (i % 5 + 3))]
+        assert ring.put(records) == 2
+        assert ring.get() == records
+
+
+def test_a_full_ring_drops_the_remaining_records():
+    ring = SharedRing(3 * (_RECORD.size + 4))
+    assert ring.put([(float(i), "abcd") for i in range(5)]) == 3
+    assert ring.put([(9.0, "abcd")]) == 0
+    assert [timestamp for timestamp, _ in ring.get()] == [0.0, 1.0, 2.0]
+    assert ring.put([(9.0, "abcd")]) == 1
+    assert ring.get() == [(9.0, "abcd")]
+
+
+def test_a_record_larger_than_the_ring_is_dropped():
+    ring = SharedRing(32)
+    assert ring.put([(1.0, "x" * 64), (2.0, "y")]) == 0
+    assert ring.get() == []
+    assert ring.put([(2.0, "y")]) == 1
+    assert ring.get() == [(2.0, "y")]
+
+
+def test_clear_discards_unread_records_and_a_second_view_sees_the_same_ring():
+    ring = SharedRing(256)
+    other = SharedRing(buffer=ring.buffer)
+    ring.put([(1.0, "a"), (2.0, "b")])
+    other.clear()
+    assert ring.get() == []
+    ring.put([(3.0, "c")])
+    assert other.get() == [(3.0, "c")]
+
+
+def _running(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as file:
+            stat = file.read()
+    except OSError:
+        return False
+    return stat[stat.rindex(b")") + 2:stat.rindex(b")") + 3] != b"Z"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+def test_process_tree_includes_and_kills_descendants_in_other_process_groups():
+    # Das Enkelkind bildet wie Chrome eine eigene Prozessgruppe
+    script = ("import os, subprocess, sys, time\n"
+              "child = subprocess.Popen([sys.executable, '-c', 'import os, time; os.setpgid(0, 0); time.sleep(60)'])\n"
+              "print(child.pid, flush=True)\n"
+              "time.sleep(60)\n")
+    process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, start_new_session=True)
+    try:
+        grandchild = int(process.stdout.readline())
+        tree = ProcessTree(process.pid)
+        assert set(tree.pids()) == {process.pid, grandchild}
+        assert tree.rss() > 0
+        tree.close()
+        process.wait(5)
+        deadline = time.monotonic() + 5
+        while _running(grandchild) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _running(grandchild)
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# tests/test_journal.py
+import csv
+import os
+
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.journal import _HEADER, Journal, find_unfinished, finish, journal_path, read_journal, resume
+from xstream.recorder import open_recorders
+
+CHANNELS = ["CO2", "O2"]
+
+
+def _samples(count, start=0):
+    return [Sample(1.7e9 + i, {"CO2": 0.01 * i, "O2": 20.9}) for i in range(start, start + count)]
+
+
+def _crash(journal):
+    # Wie ein Absturz: das Journal wird weder abgeschlossen noch gelöscht
+    journal._stop_event.set()
+    journal._thread.join()
+    journal.commit()
+    journal._file.close()
+
+
+def _start(base, samples, recorded, formats=("csv",)):
+    """Journals all samples, but hands only the first `recorded` to the recorders."""
+    recorders = open_recorders(base, list(formats), CHANNELS)
+    journal = Journal(base, recorders, commit_interval=60)
+    for i, sample in enumerate(samples):
+        journal.append(sample)
+        if i < recorded:
+            for recorder in recorders:
+                recorder.write(sample)
+    for recorder in recorders:
+        recorder.close()
+    return journal
+
+
+def _csv_rows(base):
+    with open(base + ".csv", newline="") as file:
+        return list(csv.reader(file))[1:]
+
+
+def test_clean_stop_deletes_the_journal(tmp_path):
+    base = str(tmp_path / "run")
+    samples = _samples(5)
+    _start(base, samples, len(samples)).close()
+    assert not os.path.exists(journal_path(base))
+    assert find_unfinished(str(tmp_path)) == []
+
+
+def test_resume_writes_the_samples_the_recordings_are_missing(tmp_path):
+    base = str(tmp_path / "run")
+    _crash(_start(base, _samples(10), 3, formats=("csv", "xsb")))
+    assert find_unfinished(str(tmp_path)) == [journal_path(base)]
+    run = resume(journal_path(base), tail=4)
+    assert run.recovered == 7
+    assert [sample.timestamp for sample in run.samples] == [sample.timestamp for sample in _samples(4, 6)]
+    # Der fortgesetzte Lauf nummeriert weiter
+    for sample in _samples(2, 10):
+        run.journal.append(sample)
+        for recorder in run.recorders:
+            recorder.write(sample)
+    for recorder in run.recorders:
+        recorder.close()
+    run.journal.close()
+    assert len(_csv_rows(base)) == 12
+    assert all(recorder.rows_written == 12 for recorder in run.recorders)
+    assert not os.path.exists(journal_path(base))
+
+
+def test_a_torn_last_record_is_dropped(tmp_path):
+    base = str(tmp_path / "run")
+    journal = _start(base, _samples(6), 0)
+    _crash(journal)
+    path = journal._segment_path(0)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 3)
+    _, records = read_journal(journal_path(base))
+    assert [sequence for sequence, _ in records] == [0, 1, 2, 3, 4]
+    assert finish(journal_path(base)) == 5
+    assert len(_csv_rows(base)) == 5
+
+
+def test_a_corrupt_record_ends_the_segment(tmp_path):
+    base = str(tmp_path / "run")
+    journal = _start(base, _samples(6), 0)
+    _crash(journal)
+    path = journal._segment_path(0)
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+    # Ein Byte in der Nutzlast des dritten Datensatzes ändern, die CRC passt nicht mehr
+    position = 0
+    for _ in range(2):
+        position += _HEADER.size + _HEADER.unpack_from(data, position)[0]
+    data[position + _HEADER.size] ^= 0xFF
+    with open(path, "wb") as file:
+        file.write(data)
+    _, records = read_journal(journal_path(base))
+    assert [sequence for sequence, _ in records] == [0, 1]
+
+
+def test_only_needed_segments_are_kept(tmp_path):
+    base = str(tmp_path / "run")
+    recorders = open_recorders(base, ["csv"], CHANNELS)
+    journal = Journal(base, recorders, commit_interval=60, keep=5, segment_records=4)
+    for sample in _samples(20):
+        journal.append(sample)
+        recorders[0].write(sample)
+    recorders[0].close()
+    journal.commit()
+    _, records = read_journal(journal_path(base))
+    # Die Segmente ab 12 enthalten die letzten fünf Datensätze
+    assert records[0][0] == 12 and records[-1][0] == 19
+    journal.close()
+    assert not os.path.exists(journal_path(base))
+
+
+@pytest.mark.parametrize("count", [0, 3])
+def test_finish_without_missing_samples(tmp_path, count):
+    base = str(tmp_path / "run")
+    _crash(_start(base, _samples(count), count))
+    assert finish(journal_path(base)) == 0
+    assert len(_csv_rows(base)) == count
+    assert not os.path.exists(journal_path(base))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# tests/test_parser.py
+import math
+
+from xstream.parser import BottomLineParser, Channel
+
+LINE = "Ch1/R4: 0.02 Vol% Ch2/R4: 0.00 Vol% Ch3/R4: 0.01 Vol% Ch4/R4: 0.11 Vol% Ch5/R4: 20.95 Vol%"
+
+
+def test_parses_all_default_channels():
+    result = BottomLineParser().parse(LINE)
+    assert result.values == {"CO2": 0.02, "CO": 0.0, "CH4": 0.01, "H2": 0.11, "O2": 20.95}
+    assert result.errors == ()
+
+
+def test_reports_invalid_missing_and_wrong_unit_without_raising():
+    result = BottomLineParser().parse("Ch1/R4: ---- Vol% Ch2/R4: 0.00 ppm Ch3/R4: 0.01 Vol% Ch4/R4: 0.11 Vol%")
+    assert result.values == {"CH4": 0.01, "H2": 0.11}
+    assert len(result.errors) == 3
+    assert any("CO2" in error and "invalid" in error for error in result.errors)
+    assert any("CO)" in error and "unit" in error for error in result.errors)
+    assert any("O2" in error and "missing" in error for error in result.errors)
+
+
+def test_empty_and_none_lines_report_every_channel_missing():
+    for line in ("", None):
+        result = BottomLineParser().parse(line)
+        assert result.values == {}
+        assert len(result.errors) == 5
+
+
+def test_custom_schema_ignores_unknown_channels():
+    channels = (Channel(2, "CO", "ppm"), Channel(7, "NO", "ppm"))
+    result = BottomLineParser(channels).parse("Ch1/R4: 0.02 Vol% Ch2/R1: 12 ppm Ch7/R1: -1.5e1 ppm")
+    assert result.values == {"CO": 12.0, "NO": -15.0}
+    assert result.errors == ()
+
+
+def test_values_without_spaces_between_tokens():
+    result = BottomLineParser().parse("Ch1/R4:0.02Vol%Ch2/R4:0.00Vol%Ch3/R4:0.01Vol%Ch4/R4:0.11Vol%Ch5/R4:20.95Vol%")
+    assert result.values["O2"] == 20.95
+    assert result.errors == ()
+
+
+def test_parse_many_matches_parse():
+    lines = [LINE, "Ch1/R4: ---- Vol% Ch5/R4: 21.0 Vol%", ""]
+    parser = BottomLineParser()
+    table = parser.parse_many(lines)
+    assert table.shape == (3, 5)
+    for row, line in zip(table, lines):
+        values = parser.parse(line).values
+        for column, key in enumerate(parser.keys):
+            if key in values:
+                assert row[column] == values[key]
+            else:
+                assert math.isnan(row[column])
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# tests/test_recorder.py
+import csv
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.history import open_history
+from xstream.recorder import (BinaryRecorder, CsvRecorder, RecorderError, export_csv, export_range, format_timestamp,
+                              manifest_path, open_recorders, parse_timestamp, read_manifest)
+from xstream.replay import load_recording
+
+CHANNELS = ["CO2", "O2"]
+
+
+def test_unexpected_write_error_is_reported_instead_of_ending_the_thread(tmp_path):
+    recorder = CsvRecorder(str(tmp_path / "run.csv"), CHANNELS, flush_rows=1)
+    recorder.write(Sample("not a timestamp", {"CO2": 0.1}))
+    deadline = time.monotonic() + 5
+    while recorder.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Der Thread läuft weiter und wartet auf die nächste Messung
+    assert recorder._thread.is_alive()
+    assert isinstance(recorder.error, TypeError)
+    with pytest.raises(RecorderError):
+        recorder.write(Sample(1.7e9, {"CO2": 0.1}))
+    recorder.close()
+
+
+def test_continues_a_recording_with_the_same_header(tmp_path):
+    path = str(tmp_path / "run.csv")
+    for timestamp in (1.7e9, 1.7e9 + 1):
+        recorder = CsvRecorder(path, CHANNELS)
+        recorder.write(Sample(timestamp, {"CO2": 0.1, "O2": 20.9}))
+        recorder.close()
+    recorder = CsvRecorder(path, CHANNELS)
+    recorder.close()
+    assert recorder.rows_written == 2
+
+
+@pytest.mark.parametrize("options", [{"channels": ["CO2", "CO"]}, {"channels": CHANNELS, "devices": ["a", "b"]}])
+def test_refuses_to_append_under_a_different_header(tmp_path, options):
+    path = str(tmp_path / "run.csv")
+    CsvRecorder(path, CHANNELS).close()
+    with pytest.raises(RecorderError):
+        CsvRecorder(path, **options)
+
+
+def _record(base, formats, timestamps):
+    recorders = open_recorders(base, formats, CHANNELS)
+    for i, timestamp in enumerate(timestamps):
+        for recorder in recorders:
+            recorder.write(Sample(timestamp, {"CO2": 0.01 * i, "O2": 20.9}))
+    for recorder in recorders:
+        recorder.close()
+
+
+def test_csv_timestamps_round_trip_to_milliseconds(tmp_path):
+    base = str(tmp_path / "run")
+    timestamps = [1.7e9 + 0.25 * i for i in range(8)]
+    _record(base, ["csv", "xsb"], timestamps)
+    with open(base + ".csv", newline="") as file:
+        rows = list(csv.reader(file))[1:]
+    assert rows[1][0] == format_timestamp(timestamps[1]) and rows[1][0].endswith(".250")
+    assert len({row[0] for row in rows}) == len(timestamps)
+    assert load_recording(base + ".csv")[0] == pytest.approx(timestamps, abs=1e-3)
+    export_csv(base + ".xsb", str(tmp_path / "export.csv"))
+    assert load_recording(str(tmp_path / "export.csv"))[0] == pytest.approx(timestamps, abs=1e-3)
+
+
+def test_history_keeps_the_milliseconds(tmp_path):
+    base = str(tmp_path / "run")
+    timestamps = [1.7e9 + 0.1 * i for i in range(20)]
+    _record(base, ["csv"], timestamps)
+    history = open_history(base + ".csv", use_cache=False)
+    try:
+        assert history.time_range() == pytest.approx((timestamps[0], timestamps[-1]), abs=1e-3)
+    finally:
+        history.close()
+
+
+def test_parse_timestamp_accepts_whole_seconds_of_older_recordings():
+    assert parse_timestamp("2024-11-20 12:00:00.250") - parse_timestamp("2024-11-20 12:00:00") == pytest.approx(0.25)
+    with pytest.raises(ValueError):
+        parse_timestamp("20.11.2024 12:00")
+
+
+def _segmented(path, batches, recorder_class=CsvRecorder, **options):
+    """Records every batch of timestamps as one flush and returns the manifest."""
+    recorder = recorder_class(path, CHANNELS, flush_rows=1, **options)
+    for timestamps in batches:
+        recorder.write_many([Sample(timestamp, {"CO2": 0.5, "O2": 20.9}) for timestamp in timestamps])
+    recorder.close()
+    assert recorder.error is None
+    return read_manifest(manifest_path(path))
+
+
+def _local(*fields):
+    return datetime(*fields).timestamp()
+
+
+@pytest.mark.parametrize("recorder_class", [CsvRecorder, BinaryRecorder])
+def test_hourly_segments_end_at_the_full_hour(tmp_path, recorder_class):
+    # Eine Messung pro Minute von 9:58 bis 11:01 Ortszeit, die zweite Stunde in einem einzigen Stapel
+    timestamps = [_local(2024, 11, 20, 9, 58) + 60 * i for i in range(64)]
+    path = str(tmp_path / ("run." + recorder_class.extension))
+    manifest = _segmented(path, [timestamps[:2], timestamps[2:62], timestamps[62:]], recorder_class,
+                          rotate_interval="hourly")
+    segments = manifest["segments"]
+    assert [segment["file"] for segment in segments] == [
+        f"run_{i:04d}.{recorder_class.extension}" for i in (1, 2, 3)]
+    assert [segment["rows"] for segment in segments] == [2, 60, 2]
+    assert segments[1]["start"] == _local(2024, 11, 20, 10) and segments[1]["end"] == _local(2024, 11, 20, 10, 59)
+    assert all(segment["closed"] and segment["bytes"] == os.path.getsize(segment["path"]) for segment in segments)
+    assert not os.path.exists(path)
+
+
+def test_daily_segments_end_at_midnight(tmp_path):
+    timestamps = [_local(2024, 11, 20, 22) + 1800 * i for i in range(8)]
+    segments = _segmented(str(tmp_path / "run.csv"), [timestamps], rotate_interval="daily")["segments"]
+    assert [(segment["rows"], segment["start"]) for segment in segments] == [
+        (4, timestamps[0]), (4, _local(2024, 11, 21))]
+
+
+def test_size_rotation_starts_a_new_segment_after_the_limit(tmp_path):
+    # Die Größe wird vor jedem Stapel geprüft, ein Stapel wird nie geteilt
+    batches = [[1.7e9 + 10 * i + j for j in range(10)] for i in range(5)]
+    segments = _segmented(str(tmp_path / "run.csv"), batches, rotate_size=500)["segments"]
+    assert [segment["rows"] for segment in segments] == [20, 20, 10]
+    assert all(segment["bytes"] >= 500 for segment in segments[:-1])
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_closed_segments_are_compressed(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    suffix = {"gzip": ".gz", "zstd": ".zst"}[compression]
+    timestamps = [_local(2024, 11, 20, 9, 30) + 60 * i for i in range(90)]
+    path = str(tmp_path / "run.xsb")
+    segments = _segmented(path, [timestamps], BinaryRecorder, rotate_interval="hourly",
+                          compression=compression)["segments"]
+    assert [(segment["file"], segment["compression"]) for segment in segments] == [
+        ("run_0001.xsb" + suffix, compression), ("run_0002.xsb" + suffix, compression)]
+    assert sorted(os.listdir(tmp_path)) == ["run.xsb.manifest.json", "run_0001.xsb" + suffix, "run_0002.xsb" + suffix]
+    assert all(segment["bytes"] == os.path.getsize(segment["path"]) for segment in segments)
+    assert export_range(manifest_path(path), str(tmp_path / "export.csv")) == 90
+
+
+def test_the_manifest_survives_reopening_the_recording(tmp_path):
+    path = str(tmp_path / "run.csv")
+    first = [_local(2024, 11, 20, 9, 30) + 60 * i for i in range(40)]
+    _segmented(path, [first], rotate_interval="hourly")
+    # Der nächste Lauf setzt die Aufzeichnung in einem neuen Segment fort
+    recorder = CsvRecorder(path, CHANNELS, flush_rows=1, rotate_interval="hourly")
+    assert recorder.rows_written == 40
+    recorder.write_many([Sample(first[-1] + 60 * i, {"CO2": 0.5}) for i in range(1, 11)])
+    recorder.close()
+    segments = read_manifest(manifest_path(path))["segments"]
+    assert [(segment["file"], segment["rows"]) for segment in segments] == [
+        ("run_0001.csv", 30), ("run_0002.csv", 10), ("run_0003.csv", 10)]
+    assert recorder.rows_written == 50
+    with pytest.raises(RecorderError):
+        CsvRecorder(path, ["CO2"], rotate_interval="hourly")
+
+
+@pytest.mark.parametrize("recorder_class", [CsvRecorder, BinaryRecorder])
+def test_export_range_returns_the_rows_in_the_range(tmp_path, recorder_class):
+    timestamps = [_local(2024, 11, 20, 9) + 60 * i for i in range(180)]
+    path = str(tmp_path / ("run." + recorder_class.extension))
+    manifest = _segmented(path, [timestamps], recorder_class, rotate_interval="hourly", compression="gzip")
+    assert len(manifest["segments"]) == 3
+    destination = str(tmp_path / "export.csv")
+    # Von 9:45 bis 11:15, das mittlere Segment wird ohne Zeitvergleich übernommen
+    assert export_range(manifest_path(path), destination, timestamps[45], timestamps[135]) == 91
+    exported = load_recording(destination)[0]
+    assert exported[0] == pytest.approx(timestamps[45]) and exported[-1] == pytest.approx(timestamps[135])
+    assert export_range(manifest_path(path), destination, stop=timestamps[9]) == 10
+    assert export_range(manifest_path(path), destination, timestamps[-1] + 1) == 0
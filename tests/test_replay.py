@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# tests/test_replay.py
+from datetime import datetime
+
+import pytest
+
+from xstream.backends import AcquisitionError, EndOfData
+from xstream.replay import ReplayBackend
+
+
+def _csv(path, step, count=20, timestamp_format="%Y-%m-%d %H:%M:%S"):
+    with open(path, "w", newline="") as file:
+        file.write("Timestamp,CO2,CO,CH4,H2,O2\n")
+        for i in range(count):
+            file.write(datetime.fromtimestamp(1.7e9 + i * step).strftime(timestamp_format) + ",0.1,0,0,0,20.9\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("step", [0.2, 0.5, 1.0, 2.0])
+def test_period_of_whole_second_timestamps(tmp_path, step):
+    # Ältere Aufzeichnungen mit auf Sekunden gerundeten Zeitstempeln
+    backend = ReplayBackend(_csv(tmp_path / "run.csv", step))
+    backend.connect()
+    assert backend.period == pytest.approx(step, rel=0.25)
+
+
+def test_period_of_millisecond_timestamps_and_speed(tmp_path):
+    backend = ReplayBackend(_csv(tmp_path / "run.csv", 0.25, timestamp_format="%Y-%m-%d %H:%M:%S.%f"), speed=2.0)
+    backend.connect()
+    assert backend.period == pytest.approx(0.125)
+
+
+def test_rejects_samples_without_time_between_them(tmp_path):
+    with pytest.raises(AcquisitionError):
+        ReplayBackend(_csv(tmp_path / "run.csv", 0.0)).connect()
+
+
+def test_replays_every_row_and_ends(tmp_path):
+    backend = ReplayBackend(_csv(tmp_path / "run.csv", 1.0, count=3))
+    backend.connect()
+    assert [backend.read()["O2"] for _ in range(3)] == [20.9] * 3
+    with pytest.raises(EndOfData):
+        backend.read_raw()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# tests/test_report.py
+import csv
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.recorder import BinaryRecorder, CsvRecorder
+from xstream.report import HOUR, HOURLY_FILE, _aggregate, build_report, find_recordings, summarize_recording
+
+GASES = ["CO", "O2"]
+# Beginn einer vollen Stunde
+START = 1.7e9 // HOUR * HOUR
+
+
+def _record(path, rows, devices=("a", "b"), recorder_class=CsvRecorder):
+    """Records rows of (seconds after START, device, CO, O2)."""
+    recorder = recorder_class(path, GASES, devices=list(devices) if devices else None, flush_rows=10000)
+    recorder.write_many([Sample(START + t, {"CO": co, "O2": o2}, device=device or "") for t, device, co, o2 in rows])
+    recorder.close()
+    return path
+
+
+def test_aggregate_groups_rows_by_device_and_hour():
+    rng = np.random.default_rng(1)
+    timestamps = START + np.sort(rng.uniform(0, 3 * HOUR, 500))
+    devices = rng.integers(0, 3, 500)
+    values = rng.normal(1.0, 0.5, (500, 2))
+    values[rng.random((500, 2)) < 0.1] = np.nan
+    durations = rng.uniform(0, 5, 500)
+    thresholds = np.array([1.2, np.nan])
+    buckets = {}
+    # In zwei Abschnitten, die Buckets der Stunde an der Grenze werden zusammengeführt
+    for rows in (slice(0, 250), slice(250, 500)):
+        _aggregate(buckets, timestamps[rows], devices[rows], values[rows], durations[rows], thresholds)
+    hours = np.floor(timestamps / HOUR).astype(np.int64)
+    assert sorted(buckets) == sorted(set(zip(devices.tolist(), hours.tolist())))
+    for (device, hour), bucket in buckets.items():
+        rows = (devices == device) & (hours == hour)
+        assert bucket.seconds == pytest.approx(durations[rows].sum())
+        for gas in range(2):
+            column = values[rows, gas]
+            valid = ~np.isnan(column)
+            assert bucket.counts[gas] == valid.sum()
+            assert bucket.means[gas] == pytest.approx(column[valid].mean())
+            assert bucket.minima[gas] == column[valid].min() and bucket.maxima[gas] == column[valid].max()
+            assert bucket.peak_times[gas] == timestamps[rows][np.nanargmax(column)]
+        assert bucket.above[0] == pytest.approx(durations[rows][values[rows, 0] > 1.2].sum())
+        assert bucket.above[1] == 0
+
+
+def test_time_above_the_threshold_skips_long_gaps(tmp_path):
+    # Gerät a alle 10 s, oberhalb des Grenzwerts von 20 s bis 60 s, danach eine Lücke von 120 s
+    rows = [(t, "a", 2.0 if 20 <= t <= 60 else 0.5, 20.9) for t in range(0, 100, 10)]
+    rows += [(220.0, "a", 3.0, 20.9), (230.0, "a", 0.5, 20.9), (15.0, "b", 5.0, 20.0)]
+    path = _record(str(tmp_path / "run.csv"), sorted(rows, key=lambda row: row[0]))
+    result = summarize_recording(path, GASES + ["H2"], {"CO": 1.0}, max_gap=60.0)
+    buckets = {device: bucket for device, hour, bucket in result["buckets"]}
+    seconds, counts, sums, minima, maxima, peak_times, above = buckets["a"]
+    # Intervalle vor den Messungen bei 20 … 60 s; das nach der Lücke endende zählt nicht
+    assert above == [50.0, 0.0, 0.0]
+    assert seconds == 100.0 and counts == [12, 12, 0]
+    assert maxima[0] == 3.0 and peak_times[0] == START + 220
+    assert maxima[2] is None
+    assert buckets["b"][1] == [1, 1, 0]
+
+
+def test_find_recordings_prefers_the_binary_recording(tmp_path):
+    for name in ("run1.csv", "run1.xsb", "run2.csv.gz", "run3.xsb.zst", "notes.txt", "run2.csv.xsidx"):
+        (tmp_path / name).write_bytes(b"")
+    assert [os.path.basename(path) for path in find_recordings(str(tmp_path))] == [
+        "run1.xsb", "run2.csv.gz", "run3.xsb.zst"]
+
+
+def _table(out):
+    with open(os.path.join(out, HOURLY_FILE), newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def test_report_of_csv_and_binary_recordings_and_the_cache(tmp_path):
+    folder, out = tmp_path / "recordings", str(tmp_path / "report")
+    folder.mkdir()
+    _record(str(folder / "run1.csv"), [(t, "a", 1.0, 20.9) for t in range(0, HOUR, 60)])
+    _record(str(folder / "run2.xsb"), [(HOUR + t, None, 3.0, 20.0) for t in range(0, 600, 60)], devices=None,
+            recorder_class=BinaryRecorder)
+    _record(str(folder / "run3.csv"), [(2 * HOUR, "a", 2.0, 20.5)])
+    with open(folder / "run3.csv", "rb") as source, gzip.open(folder / "run3.csv.gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    os.remove(folder / "run3.csv")
+
+    assert build_report(str(folder), out, GASES, {"CO": 2.5}, jobs=1) == (3, 0)
+    rows = [(row["Device"], row["Gas"], row["Samples"], row["Mean"], row["Above (s)"]) for row in _table(out)]
+    assert rows == [("a", "CO", "60", "1", "0.0"), ("a", "O2", "60", "20.9", ""),
+                    ("", "CO", "10", "3", "540.0"), ("", "O2", "10", "20", ""),
+                    ("a", "CO", "1", "2", "0.0"), ("a", "O2", "1", "20.5", "")]
+    # Unveränderte Aufzeichnungen kommen aus dem Cache, eine gewachsene wird neu gelesen
+    assert build_report(str(folder), out, GASES, {"CO": 2.5}, jobs=1) == (0, 3)
+    _record(str(folder / "run1.csv"), [(HOUR - 30, "a", 4.0, 20.9)])
+    assert build_report(str(folder), out, GASES, {"CO": 2.5}, jobs=1) == (1, 2)
+    assert _table(out)[0]["Samples"] == "61" and _table(out)[0]["Max"] == "4"
+    # Andere Grenzwerte machen den ganzen Cache ungültig
+    assert build_report(str(folder), out, GASES, {"CO": 1.5}, jobs=2) == (3, 0)
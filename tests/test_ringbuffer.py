@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# tests/test_ringbuffer.py
+import math
+
+import numpy as np
+
+from xstream.ringbuffer import RingBuffer
+
+
+def test_keeps_the_newest_samples_in_order_after_wrapping():
+    buffer = RingBuffer(4, ["a", "b"])
+    for i in range(10):
+        buffer.append(float(i), {"a": i, "b": -i})
+    assert len(buffer) == 4
+    assert buffer.times().tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert buffer.column("b").tolist() == [-6.0, -7.0, -8.0, -9.0]
+    assert buffer.times(last=2).tolist() == [8.0, 9.0]
+
+
+def test_views_are_contiguous_at_every_fill_level():
+    buffer = RingBuffer(5, ["a"])
+    for i in range(13):
+        buffer.append(float(i), {"a": i})
+        times = buffer.times()
+        assert times.flags["C_CONTIGUOUS"]
+        assert times.tolist() == [float(t) for t in range(max(i - 4, 0), i + 1)]
+
+
+def test_missing_channels_are_nan_and_latest_returns_the_newest_row():
+    buffer = RingBuffer(3, ["a", "b"])
+    assert buffer.latest() is None
+    buffer.append(1.0, {"a": 1.0})
+    timestamp, values = buffer.latest()
+    assert timestamp == 1.0 and values["a"] == 1.0 and math.isnan(values["b"])
+
+
+def test_extend_keeps_only_the_last_capacity_rows():
+    buffer = RingBuffer(3, ["a"])
+    buffer.extend(np.arange(5.0), np.arange(5.0).reshape(-1, 1))
+    assert buffer.times().tolist() == [2.0, 3.0, 4.0]
+    buffer.clear()
+    assert len(buffer) == 0
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# tests/test_stats.py
+import random
+import statistics
+
+import pytest
+
+from xstream.acquisition import Sample
+from xstream.parser import DEFAULT_CHANNELS
+from xstream.stats import AdaptiveRate, AlarmRule, RollingWindow, StatisticsStage
+
+
+def test_rolling_window_matches_a_recomputation():
+    rng = random.Random(1)
+    window = RollingWindow(10.0)
+    history = []
+    for i in range(1000):
+        t, v = 1.7e9 + 0.5 * i, 400 + rng.gauss(0, 5) + 0.01 * i
+        window.add(t, v)
+        history.append((t, v))
+        if i % 97 == 0 or i == 999:
+            values = [value for time, value in history if time > t - 10.0]
+            assert len(window) == len(values)
+            assert window.mean == pytest.approx(statistics.fmean(values))
+            assert window.min == min(values) and window.max == max(values)
+            if len(values) > 1:
+                assert window.std == pytest.approx(statistics.stdev(values))
+
+
+def test_rolling_window_slope():
+    window = RollingWindow(60.0)
+    assert window.slope is None
+    for i in range(30):
+        window.add(1.7e9 + i, 2.0 + 0.5 * i)
+    assert window.slope == pytest.approx(0.5)
+    single = RollingWindow(60.0)
+    single.add(0.0, 1.0)
+    assert single.std is None and single.slope is None
+
+
+def _alarms(stage, values):
+    events = []
+    for i, value in enumerate(values):
+        sample = stage.process(Sample(1.7e9 + i, {"O2": value}))
+        events += [(i, event.active) for event in sample.alarms]
+    return events
+
+
+def test_low_alarm_is_cleared_only_above_the_hysteresis():
+    stage = StatisticsStage(DEFAULT_CHANNELS, rules=(AlarmRule("O2", "low", 19.5, hysteresis=0.2),))
+    # Flattern um den Grenzwert löst keine weiteren Meldungen aus
+    events = _alarms(stage, [20.9, 19.4, 19.6, 19.4, 19.65, 19.8, 19.6, 19.3])
+    assert events == [(1, True), (5, False), (7, True)]
+    assert stage.active_alarms() == [stage.rules[0]]
+
+
+def test_alarms_keep_their_state_per_device_and_skip_gaps():
+    stage = StatisticsStage(DEFAULT_CHANNELS, rules=(AlarmRule("O2", "low", 19.5),))
+    assert stage.process(Sample(1.7e9, {"O2": 19.0}, device="a")).alarms[0].active
+    assert stage.process(Sample(1.7e9, device="a", gap=True)).alarms == ()
+    assert stage.process(Sample(1.7e9, {"O2": 20.9}, device="b")).alarms == ()
+    assert [rule.channel for rule in stage.active_alarms("a")] == ["O2"] and stage.active_alarms("b") == []
+
+
+def test_adaptive_rate_speeds_up_at_once_and_slows_down_step_by_step():
+    adaptive = AdaptiveRate(0.25, 2.0, rate={"CO2": 1.0}, hold=10.0)
+    calm, transient = {"CO2_rate": 0.1}, {"CO2_rate": 5.0}
+    assert adaptive.update(0.0, {}, calm) == 0.5
+    periods = [adaptive.update(t, {}, calm) for t in range(10, 60, 10)]
+    assert periods == [1.0, 2.0, 4.0, 4.0, 4.0]
+    assert adaptive.update(61.0, {}, transient) == 0.5
+    assert adaptive.update(65.0, {}, calm) == 0.5
+
+
+def test_adaptive_rate_reacts_to_the_deviation_from_the_ewma():
+    adaptive = AdaptiveRate(0.5, 1.0, deviation={"O2": 0.3}, hold=0.0)
+    assert not adaptive.exceeded({"O2": 20.9}, {"O2_ewma": 20.8})
+    assert adaptive.exceeded({"O2": 20.0}, {"O2_ewma": 20.8})
+    with pytest.raises(ValueError):
+        AdaptiveRate(2.0, 1.0)
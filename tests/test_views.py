@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# tests/test_views.py
+import csv
+import glob
+import os
+import re
+import socket
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("pyqtgraph")
+
+from PyQt6.QtCore import QSettings
+from PyQt6.QtWidgets import QApplication, QDialog
+
+from xstream import views
+from xstream.acquisition import Sample
+from xstream.backends import AcquisitionBackend
+from xstream.journal import journal_path
+
+LINE = "Ch1/R4: 0.02 Vol% Ch2/R4: 0.00 Vol% Ch3/R4: 0.01 Vol% Ch4/R4: 0.11 Vol% Ch5/R4: 20.95 Vol%"
+
+
+class FakeBackend(AcquisitionBackend):
+    def read_raw(self):
+        return LINE
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window_factory(app, tmp_path, monkeypatch):
+    settings = QSettings(str(tmp_path / "settings.ini"), QSettings.Format.IniFormat)
+    errors = []
+    monkeypatch.setattr(views.MainWindow, "show_error_message", lambda self, message: errors.append(message))
+    # Start zeichnet ohne Rückfrage im vorgeschlagenen Verzeichnis als CSV auf
+    monkeypatch.setattr(views.SavePathDialog, "exec", lambda self: QDialog.DialogCode.Accepted)
+    windows = []
+
+    def create(devices=("",), **options):
+        window = views.MainWindow({device: FakeBackend() for device in devices}, settings=settings, **options)
+        windows.append(window)
+        return window
+
+    create.errors = errors
+    yield create
+    for window in windows:
+        window.worker.stop(wait=True)
+        window.stop_recording()
+    assert errors == []
+
+
+def _process_events(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.005)
+
+
+def _rows(path):
+    with open(path, newline="") as file:
+        return len(list(csv.reader(file))) - 1
+
+
+def test_stop_writes_every_journaled_sample_and_finishes_the_run(tmp_path, window_factory):
+    window = window_factory(devices=("a", "b"))
+    window.save_directory = str(tmp_path)
+    window.start_or_stop_acquisition()
+    window.worker.set_period(0.002)
+    # Ohne Ereignisverarbeitung warten alle Messungen noch als Signal, wenn Stop gedrückt wird
+    time.sleep(0.3)
+    journal, path = window.journal, window.csv_file
+    window.start_or_stop_acquisition()
+    assert not window.worker.is_running() and window.recorders == []
+    assert journal.sequence > 10
+    assert _rows(path) == journal.sequence
+    assert not os.path.exists(journal.directory)
+    assert window.unfinished_runs() == []
+
+
+def test_a_crashed_run_is_recovered_from_the_directory_it_was_recorded_to(tmp_path, window_factory):
+    window = window_factory()
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    window.save_directory = str(elsewhere)
+    window.start_or_stop_acquisition()
+    window.worker.set_period(0.02)
+    _process_events(0.3)
+    window.worker.stop(wait=True)
+    journal = window.journal
+    # Absturz: Messungen im Journal, die keine Aufzeichnung mehr erreicht haben
+    for i in range(3):
+        journal.append(Sample(time.time() + i, {"CO2": 0.5}))
+    for recorder in window.recorders:
+        recorder.close()
+    journal._stop_event.set()
+    journal._thread.join()
+    journal.commit()
+    journal._file.close()
+    window.recorders, window.journal = [], None
+
+    # Der nächste Start schlägt ein anderes Verzeichnis vor
+    window.settings.setValue(views.SAVE_DIRECTORY_KEY, str(tmp_path / "default"))
+    recovered = window_factory()
+    assert recovered.save_directory == str(tmp_path / "default")
+    assert [os.path.abspath(recorder.path) for recorder in recovered.recorders] == [os.path.abspath(window.csv_file)]
+    assert int(re.search(r"\((\d+) samples written\)", recovered.status_message).group(1)) >= 3
+    assert recovered.panels[""].data_labels["CO2"].text() == "0.50"
+
+    # Start setzt den Lauf im gewählten Verzeichnis fort, Stop schließt ihn ab
+    recovered.save_directory = str(elsewhere)
+    recovered.start_or_stop_acquisition()
+    _process_events(0.2)
+    sequence = recovered.journal.sequence
+    recovered.start_or_stop_acquisition()
+    assert sequence > journal.sequence and _rows(window.csv_file) == sequence
+    assert glob.glob(str(elsewhere / "*.csv")) == [window.csv_file]
+    assert not os.path.exists(journal_path(os.path.splitext(window.csv_file)[0]))
+    assert recovered.unfinished_runs() == []
+
+
+def test_exporters_on_a_port_in_use_are_skipped(window_factory):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        window = window_factory(metrics_port=port, live_port=port)
+    assert window.metrics_exporters == [] and window.worker.live_server is None
+    assert [message.split(":")[0] for message in window_factory.errors] == [
+        "Cannot export metrics", "Cannot serve live samples"]
+    window_factory.errors.clear()
@@ -2,7 +2,11 @@
 #XSTREAM/xstream.py
 
 '''This module provides xstream entry point script'''
+import multiprocessing
+
 import xstream.main
 
 if __name__ == "__main__":
+    # Im gefrorenen Programm starten Kindprozesse (isolierte Sitzungen, Berichte) über diese Datei
+    multiprocessing.freeze_support()
     xstream.main.main()
\ No newline at end of file
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# xstream/__main__.py
+'''This module provides the entry point for python -m xstream.'''
+import multiprocessing
+import sys
+
+from xstream.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
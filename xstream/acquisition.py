@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# xstream/acquisition.py
+"""
+This module provides the acquisition loop. It polls an acquisition backend on its own thread, parses and timestamps
+every reading and hands finished samples to a callback, so neither the GUI nor the recorders ever wait for the
+analyzer. A lost connection is re-established in the background (see xstream.connection) and every sample slot
+missed until then is emitted as a gap sample without values.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from xstream.backends import AcquisitionBackend, AcquisitionError, EndOfData
+from xstream.connection import CONNECTED, RECONNECTING, Backoff, ConnectionManager
+from xstream.metrics import (FETCH, GAPS, LATE_TICKS, MISSED, PARSE, POLL_RATE, RECONNECTS, SKIPPED_TICKS, TICK_LAG,
+                             TICKS)
+
+
+@dataclass(frozen=True)
+class Sample:
+    """A parsed reading of the analyzer."""
+
+    timestamp: float  # Epoch-Sekunden zum Zeitpunkt des Auslesens (bei einer Wiedergabe der aufgezeichnete)
+    values: dict = field(default_factory=dict)
+    raw: str = ""
+    errors: tuple = ()  # Parserfehler der Zeile, siehe xstream.parser
+    device: str = ""  # Name des Analysators bei mehreren Geräten
+    gap: bool = False  # True für einen wegen Verbindungsverlust ausgefallenen Messzeitpunkt
+    stats: dict = field(default_factory=dict)  # Gleitende Kennzahlen, siehe xstream.stats
+    alarms: tuple = ()  # Durch diese Messung ausgelöste oder aufgehobene Alarme (xstream.stats.AlarmEvent)
+
+
+class TickScheduler:
+    """
+    Fixed sampling grid on the monotonic clock. Slot n is due at start + n * period, independent of how long the
+    ticks take, so the spacing does not drift. Slots that have already passed completely when a tick overran are
+    skipped instead of being executed late one after the other.
+
+    Args:
+        period: Spacing of the slots in seconds, 0 for no waiting at all.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.slot = None  # monotonic, Soll-Zeitpunkt des aktuellen Takts
+
+    def next(self, stop_event):
+        """
+        Waits for the next slot.
+
+        Returns:
+            int: Number of slots skipped before this one, or None if stop_event was set while waiting.
+        """
+        now = time.monotonic()
+        skipped = 0
+        if self.slot is None or self.period <= 0:
+            self.slot = now
+        else:
+            self.slot += self.period
+            if now - self.slot >= self.period:
+                # Überlaufene Takte nicht nachholen, sondern auf den aktuellen Takt des Rasters springen
+                skipped = int((now - self.slot) // self.period)
+                self.slot += skipped * self.period
+        if stop_event.wait(max(self.slot - now, 0.0)):
+            return None
+        return skipped
+
+
+class AcquisitionLoop:
+    """
+    Polls one or more backends on background threads on a fixed grid, see TickScheduler. With several devices every
+    device is read on a shared thread pool over its own connection, and a slow device never delays the others; its
+    slots are skipped while its read is still running.
+
+    Args:
+        backends: Connected acquisition backend or dictionary device name -> backend, see xstream.backends.
+        period: Polling period in seconds, 0 polls as fast as possible.
+        on_sample: Called with every Sample, on an acquisition thread.
+        on_error: Called with the device name and the AcquisitionError that ended polling of this device
+            (EndOfData when a finite backend such as a replay is exhausted).
+        max_workers: Upper limit of the thread pool used for several devices.
+        reconnect: If True, a failed read starts reconnect attempts instead of ending polling of the device.
+        backoff: Callable returning a new Backoff for a device, defaults to 0.5 s doubling up to 30 s.
+        give_up_after: Seconds after which a device that could not be reconnected is given up (on_error).
+        on_status: Called with the device name, the new connection state and a message when a device loses or
+            regains its connection.
+        metrics: xstream.metrics.Metrics receiving fetch and parse times, tick lag, late ticks, missed and gap
+            samples and reconnects (optional).
+        statistics: xstream.stats.StatisticsStage applied to every sample before on_sample (optional). If it has an
+            AdaptiveRate, the loop polls with its period instead of period and follows its changes.
+    """
+
+    # Ein Takt gilt als verspätet, wenn er mehr als diesen Anteil der Periode nach seinem Soll-Zeitpunkt beginnt
+    LATE_TOLERANCE = 0.1
+
+    def __init__(self, backends, period=1.0, on_sample=None, on_error=None, max_workers=8, reconnect=True,
+                 backoff=Backoff, give_up_after=None, on_status=None, metrics=None, statistics=None):
+        if isinstance(backends, AcquisitionBackend):
+            backends = {"": backends}
+        self.backends = dict(backends)
+        self.adaptive = statistics.adaptive if statistics is not None else None
+        self.period = period if self.adaptive is None else self.adaptive.period
+        self.on_sample = on_sample
+        self.on_error = on_error
+        self.max_workers = max_workers
+        self.reconnect = reconnect
+        self.on_status = on_status
+        self.statistics = statistics
+        self.connections = {device: ConnectionManager(backend, backoff(), give_up_after)
+                            for device, backend in self.backends.items()}
+        self._active = set()
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._scheduler = None
+        self._executor = None
+        self.metrics = metrics
+        if metrics is not None:
+            self._ticks = metrics.counter(TICKS, "Acquisition ticks.")
+            self._late_ticks = metrics.counter(LATE_TICKS, "Ticks that started late by more than 10 % of the period.")
+            self._skipped_ticks = metrics.counter(SKIPPED_TICKS, "Slots skipped because a tick overran them.")
+            self._tick_lag = metrics.histogram(TICK_LAG, "Delay of the tick start behind its schedule in seconds.")
+            metrics.gauge(POLL_RATE, "Effective polling rate in samples per second, 0 without waiting.",
+                          lambda: 1.0 / self.period if self.period > 0 else 0.0)
+            self._device_metrics = {device: {
+                "fetch": metrics.histogram(FETCH, "Time to read the bottom line in seconds.", device=device),
+                "parse": metrics.histogram(PARSE, "Time to parse the bottom line in seconds.", device=device),
+                "missed": metrics.counter(MISSED, "Samples skipped because the last read was still running.",
+                                          device=device),
+                "gaps": metrics.counter(GAPS, "Gap samples emitted while disconnected.", device=device),
+                "reconnects": metrics.counter(RECONNECTS, "Successful reconnects.", device=device),
+            } for device in self.backends}
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def start(self):
+        if self.is_running():
+            return
+        if self._thread is not None:
+            # Ein noch laufender Lesezugriff des alten Threads muss erst beendet sein
+            self._thread.join()
+        self._stop_event.clear()
+        self._active = set(self.backends)
+        self._busy = set()
+        for connection in self.connections.values():
+            connection.state = CONNECTED
+        self._thread = threading.Thread(target=self._run, name="AcquisitionLoop", daemon=True)
+        self._thread.start()
+
+    def set_period(self, period):
+        """Changes the polling period, effective from the next tick."""
+        self.period = period
+        if self._scheduler is not None:
+            self._scheduler.period = period
+
+    def stop(self, wait=False):
+        """Stops polling. With wait=True, blocks until the pending reads of all devices have finished."""
+        self._stop_event.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            if self._executor is not None:
+                # Lesezugriffe mehrerer Geräte laufen im Thread-Pool über das Ende der Schleife hinaus
+                self._executor.shutdown(wait=True)
+
+    def poll(self, device=""):
+        """Reads one sample, the latest, from the backend of a device."""
+        return self.poll_batch(device)[-1]
+
+    def poll_batch(self, device=""):
+        """
+        Reads the samples shown by the backend of a device since its last read, oldest first. Usually one, more if
+        the backend collects every change of the bottom line (see AcquisitionBackend.read_batch).
+        """
+        backend = self.backends[device]
+        start = time.perf_counter()
+        batch = backend.read_batch()
+        fetched = time.perf_counter()
+        samples = []
+        for timestamp, raw_text in batch:
+            result = backend.parse(raw_text)
+            samples.append(Sample(timestamp, result.values, raw_text, result.errors, device))
+        if self.metrics is not None:
+            device_metrics = self._device_metrics[device]
+            device_metrics["fetch"].observe(fetched - start)
+            device_metrics["parse"].observe(time.perf_counter() - fetched)
+        return samples
+
+    def _run_task(self, task, device):
+        """Runs a read or reconnect of a device. An unexpected error ends only this device, never the loop."""
+        try:
+            task(device)
+        except Exception as e:
+            # Z. B. ein Fehler im Parser, in der Statistik oder im Treiber, sonst bliebe das Gerät für immer belegt
+            self._give_up(device, AcquisitionError(f"Unexpected error: {e!r}"))
+
+    def _poll_and_emit(self, device):
+        try:
+            samples = self.poll_batch(device)
+        except AcquisitionError as e:
+            if not self.reconnect or isinstance(e, EndOfData):
+                self._give_up(device, e)
+                return
+            self.connections[device].lost(e)
+            self._emit_gap(device, time.time())
+            self._status(device, RECONNECTING, f"Connection lost, reconnecting. {e}")
+            with self._lock:
+                self._busy.discard(device)
+            return
+        if self.statistics is not None:
+            # Vor dem Freigeben des Geräts, damit die Kennzahlen eines Geräts nie parallel aktualisiert werden
+            samples = [self.statistics.process(sample) for sample in samples]
+            if self.adaptive is not None and self.adaptive.period != self.period:
+                self.set_period(self.adaptive.period)
+        with self._lock:
+            self._busy.discard(device)
+        if self.on_sample is not None and not self._stop_event.is_set():
+            for sample in samples:
+                self.on_sample(sample)
+
+    def _reconnect(self, device):
+        connection = self.connections[device]
+        outage = connection.outage()
+        try:
+            reconnected = connection.try_reconnect()
+        except AcquisitionError as e:
+            self._give_up(device, e)
+            return
+        with self._lock:
+            self._busy.discard(device)
+        if not reconnected and self.period <= 0:
+            # Ohne Periode gibt es keine Takte: eine Lücke je Verbindungsversuch statt einer je Schleifendurchlauf
+            self._emit_gap(device, time.time())
+        if reconnected:
+            if self.metrics is not None:
+                self._device_metrics[device]["reconnects"].inc()
+            self._status(device, CONNECTED, f"Reconnected after {outage:.1f} s ({connection.attempts} attempts).")
+
+    def _give_up(self, device, error):
+        with self._lock:
+            self._active.discard(device)
+            self._busy.discard(device)
+            if not self._active:
+                self._stop_event.set()
+        if self.on_error is not None:
+            self.on_error(device, error)
+
+    def _emit_gap(self, device, timestamp):
+        if self.metrics is not None:
+            self._device_metrics[device]["gaps"].inc()
+        if self.on_sample is not None and not self._stop_event.is_set():
+            error = self.connections[device].last_error
+            self.on_sample(Sample(timestamp, {}, "", (f"Connection lost: {error}",), device, gap=True))
+
+    def _status(self, device, state, message):
+        if self.on_status is not None:
+            self.on_status(device, state, message)
+
+    def _count_tick(self, lag, skipped_ticks, busy):
+        self._ticks.inc()
+        self._tick_lag.observe(max(lag, 0.0))
+        if self.period > 0 and lag > self.LATE_TOLERANCE * self.period:
+            self._late_ticks.inc()
+        if skipped_ticks:
+            self._skipped_ticks.inc(skipped_ticks)
+        for device in busy:
+            self._device_metrics[device]["missed"].inc()
+
+    def _run(self):
+        self._executor = executor = None
+        if len(self.backends) > 1:
+            executor = ThreadPoolExecutor(max_workers=min(len(self.backends), self.max_workers),
+                                          thread_name_prefix="AcquisitionWorker")
+            self._executor = executor
+        self._scheduler = scheduler = TickScheduler(self.period)
+        try:
+            while True:
+                skipped = scheduler.next(self._stop_event)
+                if skipped is None:
+                    break
+                now = time.monotonic()
+                # Wanduhrzeit des Soll-Zeitpunkts, auch wenn der Takt verspätet beginnt
+                slot_time = time.time() - (now - scheduler.slot)
+                with self._lock:
+                    lost = sorted(device for device in self._active
+                                  if self.connections[device].state == RECONNECTING)
+                    # Geräte mit noch laufendem Lesezugriff werden in diesem Takt übersprungen
+                    due = sorted(self._active - self._busy)
+                    self._busy.update(due)
+                    if self.metrics is not None:
+                        self._count_tick(now - scheduler.slot, skipped, self._busy.difference(due, lost))
+                if scheduler.period > 0:
+                    for device in lost:
+                        # Auch übersprungene Takte werden als Lücken aufgezeichnet
+                        for slot in range(skipped, -1, -1):
+                            self._emit_gap(device, slot_time - slot * scheduler.period)
+                submitted = False
+                for device in due:
+                    if device in lost:
+                        if not self.connections[device].due(now):
+                            with self._lock:
+                                self._busy.discard(device)
+                            continue
+                        task = self._reconnect
+                    else:
+                        task = self._poll_and_emit
+                    if executor is None:
+                        self._run_task(task, device)
+                    else:
+                        executor.submit(self._run_task, task, device)
+                    submitted = True
+                if not submitted and scheduler.period <= 0:
+                    self._stop_event.wait(0.001)  # Ohne Periode nicht aktiv warten, bis ein Lesezugriff fertig ist
+        finally:
+            self._scheduler = None
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
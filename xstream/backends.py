@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+# xstream/backends.py
+"""
+This module provides the acquisition backends used to read the bottom-line frame ("unten") of the X-STREAM web
+interface. The HTTP backend talks to the analyzer directly over a persistent keep-alive connection, the Selenium
+backend drives a Chrome instance and is kept as a fallback for devices whose login cannot be automated.
+
+Backends return the bottom lines shown since the last read through read_batch(). Polling backends return the
+current line; the Selenium backend can instead watch td#btmline with a MutationObserver in the page (observe=True)
+and collect every change, which is then drained with a single script call per tick.
+"""
+import html
+import http.client
+import re
+import time
+from http.cookies import CookieError, SimpleCookie
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin, urlencode
+
+from xstream.parser import BottomLineParser, DEFAULT_CHANNELS
+
+
+class AcquisitionError(Exception):
+    """Raised when a backend cannot connect to the analyzer or read the bottom line."""
+
+
+class EndOfData(AcquisitionError):
+    """Raised by finite backends, e.g. a replay, when all data has been read."""
+
+
+class AcquisitionBackend:
+    """Base class of all acquisition backends."""
+
+    name = ""
+    parser = BottomLineParser()
+    period = None  # Vom Backend vorgegebene Abfrageperiode in Sekunden, z. B. bei einer Wiedergabe
+
+    def connect(self):
+        """Opens the session to the analyzer and enters the bottom-line frame."""
+        raise NotImplementedError
+
+    def read_raw(self):
+        """Returns the current text of td#btmline."""
+        raise NotImplementedError
+
+    def timestamp(self):
+        """Returns the epoch timestamp of the bottom line returned by the last read_raw()."""
+        return time.time()
+
+    def read_batch(self):
+        """
+        Returns the bottom lines shown since the last call as a list of tuples (epoch timestamp, text), oldest
+        first. Backends that can only read the current line return it as the only entry.
+        """
+        raw_text = self.read_raw()
+        return [(self.timestamp(), raw_text)]
+
+    def parse(self, raw_text):
+        """Parses a bottom line read by this backend into a ParseResult."""
+        return self.parser.parse(raw_text)
+
+    def read(self):
+        """
+        Reads and parses the current gas values.
+
+        Returns:
+            dict: Gas values, e.g. {"CO2": 0.02, "CO": 0.0, "CH4": 0.01, "H2": 0.11, "O2": 20.95}
+        """
+        raw_text = self.read_raw()
+        result = self.parse(raw_text)
+        if not result.values:
+            raise AcquisitionError(f"Malformed bottom line: {raw_text!r}")
+        return result.values
+
+    def reconnect(self):
+        """
+        Re-establishes a lost connection without user interaction, reusing the session where possible. Called from
+        an acquisition thread by xstream.connection.ConnectionManager.
+        """
+        self.close()
+        self.connect()
+
+    def close(self):
+        """Releases all resources held by the backend."""
+
+
+class _FormParser(HTMLParser):
+    """Collects the first form and all named frames of a page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.form_action = None
+        self.form_method = "get"
+        self.inputs = []
+        self.frames = {}
+        self._in_form = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and self.form_action is None:
+            self._in_form = True
+            self.form_action = attrs.get("action") or ""
+            self.form_method = (attrs.get("method") or "get").lower()
+        elif tag == "input" and self._in_form:
+            self.inputs.append(attrs)
+        elif tag in ("frame", "iframe") and attrs.get("name"):
+            self.frames[attrs["name"]] = attrs.get("src") or ""
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._in_form = False
+
+
+_BTMLINE_RE = re.compile(r'<td[^>]*\bid\s*=\s*["\']?btmline["\']?[^>]*>(.*?)</td>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def extract_btmline(page):
+    """Returns the whitespace-normalized text of td#btmline in an HTML page or None."""
+    match = _BTMLINE_RE.search(page)
+    if match is None:
+        return None
+    text = html.unescape(_TAG_RE.sub(" ", match.group(1)))
+    return " ".join(text.split())
+
+
+class HttpBackend(AcquisitionBackend):
+    """
+    Reads the bottom-line frame with plain HTTP requests over one persistent keep-alive connection.
+
+    Args:
+        login_url: URL of the login page, e.g. http://192.168.1.88/login.htm
+        username: User name entered into the login form (optional).
+        password: Password entered into the login form (optional).
+        frame: Name of the frame that contains td#btmline.
+        timeout: Socket timeout in seconds.
+        channels: Channel schema of the bottom line, see xstream.parser.
+    """
+
+    name = "http"
+
+    def __init__(self, login_url, username=None, password=None, frame="unten", timeout=5.0,
+                 channels=DEFAULT_CHANNELS):
+        self.parser = BottomLineParser(channels)
+        self.login_url = login_url
+        self.username = username or ""
+        self.password = password or ""
+        self.frame = frame
+        self.timeout = timeout
+        self.frame_url = None
+        self.cookies = {}
+        self._conn = None
+        self._read_time = None
+        parts = urlsplit(login_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise AcquisitionError(f"Invalid login URL: {login_url}")
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+
+    def _connection(self):
+        if self._conn is None:
+            if self._scheme == "https":
+                self._conn = http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+        return self._conn
+
+    def _drop_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, url, body=None, max_redirects=5):
+        """
+        Sends a request on the keep-alive connection and follows redirects.
+
+        Returns:
+            Tuple: The final URL and the decoded response body.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            headers = {"Connection": "keep-alive"}
+            if self.cookies:
+                headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            if body is not None:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+            # Eine vom Gerät geschlossene Keep-Alive-Verbindung wird einmal neu aufgebaut
+            for attempt in range(2):
+                try:
+                    conn = self._connection()
+                    conn.request(method, target, body=body, headers=headers)
+                    response = conn.getresponse()
+                    payload = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError, OSError) as e:
+                    self._drop_connection()
+                    if attempt:
+                        raise AcquisitionError(f"Request to {url} failed: {e}") from e
+
+            for header in response.headers.get_all("Set-Cookie") or []:
+                cookie = SimpleCookie()
+                try:
+                    cookie.load(header)
+                except CookieError as e:
+                    raise AcquisitionError(f"Invalid cookie from {url}: {e}") from e
+                for key, morsel in cookie.items():
+                    self.cookies[key] = morsel.value
+            if response.will_close:
+                self._drop_connection()
+
+            if response.status in (301, 302, 303, 307, 308) and response.headers.get("Location"):
+                url = urljoin(url, response.headers["Location"])
+                if response.status not in (307, 308):
+                    method, body = "GET", None
+                continue
+            if response.status >= 400:
+                raise AcquisitionError(f"HTTP {response.status} for {url}")
+            charset = response.headers.get_content_charset() or "latin-1"
+            return url, payload.decode(charset, errors="replace")
+        raise AcquisitionError(f"Too many redirects for {url}")
+
+    def login(self):
+        """Submits the login form and returns the URL and body of the page behind it."""
+        url, page = self.request("GET", self.login_url)
+        parser = _FormParser()
+        parser.feed(page)
+        if parser.form_action is None or not any(i.get("type", "").lower() == "password" for i in parser.inputs):
+            return url, page
+
+        fields = {}
+        user_filled = False
+        for field in parser.inputs:
+            name = field.get("name")
+            kind = field.get("type", "text").lower()
+            if not name or kind in ("submit", "button", "reset", "image"):
+                continue
+            if kind == "password":
+                fields[name] = self.password
+            elif kind in ("text", "email") and not user_filled:
+                fields[name] = self.username
+                user_filled = True
+            else:
+                fields[name] = field.get("value") or ""
+        action = urljoin(url, parser.form_action or url)
+        body = urlencode(fields)
+        if parser.form_method == "post":
+            return self.request("POST", action, body=body)
+        return self.request("GET", f"{action}?{body}")
+
+    def connect(self):
+        url, page = self.login()
+        if extract_btmline(page) is not None:
+            self.frame_url = url
+            return
+        parser = _FormParser()
+        parser.feed(page)
+        src = parser.frames.get(self.frame)
+        if src is None:
+            # Nach dem Login wird nicht immer direkt auf die Frameseite weitergeleitet
+            url, page = self.request("GET", urljoin(url, "/"))
+            parser = _FormParser()
+            parser.feed(page)
+            src = parser.frames.get(self.frame)
+        if src is None:
+            raise AcquisitionError(f'Frame "{self.frame}" not found. Please check login URL and credentials.')
+        self.frame_url = urljoin(url, src)
+        self.read_raw()
+
+    def read_raw(self):
+        if self.frame_url is None:
+            raise AcquisitionError("Not connected.")
+        start = time.time()
+        _, page = self.request("GET", self.frame_url)
+        # Das Gerät erzeugt die Seite zwischen Anfrage und Antwort, die Mitte ist die beste Schätzung
+        self._read_time = (start + time.time()) / 2
+        raw_text = extract_btmline(page)
+        if raw_text is None:
+            raise AcquisitionError("Bottom line not found. The session may have expired.")
+        return raw_text
+
+    def timestamp(self):
+        return self._read_time
+
+    def reconnect(self):
+        # Zuerst die bestehende Sitzung (Cookies) über eine neue Verbindung weiterverwenden
+        self._drop_connection()
+        if self.frame_url is not None:
+            try:
+                self.read_raw()
+                return
+            except AcquisitionError:
+                pass
+        # Sitzung abgelaufen: erneut anmelden und den Frame "unten" suchen
+        self.connect()
+
+    def close(self):
+        self._drop_connection()
+
+
+# Installiert beim ersten Aufruf einen MutationObserver im Frame, der jede Änderung von td#btmline mit der Uhrzeit
+# des Browsers sammelt, und gibt bei jedem Aufruf die seitdem gesammelten Änderungen zurück. Nach einem Neuladen
+# des Frames fehlt der Observer und wird neu installiert. null, solange td#btmline nicht existiert.
+_OBSERVER_SCRIPT = """
+var limit = arguments[0];
+var state = window.__xstreamObserver;
+if (!state) {
+    if (!document.getElementById("btmline")) return null;
+    state = window.__xstreamObserver = {changes: [], last: null};
+    var record = function () {
+        var cell = document.getElementById("btmline");
+        if (!cell) return;
+        var text = cell.innerText;
+        if (text === state.last) return;
+        state.last = text;
+        state.changes.push([Date.now(), text]);
+        if (state.changes.length > limit) state.changes.shift();
+    };
+    new MutationObserver(record).observe(document.documentElement,
+                                         {childList: true, characterData: true, subtree: true});
+    record();
+}
+var changes = state.changes;
+state.changes = [];
+return {now: Date.now(), last: state.last, changes: changes};
+"""
+
+
+class SeleniumBackend(AcquisitionBackend):
+    """
+    Reads the bottom-line frame through a Chrome instance controlled by Selenium.
+
+    Args:
+        login_url: URL of the login page.
+        driver_path: Path to the chromedriver executable.
+        login_prompt: Callable that blocks until the user has logged in on the webpage.
+        frame: Name of the frame that contains td#btmline.
+        timeout: Seconds to wait for td#btmline.
+        channels: Channel schema of the bottom line, see xstream.parser.
+        observe: If True, td#btmline is watched by a MutationObserver in the page. Every read drains all changes
+            since the previous one in a single script call, so values shown between two polls are captured with
+            their own timestamps. If nothing has changed, the current line is returned.
+        buffer_size: Changes kept in the page between two reads in observe mode; older ones are discarded.
+    """
+
+    name = "selenium"
+
+    def __init__(self, login_url, driver_path, login_prompt=None, frame="unten", timeout=10,
+                 channels=DEFAULT_CHANNELS, observe=False, buffer_size=1000):
+        self.parser = BottomLineParser(channels)
+        self.login_url = login_url
+        self.driver_path = driver_path
+        self.login_prompt = login_prompt
+        self.frame = frame
+        self.timeout = timeout
+        self.observe = observe
+        self.buffer_size = buffer_size
+        self.driver = None
+        self._read_time = None
+
+    def connect(self):
+        # Selenium wird erst benötigt, wenn dieses Backend tatsächlich verwendet wird
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            service = Service(executable_path=self.driver_path)
+            self.driver = webdriver.Chrome(service=service)
+            self.driver.get(self.login_url)
+            if self.login_prompt is not None:
+                self.login_prompt()
+            self.driver.switch_to.frame(self.frame)
+        except WebDriverException as e:
+            self.close()
+            raise AcquisitionError(f"Connection failed. Please check WebDriver path. ({e.msg})") from e
+
+    def read_raw(self):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import WebDriverException
+
+        if self.driver is None:
+            raise AcquisitionError("Not connected.")
+        if self.observe:
+            timestamp, text = self.read_batch()[-1]
+            self._read_time = timestamp
+            return text
+        try:
+            element = WebDriverWait(self.driver, self.timeout).until(
+                EC.presence_of_element_located((By.XPATH, '//td[@id="btmline"]')))
+            # Zeitstempel erst beim tatsächlichen Auslesen, nicht vor dem Warten auf das Element
+            start = time.time()
+            text = element.text.strip()
+            self._read_time = (start + time.time()) / 2
+            return text
+        except WebDriverException as e:
+            raise AcquisitionError(f"Connection lost. ({e.msg})") from e
+
+    def timestamp(self):
+        return self._read_time
+
+    def read_batch(self):
+        if not self.observe:
+            return super().read_batch()
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+
+        if self.driver is None:
+            raise AcquisitionError("Not connected.")
+        try:
+            result = self.driver.execute_script(_OBSERVER_SCRIPT, self.buffer_size)
+            if result is None:
+                # Frame wird gerade (neu) geladen: auf td#btmline warten und den Observer installieren
+                result = WebDriverWait(self.driver, self.timeout).until(
+                    lambda driver: driver.execute_script(_OBSERVER_SCRIPT, self.buffer_size))
+        except TimeoutException as e:
+            raise AcquisitionError("Bottom line not found.") from e
+        except WebDriverException as e:
+            raise AcquisitionError(f"Connection lost. ({e.msg})") from e
+        changes = result["changes"] or [[result["now"], result["last"]]]
+        return [(timestamp / 1000, (text or "").strip()) for timestamp, text in changes]
+
+    def reconnect(self):
+        # Der Browser (und damit die Sitzung) bleibt erhalten, nur die Seite wird neu geladen. Eine neue Anmeldung
+        # erfordert den Benutzer und ist daher nur über connect() möglich.
+        from selenium.common.exceptions import WebDriverException
+
+        if self.driver is None:
+            raise AcquisitionError("Not connected.")
+        try:
+            self.driver.switch_to.default_content()
+            self.driver.refresh()
+            self.driver.switch_to.frame(self.frame)
+        except WebDriverException as e:
+            raise AcquisitionError(f"Reconnect failed. ({e.msg})") from e
+        self.read_raw()
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+BACKENDS = {
+    HttpBackend.name: HttpBackend,
+    SeleniumBackend.name: SeleniumBackend,
+}
+
+
+def device_name(login_url):
+    """Returns the name under which an analyzer is shown and recorded, i.e. host and port of its URL."""
+    return urlsplit(login_url).netloc or login_url
+
+
+def create_backend(name, login_url, driver_path=None, username=None, password=None, login_prompt=None,
+                   channels=DEFAULT_CHANNELS, observe=False):
+    """Creates the acquisition backend registered under name. observe only applies to the Selenium backend."""
+    if name == SeleniumBackend.name:
+        return SeleniumBackend(login_url, driver_path, login_prompt=login_prompt, channels=channels, observe=observe)
+    if name == HttpBackend.name:
+        return HttpBackend(login_url, username=username, password=password, channels=channels)
+    if name == "replay":
+        from xstream.replay import ReplayBackend
+        return ReplayBackend(login_url, channels=channels)
+    raise AcquisitionError(f"Unknown backend: {name}")
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+# xstream/cli.py
+"""
+This module provides the command line of XSTREAM. Without a command the GUI is started; "record" runs the
+acquisition and recording pipeline headless, without importing Qt or pyqtgraph, e.g. on a data-logging PC:
+
+    python -m xstream record --url http://192.168.1.88/login.htm --out /var/lib/xstream
+
+With --replay, a recording (.csv, .xsb or a raw .log) is fed through the same pipeline instead, at --speed times
+the recorded rate or with --speed 0 as fast as possible. "history" opens recordings in the history view:
+
+    python -m xstream history xtream_data_2024-11-20_10-15.csv
+
+Long runs are split into segments with [recording] rotate (hourly, daily or a size such as 500MB); closed segments
+are compressed with compress = gzip or zstd. The manifest <base>.<format>.manifest.json opens the whole recording in
+the history view and in "export", which writes a time range of it to one CSV file:
+
+    python -m xstream export xtream_data_2024-11-20_10-15.csv.manifest.json out.csv --from "2024-11-20 12:00:00"
+
+"report" summarizes a folder of recordings into hourly and daily tables (mean, min, max, peak time and the time above
+--threshold) with a process pool; a cache in the output folder limits a rerun to new and changed recordings:
+
+    python -m xstream report /var/lib/xstream --threshold CO=0.003 --pdf
+
+Credentials are taken from --user/--password, the environment (XSTREAM_USER, XSTREAM_PASSWORD) or a config file:
+
+    [analyzer]
+    url = http://192.168.1.88/login.htm      ; several URLs separated by ;
+    user = operator
+    password = secret
+    schema = /etc/xstream/channels.json
+    isolate = yes                            ; run each analyzer session in a supervised child process
+    memory_limit = 1024                      ; MB of the child process and its processes, restarted above it
+
+    [recording]
+    out = /var/lib/xstream
+    format = csv, xsb
+    period = 1.0                             ; seconds, sub-second periods such as 0.2 are possible
+    flush_rows = 100
+    flush_interval = 5.0
+    fsync = yes
+    give_up_after = 3600                     ; seconds, empty: reconnect forever
+    statistics = /etc/xstream/statistics.json ; rolling statistics, extra columns and alarms, see xstream.stats
+    rotate = daily                           ; hourly, daily or a size such as 500MB, empty: one file
+    compress = gzip                          ; gzip or zstd (needs the zstandard package), empty: uncompressed
+
+    [metrics]
+    port = 9108                              ; Prometheus endpoint http://127.0.0.1:9108/metrics
+    file = /var/lib/node_exporter/xstream.prom
+    interval = 10
+
+    [live]
+    port = 9110                              ; live samples on http://127.0.0.1:9110/events and /snapshot
+    host = 127.0.0.1
+    queue = 256                              ; samples a subscriber may lag behind before it is dropped
+
+A systemd unit only needs ExecStart=/usr/bin/python3 -m xstream record --config /etc/xstream/xstream.ini together
+with Restart=on-failure; the recorder stops cleanly on SIGTERM and exits with status 1 when all analyzers have been
+unreachable for longer than give_up_after. Alarms of the statistics file are logged as warnings when they are raised
+and as info when they clear. With an "adaptive" section in the statistics file, the period follows the signal
+dynamics instead (see xstream.stats.AdaptiveRate); the status lines show the effective rate.
+
+Every sample is written to the journal <base>.journal (see xstream.journal) before it is recorded. After a crash or
+power failure the next start finds the journal in the output directory, writes the samples the recordings are
+missing and continues the same recording.
+
+With isolate = yes (--isolate) every analyzer session runs in a child process (see xstream.isolation). A session that
+hangs or grows beyond memory_limit is restarted like a lost connection while the recording goes on.
+"""
+import argparse
+import configparser
+import logging
+import os
+import signal
+import threading
+import time
+
+from xstream import startup
+
+log = logging.getLogger("xstream")
+
+CONFIG_DEFAULTS = {
+    "analyzer": {"url": "", "user": "", "password": "", "schema": "", "isolate": "no", "memory_limit": "1024"},
+    "recording": {"out": ".", "format": "csv", "period": "1.0", "flush_rows": "100", "flush_interval": "5.0",
+                  "fsync": "no", "give_up_after": "", "statistics": "", "rotate": "", "compress": ""},
+    "metrics": {"port": "", "file": "", "interval": "10"},
+    "live": {"port": "", "host": "127.0.0.1", "queue": "256"},
+}
+
+
+def load_config(path=None):
+    """Reads the INI config file (optional) on top of the defaults."""
+    config = configparser.ConfigParser(inline_comment_prefixes=(";", "#"))
+    config.read_dict(CONFIG_DEFAULTS)
+    if path:
+        if not config.read(path, encoding="utf-8"):
+            raise SystemExit(f"Config file not found: {path}")
+    return config
+
+
+def split_list(value):
+    return [item.strip() for item in value.replace(",", ";").split(";") if item.strip()]
+
+
+def load_schema(path):
+    """Reads the channel schema of --schema or [analyzer] schema, the default channels without one."""
+    from xstream.parser import DEFAULT_CHANNELS, load_channels
+
+    if not path:
+        return DEFAULT_CHANNELS
+    try:
+        return load_channels(path)
+    except (OSError, ValueError, KeyError) as e:
+        raise SystemExit(f"Invalid channel schema {path}: {e}")
+
+
+def record(args):
+    """Runs the headless acquisition until SIGINT/SIGTERM, until all analyzers are lost or a replay has ended."""
+    from xstream.acquisition import AcquisitionLoop
+    from xstream.backends import AcquisitionError, EndOfData, HttpBackend, create_backend, device_name
+    from xstream.isolation import ProcessBackend
+    from xstream.live import LiveServer
+    from xstream.metrics import Metrics, MetricsFileWriter, MetricsServer, format_summary, register_process_metrics
+    from xstream.parser import channel_keys
+    from xstream.journal import Journal, JournalError, compatible, finish, find_unfinished, journal_path, resume
+    from xstream.recorder import RecorderError, open_recorders, parse_rotation, recording_base_path
+    from xstream.stats import StatisticsStage, load_statistics
+
+    config = load_config(args.config)
+    analyzer, recording = config["analyzer"], config["recording"]
+    urls = args.url or split_list(analyzer["url"])
+    if not urls and not args.replay:
+        raise SystemExit("No analyzer URL given (--url or [analyzer] url).")
+    user = args.user or os.environ.get("XSTREAM_USER") or analyzer["user"]
+    password = args.password or os.environ.get("XSTREAM_PASSWORD") or analyzer["password"]
+    schema = args.schema or analyzer["schema"]
+    channels = load_schema(schema)
+    statistics_path = args.statistics or recording["statistics"]
+    try:
+        statistics = load_statistics(statistics_path, channels) if statistics_path else StatisticsStage(channels)
+    except (OSError, ValueError, KeyError) as e:
+        raise SystemExit(f"Invalid statistics file {statistics_path}: {e}")
+    out = args.out or recording["out"]
+    formats = args.format or split_list(recording["format"])
+    period = args.period if args.period is not None else recording.getfloat("period")
+    if period <= 0 and not args.replay:
+        raise SystemExit(f"The period must be positive, got {period}.")
+    give_up_after = args.give_up_after or (float(recording["give_up_after"]) if recording["give_up_after"] else None)
+    metrics_port = args.metrics_port or (int(config["metrics"]["port"]) if config["metrics"]["port"] else None)
+    metrics_file = args.metrics_file or config["metrics"]["file"]
+    live_port = args.live_port or (int(config["live"]["port"]) if config["live"]["port"] else None)
+    try:
+        rotate_interval, rotate_size = parse_rotation(args.rotate or recording["rotate"])
+    except ValueError as e:
+        raise SystemExit(str(e))
+    compression = args.compress or recording["compress"] or None
+
+    backends = {}
+    try:
+        if args.replay:
+            from xstream.replay import replay_backends
+            backends = replay_backends(args.replay, speed=args.speed, loop=args.loop, channels=channels)
+        else:
+            # Ein Backend je Analysator, auf Wunsch in einem eigenen Prozess
+            if args.isolate or analyzer.getboolean("isolate"):
+                factory = ProcessBackend
+                isolation = {"memory_limit": (args.memory_limit or analyzer.getfloat("memory_limit")) * 2**20}
+            else:
+                factory, isolation = create_backend, {}
+            for url in urls:
+                backends[device_name(url)] = factory(HttpBackend.name, url, username=user, password=password,
+                                                     channels=channels, **isolation)
+        for device, backend in backends.items():
+            log.info("Connecting to %s", device)
+            backend.connect()
+    except AcquisitionError as e:
+        log.error("Connection failed: %s", e)
+        for backend in backends.values():
+            backend.close()
+        return 1
+    if args.replay and args.period is None:
+        period = min(backend.period for backend in backends.values())
+
+    if out.lower().endswith((".csv", ".xsb", ".log")):
+        base, extension = os.path.splitext(out)
+        formats = [extension[1:].lower()]
+        unfinished = [journal_path(base)] if os.path.isfile(os.path.join(journal_path(base), "run.json")) else []
+    else:
+        os.makedirs(out, exist_ok=True)
+        base = recording_base_path(out)
+        unfinished = find_unfinished(out)
+    metrics = Metrics()
+    register_process_metrics(metrics)
+    devices = list(backends) if len(backends) > 1 else None
+    options = {"flush_rows": recording.getint("flush_rows"), "flush_interval": recording.getfloat("flush_interval"),
+               "fsync": recording.getboolean("fsync")}
+    # Den jüngsten abgebrochenen Lauf fortsetzen, wenn er dieselben Spalten aufzeichnet, ältere abschließen
+    resumable = unfinished and compatible(unfinished[-1], channel_keys(channels), statistics.log_columns(), devices,
+                                          formats)
+    try:
+        for directory in unfinished[:-1] if resumable else unfinished:
+            log.info("Recovered %d samples of the unfinished run %s", finish(directory, **options), directory)
+        if resumable:
+            start = time.perf_counter()
+            recorders, journal, _, recovered = resume(unfinished[-1], metrics=metrics, tail=0, **options)
+            log.info("Resumed the unfinished run %s in %.3f s, recovered %d samples", unfinished[-1],
+                     time.perf_counter() - start, recovered)
+        else:
+            recorders = open_recorders(base, formats, channel_keys(channels), devices=devices, metrics=metrics,
+                                       extra_columns=statistics.log_columns(), rotate_interval=rotate_interval,
+                                       rotate_size=rotate_size, compression=compression, **options)
+            journal = Journal(base, recorders, metrics=metrics)
+    except (OSError, RecorderError, JournalError) as e:
+        log.error("Cannot create recording %s: %s", base, e)
+        return 1
+    log.info("Recording %s to %s", ", ".join(backends), ", ".join(recorder.path for recorder in recorders))
+
+    finished = threading.Event()
+    failures = []
+    ended = set()
+    counter = {"samples": 0}
+    write_lock = threading.Lock()  # Journal und Aufzeichnungen erhalten die Messungen in derselben Reihenfolge
+    live_server = None
+    if live_port:
+        try:
+            live_server = LiveServer(live_port, config["live"]["host"], config["live"].getint("queue"),
+                                     metrics=metrics).start()
+            log.info("Serving live samples on http://%s:%d/events", config["live"]["host"], live_port)
+        except OSError as e:
+            log.error("Cannot serve live samples: %s", e)
+
+    def on_sample(sample):
+        if live_server is not None:
+            live_server.publish(sample)
+        if sample.errors and not sample.gap:
+            log.warning("%s malformed bottom line: %s", sample.device, "; ".join(sample.errors))
+        for event in sample.alarms:
+            log.log(logging.WARNING if event.active else logging.INFO, "%s", event.message)
+        try:
+            with write_lock:
+                counter["samples"] += 1
+                journal.append(sample)
+                for recorder in recorders:
+                    recorder.write(sample)
+        except RecorderError as e:
+            log.error("%s", e)
+            failures.append(str(e))
+            finished.set()
+
+    def on_error(device, error):
+        if isinstance(error, EndOfData):
+            log.info("%s", error)
+            ended.add(device)
+            if len(ended) == len(backends):
+                finished.set()
+        else:
+            log.error("%s: %s", device, error)
+        backends[device].close()
+
+    def on_status(device, state, message):
+        log.warning("%s: %s", device, message)
+
+    loop = AcquisitionLoop(backends, period, on_sample=on_sample, on_error=on_error, give_up_after=give_up_after,
+                           on_status=on_status, metrics=metrics, statistics=statistics)
+    if loop.adaptive is not None:
+        log.info("Adaptive polling between %g and %g samples per second", loop.adaptive.min_rate,
+                 loop.adaptive.max_rate)
+    exporters = []
+    try:
+        if metrics_port:
+            exporters.append(MetricsServer(metrics, metrics_port).start())
+            log.info("Serving metrics on http://127.0.0.1:%d/metrics", metrics_port)
+        if metrics_file:
+            exporters.append(MetricsFileWriter(metrics, metrics_file, config["metrics"].getfloat("interval")).start())
+    except OSError as e:
+        log.error("Cannot export metrics: %s", e)
+
+    def on_signal(signum, frame):
+        log.info("Received signal %s, stopping", signum)
+        finished.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    loop.start()
+    next_status = time.monotonic() + args.status_interval
+    journal_failed = False
+    while not finished.wait(1.0):
+        if not loop.is_running():
+            if len(ended) < len(backends):
+                failures.append("all analyzers lost")
+            break
+        if journal.error is not None and not journal_failed:
+            log.error("Cannot write the journal %s, samples are no longer crash-safe: %s", journal.directory,
+                      journal.error)
+            journal_failed = True
+        if time.monotonic() >= next_status:
+            log.info("%d samples recorded, %s", counter["samples"], format_summary(metrics))
+            next_status += args.status_interval
+    loop.stop(wait=True)
+    for recorder in recorders:
+        recorder.close()
+    journal.close()
+    for backend in backends.values():
+        backend.close()
+    for exporter in exporters:
+        exporter.stop()
+    if live_server is not None:
+        live_server.stop()
+    log.info("Stopped after %d samples", counter["samples"])
+    return 1 if failures else 0
+
+
+def gui(args):
+    if args.startup_report:
+        startup.enabled = True
+    import xstream.main
+    return xstream.main.main(metrics_port=getattr(args, "metrics_port", None),
+                             metrics_file=getattr(args, "metrics_file", None),
+                             max_fps=getattr(args, "max_fps", None), opengl=getattr(args, "opengl", False),
+                             live_port=getattr(args, "live_port", None))
+
+
+def history(args):
+    """Opens recordings in the history view, without connecting to an analyzer."""
+    import sys
+    from PyQt6.QtWidgets import QApplication
+    from xstream.views import HistoryWindow
+
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
+    channels = load_schema(args.schema)
+    windows = [HistoryWindow(channels=channels) for _ in args.recordings or [None]]
+    for window, path in zip(windows, args.recordings or [None]):
+        window.show()
+        if path:
+            window.open_recording(path)
+    return app.exec()
+
+
+def export(args):
+    """Exports a time range of a segmented recording, or a whole binary recording, to a CSV file."""
+    from xstream.recorder import MANIFEST_EXTENSION, RecorderError, export_csv, export_range, parse_timestamp
+
+    try:
+        start, stop = (parse_timestamp(value) if value else None for value in (args.start, args.stop))
+    except ValueError as e:
+        raise SystemExit(f"Invalid time: {e}")
+    try:
+        if args.recording.lower().endswith(MANIFEST_EXTENSION):
+            rows = export_range(args.recording, args.destination, start, stop)
+            log.info("Exported %d rows to %s", rows, args.destination)
+        elif start is not None or stop is not None:
+            raise SystemExit("--from and --to need the manifest of a segmented recording.")
+        else:
+            export_csv(args.recording, args.destination)
+            log.info("Exported %s to %s", args.recording, args.destination)
+    except (OSError, RecorderError) as e:
+        log.error("Export failed: %s", e)
+        return 1
+    return 0
+
+
+def report(args):
+    """Summarizes a folder of recordings into hourly and daily tables, only new or changed files are processed."""
+    from xstream.parser import channel_keys
+    from xstream.report import build_report, parse_thresholds
+
+    try:
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    gases = channel_keys(load_schema(args.schema))
+    unknown = set(thresholds) - set(gases)
+    if unknown:
+        raise SystemExit(f"Unknown gas in --threshold: {', '.join(sorted(unknown))}")
+    if not os.path.isdir(args.folder):
+        raise SystemExit(f"{args.folder} is not a folder.")
+    out = args.out or os.path.join(args.folder, "report")
+    start = time.monotonic()
+    try:
+        processed, cached = build_report(args.folder, out, gases, thresholds, args.max_gap, args.jobs,
+                                         use_cache=not args.no_cache, pdf=args.pdf)
+    except OSError as e:
+        log.error("Report failed: %s", e)
+        return 1
+    log.info("Report written to %s in %.1f s (%d recordings processed, %d from the cache)", out,
+             time.monotonic() - start, processed, cached)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="xstream", description="X-STREAM gas analyzer monitoring")
+    parser.set_defaults(func=gui)
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the duration of the startup phases to stderr (or set XSTREAM_STARTUP_REPORT=1)")
+    commands = parser.add_subparsers(title="commands")
+
+    metrics_options = argparse.ArgumentParser(add_help=False)
+    metrics_options.add_argument("--metrics-port", type=int,
+                                 help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    metrics_options.add_argument("--metrics-file", help="write Prometheus metrics to this file periodically")
+    metrics_options.add_argument("--live-port", type=int,
+                                 help="publish the live samples on http://127.0.0.1:PORT/events and /snapshot")
+
+    gui_parser = commands.add_parser("gui", parents=[metrics_options],
+                                     help="start the graphical user interface (default)")
+    gui_parser.add_argument("--max-fps", type=float,
+                            help="maximum plot redraws per second, independent of the sampling rate (default: 10)")
+    gui_parser.add_argument("--opengl", action="store_true", help="draw the curves with OpenGL")
+    gui_parser.set_defaults(func=gui)
+
+    history_parser = commands.add_parser("history", help="view large recordings without connecting to an analyzer")
+    history_parser.add_argument("recordings", nargs="*", metavar="RECORDING",
+                                help=".csv or .xsb recording or the manifest of a segmented recording")
+    history_parser.add_argument("--schema", help="channel schema JSON file for the colors and names of the gases")
+    history_parser.set_defaults(func=history)
+
+    export_parser = commands.add_parser("export", help="export a recording or a time range of it to CSV")
+    export_parser.add_argument("recording", metavar="RECORDING",
+                               help="manifest of a segmented recording (.manifest.json) or a binary recording (.xsb)")
+    export_parser.add_argument("destination", metavar="CSV", help="CSV file to write")
+    export_parser.add_argument("--from", dest="start", metavar="TIME", help='first row, e.g. "2024-11-20 12:00:00"')
+    export_parser.add_argument("--to", dest="stop", metavar="TIME", help="last row, same format as --from")
+    export_parser.set_defaults(func=export)
+
+    report_parser = commands.add_parser("report", help="hourly and daily summaries of a folder of recordings")
+    report_parser.add_argument("folder", metavar="FOLDER", help="folder with .csv and .xsb recordings")
+    report_parser.add_argument("--out", help="output folder for the tables and the cache (default: FOLDER/report)")
+    report_parser.add_argument("--schema", help="channel schema JSON file with the reported gases")
+    report_parser.add_argument("--threshold", action="append", metavar="GAS=VALUE",
+                               help="report the time above a threshold, e.g. CO=0.003, repeat for several gases")
+    report_parser.add_argument("--max-gap", type=float, default=60.0,
+                               help="longest interval between two samples counted as measuring time, in seconds")
+    report_parser.add_argument("--jobs", type=int, help="worker processes (default: number of CPUs)")
+    report_parser.add_argument("--pdf", action="store_true", help="also write the daily summary as report.pdf")
+    report_parser.add_argument("--no-cache", action="store_true", help="process every recording again")
+    report_parser.set_defaults(func=report)
+
+    record_parser = commands.add_parser("record", parents=[metrics_options], help="record headless without GUI")
+    record_parser.add_argument("--config", help="INI config file")
+    record_parser.add_argument("--url", action="append", help="login URL of an analyzer, repeat for several")
+    record_parser.add_argument("--user", help="login user (default: $XSTREAM_USER)")
+    record_parser.add_argument("--password", help="login password (default: $XSTREAM_PASSWORD)")
+    record_parser.add_argument("--schema", help="channel schema JSON file")
+    record_parser.add_argument("--out", help="output directory or file (.csv/.xsb)")
+    record_parser.add_argument("--format", action="append", choices=["csv", "xsb", "log"],
+                               help="recording format, log records the raw bottom lines")
+    record_parser.add_argument("--period", type=float, help="sampling period in seconds, e.g. 0.2")
+    record_parser.add_argument("--replay", metavar="RECORDING", help="replay a .csv, .xsb or .log recording")
+    record_parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 for maximum speed")
+    record_parser.add_argument("--loop", action="store_true", help="restart the replay at its end")
+    record_parser.add_argument("--give-up-after", type=float,
+                               help="seconds after which an unreachable analyzer is given up (default: never)")
+    record_parser.add_argument("--statistics", metavar="FILE",
+                               help="JSON file with statistics windows, logged statistics and alarms")
+    record_parser.add_argument("--rotate", metavar="ROTATION",
+                               help="start a new segment hourly, daily or at a size such as 500MB")
+    record_parser.add_argument("--compress", choices=["gzip", "zstd"], help="compress closed segments")
+    record_parser.add_argument("--isolate", action="store_true",
+                               help="run each analyzer session in a supervised child process")
+    record_parser.add_argument("--memory-limit", type=float, metavar="MB",
+                               help="restart an isolated session above this resident memory (default: 1024)")
+    record_parser.add_argument("--status-interval", type=float, default=60.0,
+                               help="seconds between status log lines")
+    record_parser.set_defaults(func=record)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return args.func(args)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# xstream/connection.py
+"""
+This module provides the connection manager that keeps a backend connected. When a read fails, the backend is
+reconnected with bounded exponential backoff, reusing the existing session where possible, instead of ending the
+run. The acquisition loop records the sample slots missed in the meantime as gaps.
+"""
+import time
+
+from xstream.backends import AcquisitionError
+
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+FAILED = "failed"
+
+
+class Backoff:
+    """
+    Bounded exponential backoff.
+
+    Args:
+        initial: First delay in seconds.
+        factor: Growth of the delay after every failed attempt.
+        maximum: Upper bound of the delay in seconds.
+    """
+
+    def __init__(self, initial=0.5, factor=2.0, maximum=30.0):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self._delay = initial
+
+    def next_delay(self):
+        """Returns the delay before the next attempt and increases it for the one after."""
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.maximum)
+        return delay
+
+    def reset(self):
+        self._delay = self.initial
+
+
+class ConnectionManager:
+    """
+    Tracks the connection state of one backend and schedules its reconnect attempts.
+
+    Args:
+        backend: The acquisition backend, see xstream.backends.
+        backoff: Backoff between the attempts, defaults to 0.5 s doubling up to 30 s.
+        give_up_after: Seconds after which a lost connection is given up (state FAILED), None retries forever.
+    """
+
+    def __init__(self, backend, backoff=None, give_up_after=None):
+        self.backend = backend
+        self.backoff = backoff or Backoff()
+        self.give_up_after = give_up_after
+        self.state = CONNECTED
+        self.lost_since = None  # monotonic
+        self.attempts = 0
+        self.last_error = None
+        self._next_attempt = None
+
+    def lost(self, error, now=None):
+        """Marks the connection as lost. The first reconnect attempt is due immediately."""
+        now = time.monotonic() if now is None else now
+        self.state = RECONNECTING
+        self.lost_since = now
+        self.attempts = 0
+        self.last_error = error
+        self._next_attempt = now
+        self.backoff.reset()
+
+    def due(self, now=None):
+        """Returns True if a reconnect attempt should be made now."""
+        now = time.monotonic() if now is None else now
+        return self.state == RECONNECTING and now >= self._next_attempt
+
+    def outage(self, now=None):
+        """Returns the seconds since the connection was lost, 0 while connected."""
+        if self.lost_since is None:
+            return 0.0
+        return (time.monotonic() if now is None else now) - self.lost_since
+
+    def try_reconnect(self):
+        """
+        Makes one reconnect attempt.
+
+        Returns:
+            bool: True if the backend is connected again.
+
+        Raises:
+            AcquisitionError: If the attempt failed and give_up_after has been exceeded (state FAILED).
+        """
+        self.attempts += 1
+        try:
+            self.backend.reconnect()
+        except AcquisitionError as e:
+            self.last_error = e
+            now = time.monotonic()
+            if self.give_up_after is not None and now - self.lost_since >= self.give_up_after:
+                self.state = FAILED
+                raise AcquisitionError(f"Reconnect failed after {self.attempts} attempts: {e}") from e
+            self._next_attempt = now + self.backoff.next_delay()
+            return False
+        self.state = CONNECTED
+        self.lost_since = None
+        self.backoff.reset()
+        return True
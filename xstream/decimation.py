@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# xstream/decimation.py
+"""
+This module provides the unbounded sample history of a run together with a multi-resolution min/max pyramid. The
+full-resolution samples stay in memory, every level of the pyramid summarizes `factor` buckets of the level below
+and is updated incrementally with each sample, so any time range can be displayed with a bounded number of points.
+"""
+import numpy as np
+
+
+class _GrowableArray:
+    """Append-only NumPy array with amortized O(1) appends."""
+
+    def __init__(self, columns=None, dtype=np.float64, capacity=4096):
+        shape = (capacity,) if columns is None else (capacity, columns)
+        self._data = np.empty(shape, dtype=dtype)
+        self.size = 0
+
+    def append(self, row):
+        if self.size == len(self._data):
+            grown = np.empty((2 * len(self._data),) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self.size] = self._data
+            self._data = grown
+        self._data[self.size] = row
+        self.size += 1
+
+    @property
+    def data(self):
+        return self._data[:self.size]
+
+
+class MinMaxPyramid:
+    """
+    Full-resolution history with min/max decimation levels.
+
+    Args:
+        channels: Keys of the channels.
+        factor: Number of buckets of a level combined into one bucket of the next level.
+        levels: Number of decimation levels above the raw data.
+    """
+
+    def __init__(self, channels, factor=8, levels=8):
+        self.channels = list(channels)
+        self.factor = factor
+        self._index = {channel: i for i, channel in enumerate(self.channels)}
+        self._times = _GrowableArray()
+        self._values = _GrowableArray(len(self.channels), dtype=np.float32)
+        # Pro Ebene: Start- und Endzeit sowie Minimum und Maximum jedes Buckets
+        self._levels = [
+            {"start": _GrowableArray(), "end": _GrowableArray(),
+             "min": _GrowableArray(len(self.channels), dtype=np.float32),
+             "max": _GrowableArray(len(self.channels), dtype=np.float32)}
+            for _ in range(levels)
+        ]
+
+    def __len__(self):
+        return self._times.size
+
+    def append(self, timestamp, values):
+        """Appends one sample, values as dictionary channel -> value."""
+        self._times.append(timestamp)
+        self._values.append([values.get(channel, np.nan) for channel in self.channels])
+
+        # Abgeschlossene Buckets an die nächsthöhere Ebene weitergeben
+        below_start, below_end = self._times.data, self._times.data
+        below_min, below_max = self._values.data, self._values.data
+        count = self._times.size
+        for level in self._levels:
+            if count % self.factor:
+                break
+            level["start"].append(below_start[-self.factor])
+            level["end"].append(below_end[-1])
+            level["min"].append(np.fmin.reduce(below_min[-self.factor:], axis=0))
+            level["max"].append(np.fmax.reduce(below_max[-self.factor:], axis=0))
+            below_start, below_end = level["start"].data, level["end"].data
+            below_min, below_max = level["min"].data, level["max"].data
+            count = level["start"].size
+
+    def time_range(self):
+        """Returns (first, last) timestamp or None."""
+        if not len(self):
+            return None
+        times = self._times.data
+        return times[0], times[-1]
+
+    def raw(self, start=None, stop=None):
+        """Returns the full-resolution timestamps and values, optionally limited to [start, stop]."""
+        times = self._times.data
+        first = 0 if start is None else np.searchsorted(times, start, side="left")
+        last = len(times) if stop is None else np.searchsorted(times, stop, side="right")
+        return times[first:last], self._values.data[first:last]
+
+    def query(self, start, stop, max_points=2000):
+        """
+        Returns a decimated view of [start, stop] with at most about max_points points per channel.
+
+        Returns:
+            Tuple: Timestamps (n,) and a dictionary channel -> values (n,).
+        """
+        times = self._times.data
+        first = max(int(np.searchsorted(times, start, side="left")) - 1, 0)
+        last = min(int(np.searchsorted(times, stop, side="right")) + 1, len(times))
+        x_parts, y_parts = self._decimate(first, last, max(max_points // 2, 1))
+        if not x_parts:
+            return np.empty(0), {channel: np.empty(0, dtype=np.float32) for channel in self.channels}
+        x = np.concatenate(x_parts) if len(x_parts) > 1 else x_parts[0]
+        y = np.concatenate(y_parts) if len(y_parts) > 1 else y_parts[0]
+        return x, {channel: y[:, i] for channel, i in self._index.items()}
+
+    def _decimate(self, first, last, max_buckets):
+        # Gröbste nötige Ebene wählen, sodass höchstens etwa max_buckets Buckets entstehen
+        level_index = 0
+        bucket = 1
+        while level_index < len(self._levels) and (last - first) // bucket > max_buckets:
+            level_index += 1
+            bucket *= self.factor
+        return self._emit(first, last, level_index)
+
+    def _emit(self, first, last, level_index):
+        if last <= first:
+            return [], []
+        if level_index == 0:
+            return [self._times.data[first:last]], [self._values.data[first:last]]
+
+        bucket = self.factor ** level_index
+        level = self._levels[level_index - 1]
+        first_bucket = -(-first // bucket)
+        last_bucket = min(last // bucket, level["start"].size)
+        if last_bucket <= first_bucket:
+            return self._emit(first, last, level_index - 1)
+
+        # Jeder Bucket liefert zwei Punkte: Minimum am Anfang, Maximum am Ende
+        count = last_bucket - first_bucket
+        x = np.empty(2 * count)
+        x[0::2] = level["start"].data[first_bucket:last_bucket]
+        x[1::2] = level["end"].data[first_bucket:last_bucket]
+        y = np.empty((2 * count, len(self.channels)), dtype=np.float32)
+        y[0::2] = level["min"].data[first_bucket:last_bucket]
+        y[1::2] = level["max"].data[first_bucket:last_bucket]
+
+        # Angeschnittene Buckets am Rand mit der nächstfeineren Ebene auffüllen
+        head_x, head_y = self._emit(first, first_bucket * bucket, level_index - 1)
+        tail_x, tail_y = self._emit(last_bucket * bucket, last, level_index - 1)
+        return head_x + [x] + tail_x, head_y + [y] + tail_y
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# xstream/fakeanalyzer.py
+"""
+This module provides a local fake X-STREAM analyzer. It serves a login page, a frameset with the frames "oben" and
+"unten" and a bottom line with slowly varying gas values, so the acquisition backends can be used without hardware.
+
+Run it with:  python -m xstream.fakeanalyzer --port 8088
+and connect to http://127.0.0.1:8088/login.htm (user "admin", password "admin").
+"""
+import argparse
+import math
+import secrets
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LOGIN_PAGE = """<html><head><title>X-STREAM Login</title></head><body>
+<form method="post" action="login.htm">
+<input type="text" name="user" value="">
+<input type="password" name="password" value="">
+<input type="submit" value="Login">
+</form>
+</body></html>"""
+
+FRAMESET_PAGE = """<html><head><title>X-STREAM</title></head>
+<frameset rows="*,40">
+<frame name="oben" src="oben.htm">
+<frame name="unten" src="unten.htm">
+</frameset></html>"""
+
+TOP_PAGE = "<html><body><h1>X-STREAM</h1></body></html>"
+
+BOTTOM_PAGE = """<html><head><meta http-equiv="refresh" content="1"></head><body><table><tr>
+<td id="btmline">{line}</td>
+</tr></table></body></html>"""
+
+# (Kanal, Grundwert, Amplitude, Periode in s)
+CHANNELS = [
+    (1, 0.02, 0.01, 300.0),
+    (2, 0.00, 0.005, 420.0),
+    (3, 0.01, 0.005, 600.0),
+    (4, 0.11, 0.05, 180.0),
+    (5, 20.95, 0.2, 900.0),
+]
+
+
+def bottom_line(now=None):
+    """Returns a bottom line in the format of the analyzer for the given time."""
+    now = time.time() if now is None else now
+    parts = []
+    for channel, base, amplitude, period in CHANNELS:
+        value = max(base + amplitude * math.sin(2 * math.pi * now / period), 0.0)
+        parts.append(f"Ch{channel}/R4:&nbsp;{value:5.2f} Vol%")
+    return "&nbsp;&nbsp;".join(parts)
+
+
+class FakeAnalyzerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive wie beim echten Webserver
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.track_connection(self.connection, True)
+
+    def finish(self):
+        self.server.track_connection(self.connection, False)
+        super().finish()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body="", headers=None):
+        payload = body.encode("latin-1")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=iso-8859-1")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _redirect(self, location, headers=None):
+        headers = dict(headers or {})
+        headers["Location"] = location
+        self._send(303, headers=headers)
+
+    def _session_valid(self):
+        cookies = self.headers.get("Cookie") or ""
+        for item in cookies.split(";"):
+            key, _, value = item.strip().partition("=")
+            if key == "session" and value in self.server.sessions:
+                return True
+        return not self.server.require_login
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        path = urlsplit(self.path).path
+        self.server.count_request()
+        if path in ("/", "/login.htm"):
+            if path == "/" and self._session_valid():
+                self._send(200, FRAMESET_PAGE)
+            else:
+                self._send(200, LOGIN_PAGE)
+        elif path == "/index.htm":
+            if self._session_valid():
+                self._send(200, FRAMESET_PAGE)
+            else:
+                self._redirect("/login.htm")
+        elif path == "/oben.htm":
+            self._send(200, TOP_PAGE)
+        elif path == "/unten.htm":
+            # Eine abgelaufene Sitzung liefert wie beim Gerät die Login-Seite
+            if self._session_valid():
+                self._send(200, BOTTOM_PAGE.format(line=bottom_line()))
+            else:
+                self._send(200, LOGIN_PAGE)
+        else:
+            self._send(404, "<html><body>Not found</body></html>")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        fields = parse_qs(self.rfile.read(length).decode("latin-1"))
+        self.server.count_request()
+        if path != "/login.htm":
+            self._send(404, "<html><body>Not found</body></html>")
+            return
+        user = fields.get("user", [""])[0]
+        password = fields.get("password", [""])[0]
+        if (user, password) != (self.server.username, self.server.password):
+            self._send(200, LOGIN_PAGE)
+            return
+        token = secrets.token_hex(8)
+        self.server.sessions.add(token)
+        self._redirect("/index.htm", {"Set-Cookie": f"session={token}; Path=/"})
+
+
+class FakeAnalyzer(ThreadingHTTPServer):
+    """
+    HTTP server that imitates the web interface of an X-STREAM analyzer.
+
+    Args:
+        host: Interface to bind to.
+        port: Port to bind to, 0 selects a free port.
+        username: Accepted user name.
+        password: Accepted password.
+        require_login: If False, the frames are served without a session.
+        latency: Artificial delay of every GET request in seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, username="admin", password="admin", require_login=True,
+                 latency=0.0, verbose=False):
+        super().__init__((host, port), FakeAnalyzerHandler)
+        self.username = username
+        self.password = password
+        self.require_login = require_login
+        self.latency = latency
+        self.verbose = verbose
+        self.sessions = set()
+        self.requests = 0
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def login_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/login.htm"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def track_connection(self, connection, is_open):
+        with self._lock:
+            if is_open:
+                self._connections.add(connection)
+            else:
+                self._connections.discard(connection)
+
+    def drop_connections(self):
+        """Closes all open keep-alive connections, e.g. to simulate a network interruption."""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def expire_sessions(self):
+        """Invalidates all sessions, e.g. to simulate a reboot of the analyzer."""
+        self.sessions.clear()
+
+    def start(self):
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name="FakeAnalyzer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.drop_connections()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake X-STREAM analyzer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--no-login", action="store_true", help="serve the frames without a session")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay of every GET request in seconds")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeAnalyzer(args.host, args.port, args.user, args.password, require_login=not args.no_login,
+                          latency=args.latency, verbose=args.verbose)
+    print(f"Fake analyzer listening on {server.login_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,672 @@
+# -*- coding: utf-8 -*-
+# xstream/history.py
+"""
+This module provides random access to large recordings for the history view. A recording is divided into blocks of
+BLOCK_ROWS lines; the index stores the byte offset, the time span and the minimum and maximum of every column per
+device for each block. Any time range is then drawn with a bounded number of points: wide ranges from a min/max
+pyramid over the blocks, narrow ranges from the raw rows, which are parsed directly from the memory-mapped file.
+
+Building the index of a CSV recording requires one pass over the file. It is cached next to the recording
+(<recording>.xsidx) and extended incrementally when the recording has grown since, e.g. while it is still being
+written. Binary recordings (.xsb) are read into memory and indexed on open.
+
+Compressed segments (.csv.gz, .csv.zst) are decompressed into memory only when their rows are needed; with a cached
+index, drawing wide ranges does not decompress them at all. Segmented recordings are opened through their manifest
+(see xstream.recorder.SegmentManifest) by SegmentedHistory, which reads only the segments overlapping a query.
+"""
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from xstream.recorder import (MANIFEST_EXTENSION, CsvRecorder, RecorderError, open_recording,
+                              parse_timestamp, read_binary, read_manifest, select_segments, split_compression)
+
+INDEX_VERSION = 2
+INDEX_EXTENSION = ".xsidx"
+# Zeilen je Block und Blöcke je Bucket der nächsthöheren Ebene
+BLOCK_ROWS = 64
+LEVEL_FACTOR = 8
+# Bereiche mit bis zu RAW_FACTOR * max_points Zeilen werden aus den Rohdaten dezimiert
+RAW_FACTOR = 4
+# Anzahl der zwischengespeicherten geparsten Blöcke
+BLOCK_CACHE_SIZE = 1024
+# Bytes, die beim Aufbau des Index auf einmal gelesen werden
+SCAN_BYTES = 8 * 2 ** 20
+# Der Anfang der Datei identifiziert die Aufzeichnung, deren Index zwischengespeichert ist
+HEAD_BYTES = 65536
+# Anzahl der komprimierten Segmente, die gleichzeitig entpackt im Speicher bleiben
+UNPACKED_SEGMENTS = 4
+_EPOCH = datetime(1970, 1, 1)
+# Arrays des Index je Block
+INDEX_ARRAYS = ("offsets", "starts", "ends", "minima", "maxima", "falling", "counts")
+
+
+class HistoryError(Exception):
+    """Raised when a recording cannot be opened in the history view."""
+
+
+def index_path(path):
+    return path + INDEX_EXTENSION
+
+
+def _utc_offset(naive_seconds):
+    """Returns local time minus UTC in seconds at the local wall-clock time given as naive epoch seconds."""
+    return naive_seconds - (_EPOCH + timedelta(seconds=naive_seconds)).timestamp()
+
+
+class _CsvSource:
+    """
+    Parses byte ranges of a CSV recording through a memory map. A compressed recording is decompressed into memory on
+    the first read (load) and can be released again; its size is unknown until then.
+    """
+
+    def __init__(self, path, timestamp_format=CsvRecorder.timestamp_format):
+        self.path = path
+        self.timestamp_format = timestamp_format
+        self.compressed = split_compression(path)[1] is not None
+        self._file = None
+        self._map = None
+        if self.compressed:
+            with open_recording(path) as file:
+                self._head = file.read(HEAD_BYTES)
+            self.size = None
+        else:
+            self._file = open(path, "rb")
+            self.size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+            self._head = self._map[:HEAD_BYTES]
+        header_line = self._head[:self._head.find(b"\n") + 1]
+        header = next(csv.reader([header_line.decode("utf-8").strip()]), None)
+        if not header or header[0] != "Timestamp":
+            self.close()
+            raise HistoryError(f"{path} is not an X-STREAM CSV recording.")
+        self.has_device = len(header) > 1 and header[1] == "Device"
+        self.columns = header[2:] if self.has_device else header[1:]
+        self.data_offset = len(header_line)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+
+    def load(self):
+        """Makes the data available for read, decompressing a compressed recording."""
+        if self._map is None:
+            with open_recording(self.path) as file:
+                self._map = file.read()
+            self.size = len(self._map)
+
+    def release(self):
+        """Frees the decompressed data of a compressed recording."""
+        if self.compressed:
+            self._map = None
+
+    @property
+    def loaded(self):
+        return self._map is not None
+
+    def head_digest(self, end):
+        """Returns a digest of the first bytes, at most up to end, so a recording that has grown keeps it."""
+        return hashlib.sha1(self._head[:end]).hexdigest()
+
+    def read(self, start, stop):
+        """Returns the complete lines in [start, stop) as bytes and the offset behind the last one."""
+        self.load()
+        data = self._map[start:stop]
+        end = data.rfind(b"\n") + 1
+        return data[:end], start + end
+
+    def parse(self, data):
+        """
+        Parses complete lines of the recording.
+
+        Returns:
+            Tuple: Indices of the parsed lines, epoch timestamps (float64), device names (list or None) and values
+            (float32, shape (n, columns)). Empty and unreadable lines are skipped.
+        """
+        width = len(self.columns) + (2 if self.has_device else 1)
+        count = data.count(b"\n")
+        fields = data.replace(b"\r", b"").replace(b"\n", b",").split(b",")[:-1]
+        if b'"' in data or len(fields) != count * width:
+            return self._parse_rows(data, width)
+        # Schneller Weg für unmaskierte Zeilen gleicher Länge, wie sie CsvRecorder schreibt
+        lines = np.arange(count, dtype=np.int64)
+        texts = np.array(fields[0::width])
+        del fields[0::width]
+        devices = None
+        if self.has_device:
+            devices = [name.decode("utf-8", "replace") for name in fields[0::width - 1]]
+            del fields[0::width - 1]
+        values = np.array([_to_float(cell) for cell in fields], dtype=np.float32).reshape(count, len(self.columns))
+        timestamps, valid = self._timestamps(texts)
+        if not valid.all():
+            lines, timestamps, values = lines[valid], timestamps[valid], values[valid]
+            devices = None if devices is None else [name for name, keep in zip(devices, valid.tolist()) if keep]
+        return lines, timestamps, devices, values
+
+    def _parse_rows(self, data, width):
+        lines, rows = [], []
+        for i, row in enumerate(csv.reader(data.decode("utf-8", "replace").splitlines())):
+            if row and row[0]:
+                lines.append(i)
+                rows.append(row[:width] + [""] * (width - len(row)))
+        if not rows:
+            return (np.empty(0, dtype=np.int64), np.empty(0), [] if self.has_device else None,
+                    np.empty((0, len(self.columns)), dtype=np.float32))
+        cells = np.array(rows)
+        first = 2 if self.has_device else 1
+        values = np.array([[_to_float(cell) for cell in row] for row in cells[:, first:].tolist()], dtype=np.float32)
+        lines = np.array(lines, dtype=np.int64)
+        timestamps, valid = self._timestamps(cells[:, 0])
+        devices = cells[valid, 1].tolist() if self.has_device else None
+        return lines[valid], timestamps[valid], devices, values[valid].reshape(-1, len(self.columns))
+
+    def _timestamps(self, texts):
+        try:
+            # Millisekunden, sonst würden die Nachkommastellen der Zeitstempel abgeschnitten
+            naive = texts.astype("datetime64[ms]").astype(np.int64)
+        except ValueError:
+            naive = None
+        if naive is not None and len(naive):
+            offset = _utc_offset(int(naive[0]) // 1000)
+            if offset == _utc_offset(int(naive[-1]) // 1000):
+                return naive / 1000 - offset, np.ones(len(naive), dtype=bool)
+        # Andere Zeitstempelformate oder eine Zeitumstellung innerhalb des Abschnitts: zeilenweise umrechnen
+        timestamps = np.full(len(texts), np.nan)
+        for i, text in enumerate(texts.tolist()):
+            try:
+                if isinstance(text, bytes):
+                    text = text.decode("utf-8", "replace")
+                timestamps[i] = parse_timestamp(text, self.timestamp_format)
+            except ValueError:
+                pass
+        return timestamps, ~np.isnan(timestamps)
+
+
+def _to_float(cell):
+    try:
+        return float(cell) if cell else math.nan
+    except ValueError:
+        return math.nan
+
+
+class _Blocks:
+    """Index arrays of the blocks, accumulated chunk by chunk."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.devices = []
+        self._device_index = {}
+        self.offsets, self.starts, self.ends, self.minima, self.maxima, self.counts = [], [], [], [], [], []
+        self.falling = []  # True, wenn das Maximum vor dem Minimum liegt
+
+    def device_indices(self, names, rows):
+        if names is None:
+            if not self.devices:
+                self.devices.append("")
+                self._device_index[""] = 0
+            return np.zeros(rows, dtype=np.int64)
+        unique, inverse = np.unique(np.array(names), return_inverse=True)
+        for name in unique.tolist():
+            if name not in self._device_index:
+                self._device_index[name] = len(self.devices)
+                self.devices.append(name)
+        mapping = np.array([self._device_index[name] for name in unique.tolist()], dtype=np.int64)
+        return mapping[inverse]
+
+    def add(self, block_offsets, block_ids, timestamps, devices, values):
+        """
+        Adds the blocks of one chunk.
+
+        Args:
+            block_offsets: Offset of every block of the chunk, including blocks without rows.
+            block_ids: Block of every row, relative to the chunk.
+            timestamps, devices, values: Rows of the chunk, devices as indices.
+        """
+        if not len(timestamps):
+            return
+        blocks, first_rows = np.unique(block_ids, return_index=True)
+        self.offsets.append(np.asarray(block_offsets, dtype=np.int64)[blocks])
+        self.starts.append(np.fmin.reduceat(timestamps, first_rows))
+        self.ends.append(np.fmax.reduceat(timestamps, first_rows))
+        # Minimum und Maximum je Block und Gerät
+        devices_count = len(self.devices)
+        position = np.searchsorted(blocks, block_ids)
+        key = position * devices_count + devices
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        groups = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+        minima = np.full((len(blocks), devices_count, len(self.columns)), np.nan, dtype=np.float32)
+        maxima = minima.copy()
+        falling = np.zeros(minima.shape, dtype=bool)
+        counts = np.zeros((len(blocks), devices_count), dtype=np.int64)
+        sorted_values = values[order]
+        group_keys = key[groups]
+        sizes = np.diff(np.append(groups, len(key)))
+        group_minima = np.fmin.reduceat(sorted_values, groups)
+        group_maxima = np.fmax.reduceat(sorted_values, groups)
+        # Erste Zeile jeder Gruppe mit ihrem Minimum bzw. Maximum, die Reihenfolge der Zeilen ist erhalten
+        rows = np.arange(len(key))[:, None]
+        first_minimum = np.minimum.reduceat(
+            np.where(sorted_values == np.repeat(group_minima, sizes, axis=0), rows, len(key)), groups)
+        first_maximum = np.minimum.reduceat(
+            np.where(sorted_values == np.repeat(group_maxima, sizes, axis=0), rows, len(key)), groups)
+        minima[group_keys // devices_count, group_keys % devices_count] = group_minima
+        maxima[group_keys // devices_count, group_keys % devices_count] = group_maxima
+        falling[group_keys // devices_count, group_keys % devices_count] = first_maximum < first_minimum
+        counts[group_keys // devices_count, group_keys % devices_count] = sizes
+        self.minima.append(minima)
+        self.maxima.append(maxima)
+        self.falling.append(falling)
+        self.counts.append(counts)
+
+    def arrays(self):
+        devices_count = max(len(self.devices), 1)
+
+        def pad(parts, tail, dtype, fill):
+            # Später hinzugekommene Geräte in den früheren Abschnitten ergänzen
+            padded = [part if part.shape[1] == devices_count else np.concatenate(
+                [part, np.full((len(part), devices_count - part.shape[1]) + tail, fill, dtype)], axis=1)
+                for part in parts]
+            return np.concatenate(padded) if padded else np.empty((0, devices_count) + tail, dtype=dtype)
+
+        def concatenate(parts, dtype):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return {"offsets": concatenate(self.offsets, np.int64), "starts": concatenate(self.starts, np.float64),
+                "ends": concatenate(self.ends, np.float64),
+                "minima": pad(self.minima, (len(self.columns),), np.float32, np.nan),
+                "maxima": pad(self.maxima, (len(self.columns),), np.float32, np.nan),
+                "falling": pad(self.falling, (len(self.columns),), bool, False),
+                "counts": pad(self.counts, (), np.int64, 0)}
+
+
+class HistoryFile:
+    """
+    A recording opened for the history view.
+
+    Args:
+        path: Path of a CSV (.csv) or binary (.xsb) recording, also of a compressed segment (.gz, .zst).
+        progress: Called with the indexed fraction of the file (0..1) while the index is built.
+        use_cache: If False, the index is neither read from nor written to <path>.xsidx.
+    """
+
+    def __init__(self, path, progress=None, use_cache=True):
+        self.path = path
+        self.progress = progress
+        self.from_cache = False
+        self._block_cache = OrderedDict()  # Block -> (Zeitstempel, Geräteindizes, Werte)
+        extension = os.path.splitext(split_compression(path)[0])[1].lower()
+        try:
+            if extension == ".csv":
+                self._source = _CsvSource(path)
+                self.columns = self._source.columns
+                self._open_csv(use_cache)
+            elif extension == ".xsb":
+                self._source = None
+                self._open_binary()
+            else:
+                raise HistoryError(f"Unknown recording format: {path}")
+        except (OSError, ValueError, RecorderError) as e:
+            raise HistoryError(f"Cannot open recording {path}: {e}") from e
+        self._build_levels()
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    # Aufbau und Zwischenspeicherung des Index
+
+    def _open_csv(self, use_cache):
+        source = self._source
+        arrays, meta = (self._load_cache(source) if use_cache else (None, None))
+        blocks = _Blocks(self.columns)
+        start = source.data_offset
+        if arrays is not None and source.compressed:
+            # Komprimierte Segmente sind abgeschlossen, der Index ist vollständig
+            self.from_cache = True
+            self._set_arrays(arrays, meta["devices"], meta["end"])
+            return
+        if arrays is not None:
+            # Bis zum letzten, evtl. unvollständigen Block übernehmen, den Rest neu einlesen
+            keep = max(len(arrays["offsets"]) - 1, 0)
+            blocks.devices = list(meta["devices"])
+            blocks._device_index = {device: i for i, device in enumerate(blocks.devices)}
+            for key in INDEX_ARRAYS:
+                getattr(blocks, key).append(arrays[key][:keep])
+            start = int(arrays["offsets"][keep]) if keep < len(arrays["offsets"]) else start
+            self.from_cache = True
+        end = self._scan(blocks, start)
+        self._set_arrays(blocks.arrays(), blocks.devices, end)
+        if use_cache and (arrays is None or end != meta["end"]):
+            self._save_cache(source)
+        source.release()
+
+    def _scan(self, blocks, start):
+        source = self._source
+        source.load()
+        position = start
+        while position < source.size:
+            data, end = source.read(position, min(position + SCAN_BYTES, source.size))
+            if not data:
+                break  # Nur noch eine unvollständige letzte Zeile
+            # Beginn jeder Zeile im Abschnitt
+            offsets = np.concatenate(([0], np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1))
+            if end < source.size and len(offsets) > BLOCK_ROWS + 1:
+                # Abschnitte aus ganzen Blöcken lesen, angebrochene Blöcke mit dem nächsten Abschnitt
+                offsets = offsets[:len(offsets) - (len(offsets) - 1) % BLOCK_ROWS]
+                data = data[:offsets[-1]]
+            lines, timestamps, names, values = source.parse(data)
+            devices = blocks.device_indices(names, len(lines))
+            blocks.add(position + offsets[:-1:BLOCK_ROWS], lines // BLOCK_ROWS, timestamps, devices, values)
+            position += int(offsets[-1])
+            if self.progress is not None:
+                self.progress(position / source.size)
+        return position
+
+    def _set_arrays(self, arrays, devices, end):
+        self.devices = list(devices) or [""]
+        self.end = end
+        self.offsets = np.append(arrays["offsets"], end)  # Block b umfasst offsets[b] bis offsets[b + 1]
+        self.starts, self.ends = arrays["starts"], arrays["ends"]
+        self.minima, self.maxima, self.counts = arrays["minima"], arrays["maxima"], arrays["counts"]
+        self.falling = arrays["falling"]
+        self.rows = int(self.counts.sum())
+
+    def _load_cache(self, source):
+        try:
+            with np.load(index_path(self.path), allow_pickle=False) as cache:
+                meta = json.loads(str(cache["meta"]))
+                arrays = {key: cache[key] for key in INDEX_ARRAYS}
+        except (OSError, ValueError, KeyError):
+            return None, None
+        if (meta.get("version") != INDEX_VERSION or meta.get("block_rows") != BLOCK_ROWS
+                or meta.get("columns") != self.columns or meta.get("head") != source.head_digest(meta.get("end", 0))
+                or (source.size is not None and meta.get("end", 0) > source.size)):
+            return None, None  # Andere oder gekürzte Aufzeichnung: Index neu aufbauen
+        return arrays, meta
+
+    def _save_cache(self, source):
+        meta = {"version": INDEX_VERSION, "block_rows": BLOCK_ROWS, "columns": self.columns, "devices": self.devices,
+                "head": source.head_digest(self.end), "end": self.end}
+        temporary = index_path(self.path) + ".tmp"
+        try:
+            with open(temporary, "wb") as file:
+                np.savez(file, meta=np.array(json.dumps(meta)), offsets=self.offsets[:-1], starts=self.starts,
+                         ends=self.ends, minima=self.minima, maxima=self.maxima, falling=self.falling,
+                         counts=self.counts)
+            os.replace(temporary, index_path(self.path))
+        except OSError:
+            pass  # Ohne Schreibrecht wird der Index beim nächsten Öffnen neu aufgebaut
+
+    def _open_binary(self):
+        timestamps, values, self.columns, names = read_binary(self.path, with_devices=True)
+        blocks = _Blocks(self.columns)
+        devices = blocks.device_indices(names.tolist() if len(set(names.tolist()) - {""}) else None, len(timestamps))
+        rows = np.arange(len(timestamps))
+        blocks.add(rows[::BLOCK_ROWS], rows // BLOCK_ROWS, timestamps, devices, values)
+        self._set_arrays(blocks.arrays(), blocks.devices, len(timestamps))
+        self._timestamps, self._values, self._devices = timestamps, values, devices
+
+    def _build_levels(self):
+        # Ebene 0 sind die Blöcke, jede weitere fasst LEVEL_FACTOR Buckets zusammen
+        self.levels = [(self.starts, self.ends, self.minima, self.maxima, self.falling)]
+        while len(self.levels[-1][0]) > 1:
+            starts, ends, minima, maxima, falling = self.levels[-1]
+            groups = np.arange(0, len(starts), LEVEL_FACTOR)
+            self.levels.append((np.fmin.reduceat(starts, groups), np.fmax.reduceat(ends, groups),
+                                np.fmin.reduceat(minima, groups), np.fmax.reduceat(maxima, groups),
+                                _group_falling(minima, maxima, falling, LEVEL_FACTOR)))
+
+    # Abfragen
+
+    def time_range(self):
+        """Returns (first, last) timestamp or None for an empty recording."""
+        if not len(self.starts):
+            return None
+        return float(self.starts[0]), float(self.ends[-1])
+
+    def raw(self, start, stop, device=""):
+        """Returns the timestamps and values (n, columns) of a device in [start, stop] at full resolution."""
+        first, last = self._block_range(start, stop)
+        timestamps, values = self._read_blocks(first, last, device)
+        mask = (timestamps >= start) & (timestamps <= stop)
+        return timestamps[mask], values[mask]
+
+    def query(self, start, stop, device="", max_points=4000):
+        """
+        Returns a decimated view of [start, stop] with at most about max_points points per column, plus the
+        neighbouring points outside so that the curves continue to the edges.
+
+        Returns:
+            Tuple: Timestamps (n,) and a dictionary column -> values (n,).
+        """
+        first, last = self._block_range(start, stop)
+        device_index = self.devices.index(device)
+        rows = int(self.counts[first:last, device_index].sum())
+        if rows <= RAW_FACTOR * max_points:
+            # Schmale Bereiche aus den Rohdaten, bei Bedarf im Speicher dezimiert
+            x, y = self._read_blocks(first, last, device)
+            if len(x) > max_points:
+                x, y = _decimate(x, y, max(max_points // 2, 1))
+        else:
+            # Breite Bereiche aus der feinsten Ebene mit höchstens max_points Punkten
+            level = 0
+            while level + 1 < len(self.levels) and 2 * (last - first) / LEVEL_FACTOR ** level > max_points:
+                level += 1
+            scale = LEVEL_FACTOR ** level
+            starts, ends, minima, maxima, falling = (array[first // scale:-(-last // scale)]
+                                                     for array in self.levels[level])
+            x, y = _min_max_points(starts, ends, minima[:, device_index], maxima[:, device_index],
+                                   falling[:, device_index])
+        return x, {column: y[:, i] for i, column in enumerate(self.columns)}
+
+    def _block_range(self, start, stop):
+        first = max(int(np.searchsorted(self.ends, start, side="left")) - 1, 0)
+        last = min(int(np.searchsorted(self.starts, stop, side="right")) + 1, len(self.starts))
+        return first, max(last, first)
+
+    def _read_blocks(self, first, last, device):
+        """Returns the rows of a device in the blocks [first, last)."""
+        device_index = self.devices.index(device)
+        if last <= first:
+            return np.empty(0), np.empty((0, len(self.columns)), dtype=np.float32)
+        if self._source is None:
+            rows = slice(int(self.offsets[first]), int(self.offsets[last]))
+            mask = self._devices[rows] == device_index
+            return self._timestamps[rows][mask], self._values[rows][mask]
+        # Geparste Blöcke werden zwischengespeichert, beim Verschieben wird nur der neue Rand gelesen
+        missing = [block for block in range(first, last) if block not in self._block_cache]
+        for run_first, run_last in _runs(missing):
+            self._parse_blocks(run_first, run_last)
+        parts = []
+        for block in range(first, last):
+            self._block_cache.move_to_end(block)
+            parts.append(self._block_cache[block])
+        while len(self._block_cache) > BLOCK_CACHE_SIZE:
+            self._block_cache.popitem(last=False)
+        timestamps = np.concatenate([part[0] for part in parts])
+        devices = np.concatenate([part[1] for part in parts])
+        values = np.concatenate([part[2] for part in parts])
+        mask = devices == device_index
+        return timestamps[mask], values[mask]
+
+    def _parse_blocks(self, first, last):
+        start = int(self.offsets[first])
+        data, _ = self._source.read(start, int(self.offsets[last]))
+        line_starts = np.concatenate(([0], np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1))
+        lines, timestamps, names, values = self._source.parse(data)
+        index = {name: i for i, name in enumerate(self.devices)}
+        devices = (np.zeros(len(lines), dtype=np.int64) if names is None
+                   else np.array([index.get(name, -1) for name in names], dtype=np.int64))
+        # Block jeder Zeile anhand ihres Offsets
+        blocks = np.searchsorted(self.offsets, start + line_starts[lines], side="right") - 1
+        bounds = np.searchsorted(blocks, np.arange(first, last + 1))
+        for block, (a, b) in zip(range(first, last), zip(bounds[:-1], bounds[1:])):
+            self._block_cache[block] = (timestamps[a:b], devices[a:b], values[a:b])
+
+
+class SegmentedHistory:
+    """
+    A segmented recording opened for the history view through its manifest (<recording>.manifest.json). The block
+    indexes of all segments are loaded on open; the rows of a segment are only read, and a compressed segment only
+    decompressed, when a query needs them. Provides the interface of HistoryFile.
+
+    Args:
+        path: Path of the manifest.
+        progress: Called with the indexed fraction of the recording (0..1) while the segment indexes are built.
+        use_cache: If False, the segment indexes are neither read from nor written to the cache files.
+    """
+
+    def __init__(self, path, progress=None, use_cache=True):
+        self.path = path
+        try:
+            manifest = read_manifest(path)
+        except (OSError, RecorderError) as e:
+            raise HistoryError(f"Cannot open recording {path}: {e}") from e
+        if manifest["format"] not in ("csv", "xsb"):
+            raise HistoryError(f"The history view cannot show {manifest['format']} recordings.")
+        self.columns = manifest["columns"]
+        self.devices = manifest.get("devices") or [""]
+        self.segments = []  # (Manifest-Eintrag, HistoryFile)
+        self._unpacked = []  # Entpackte komprimierte Segmente, das zuletzt benutzte zuletzt
+        segments = [segment for segment in manifest["segments"] if segment["rows"] or not segment["closed"]]
+        try:
+            for i, segment in enumerate(segments):
+                part = None if progress is None else (lambda fraction, i=i: progress((i + fraction) / len(segments)))
+                self.segments.append((segment, HistoryFile(segment["path"], part, use_cache)))
+        except HistoryError:
+            self.close()
+            raise
+        self.rows = sum(history.rows for _, history in self.segments)
+        self.from_cache = bool(self.segments) and all(history.from_cache for _, history in self.segments)
+
+    def close(self):
+        for _, history in self.segments:
+            history.close()
+        self.segments = []
+
+    def time_range(self):
+        ranges = [history.time_range() for _, history in self.segments]
+        ranges = [time_range for time_range in ranges if time_range is not None]
+        if not ranges:
+            return None
+        return min(first for first, _ in ranges), max(last for _, last in ranges)
+
+    def _select(self, start, stop, device):
+        """Returns (overlap in seconds, HistoryFile) of the segments with rows of the device in [start, stop]."""
+        selected = []
+        for segment in select_segments([segment for segment, _ in self.segments], start, stop):
+            history = next(history for entry, history in self.segments if entry is segment)
+            time_range = history.time_range()
+            if time_range is None or device not in history.devices:
+                continue
+            if time_range[1] >= start and time_range[0] <= stop:
+                selected.append((min(stop, time_range[1]) - max(start, time_range[0]), history))
+        return selected
+
+    def _touch(self, history):
+        # Nur die zuletzt benutzten komprimierten Segmente entpackt halten
+        source = history._source
+        if source is None or not source.compressed:
+            return
+        if history in self._unpacked:
+            self._unpacked.remove(history)
+        self._unpacked.append(history)
+        while len(self._unpacked) > UNPACKED_SEGMENTS:
+            self._unpacked.pop(0)._source.release()
+
+    def raw(self, start, stop, device=""):
+        parts = []
+        for _, history in self._select(start, stop, device):
+            parts.append(history.raw(start, stop, device))
+            self._touch(history)
+        if not parts:
+            return np.empty(0), np.empty((0, len(self.columns)), dtype=np.float32)
+        return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+    def query(self, start, stop, device="", max_points=4000):
+        """Like HistoryFile.query; the points are shared among the segments by their overlap with the range."""
+        selected = self._select(start, stop, device)
+        total = sum(overlap for overlap, _ in selected) or 1.0
+        parts = []
+        for overlap, history in selected:
+            parts.append(history.query(start, stop, device, max(int(max_points * overlap / total), 16)))
+            if history._source is not None and history._source.loaded:
+                self._touch(history)
+        if not parts:
+            return np.empty(0), {column: np.empty(0, dtype=np.float32) for column in self.columns}
+        x = np.concatenate([part[0] for part in parts])
+        return x, {column: np.concatenate([part[1][column] for part in parts]) for column in self.columns}
+
+
+def open_history(path, progress=None, use_cache=True):
+    """Opens a recording or the manifest of a segmented recording for the history view."""
+    if path.lower().endswith(MANIFEST_EXTENSION):
+        return SegmentedHistory(path, progress, use_cache)
+    return HistoryFile(path, progress, use_cache)
+
+
+def _runs(blocks):
+    """Yields (first, last) of the consecutive runs in a sorted list of block numbers."""
+    if not blocks:
+        return
+    run_first = previous = blocks[0]
+    for block in blocks[1:]:
+        if block != previous + 1:
+            yield run_first, previous + 1
+            run_first = block
+        previous = block
+    yield run_first, previous + 1
+
+
+def _min_max_points(starts, ends, minima, maxima, falling):
+    # Jeder Bucket liefert zwei Punkte am Anfang und am Ende, Minimum und Maximum in ihrer zeitlichen Reihenfolge
+    x = np.empty(2 * len(starts))
+    x[0::2], x[1::2] = starts, ends
+    y = np.empty((2 * len(starts), minima.shape[1]), dtype=np.float32)
+    y[0::2], y[1::2] = np.where(falling, maxima, minima), np.where(falling, minima, maxima)
+    return x, y
+
+
+def _first_extremes(minima, maxima):
+    """Returns the positions of the first minimum and maximum along axis 1, ignoring NaN."""
+    return (np.where(np.isnan(minima), np.inf, minima).argmin(axis=1),
+            np.where(np.isnan(maxima), -np.inf, maxima).argmax(axis=1))
+
+
+def _group_falling(minima, maxima, falling, size):
+    """Returns for each group of `size` consecutive buckets whether its maximum comes before its minimum."""
+    count = -(-len(minima) // size)
+
+    def grouped(array, fill):
+        padding = np.full((count * size - len(array),) + array.shape[1:], fill, dtype=array.dtype)
+        return np.concatenate([array, padding]).reshape((count, size) + array.shape[1:])
+
+    low, high = _first_extremes(grouped(minima, np.nan), grouped(maxima, np.nan))
+    # Minimum und Maximum aus demselben Bucket: dessen Reihenfolge gilt
+    same = np.take_along_axis(grouped(falling, False), low[:, None], axis=1)[:, 0]
+    return np.where(low == high, same, high < low)
+
+
+def _decimate(timestamps, values, buckets):
+    """Reduces rows to the minimum and maximum of each of at most `buckets` groups of consecutive rows."""
+    size = -(-len(timestamps) // buckets)
+    count = -(-len(timestamps) // size)
+    padded = np.full((count * size, values.shape[1]), np.nan, dtype=np.float32)
+    padded[:len(values)] = values
+    padded = padded.reshape(count, size, values.shape[1])
+    starts = timestamps[::size]
+    ends = timestamps[np.minimum(np.arange(1, count + 1) * size, len(timestamps)) - 1]
+    low, high = _first_extremes(padded, padded)
+    return _min_max_points(starts, ends, np.fmin.reduce(padded, axis=1), np.fmax.reduce(padded, axis=1), high < low)
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+# xstream/isolation.py
+"""
+This module runs the session of an acquisition backend in a child process, so a hanging Chrome driver, garbage
+collection pauses or memory growth of the Selenium stack cannot stall the GUI or the recorder of the main process.
+
+ProcessBackend can be used wherever a backend is expected. The child creates the real backend with create_backend()
+and runs connect, reconnect and read_batch on request. Commands and replies are small messages on a pipe, the
+bottom lines of every read are passed through a lock-free ring in shared memory (SharedRing) and parsed in the main
+process. A read without an answer within read_timeout, a child that has died and a child whose resident memory
+exceeds memory_limit raise AcquisitionError: the connection manager reconnects, which starts a new child, and the
+acquisition records the missed samples as a gap meanwhile.
+
+The child and every process it starts, e.g. chromedriver and Chrome, form a ProcessTree: a session of its own on
+POSIX systems and a job object on Windows. Stopping the child terminates the whole tree, so a hung browser is not
+left behind, and memory_limit applies to the resident memory of the whole tree.
+"""
+import ctypes
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+import time
+
+from xstream.backends import AcquisitionBackend, AcquisitionError, create_backend
+from xstream.metrics import rss_bytes
+from xstream.parser import BottomLineParser, DEFAULT_CHANNELS
+
+RING_SIZE = 1 << 20
+READ_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 60.0
+# Sekunden, die ein Kindprozess zum Beenden (Browser schließen) bekommt, bevor er abgebrochen wird
+CLOSE_TIMEOUT = 5.0
+MEMORY_LIMIT = 1024 * 2**20
+# Sekunden zwischen zwei Messungen des Speichers, das Durchsuchen aller Prozesse ist nicht kostenlos
+MEMORY_INTERVAL = 5.0
+
+_POSITION = struct.Struct("<Q")
+# Länge des Texts in Bytes und Zeitstempel, danach der Text in UTF-8
+_RECORD = struct.Struct("<Id")
+_WRAP = 0xFFFFFFFF
+
+
+class SharedRing:
+    """
+    Ring of (timestamp, text) records in shared memory for one writing and one reading process. Both positions only
+    grow and each side only stores its own position, after the records it covers, so no lock is needed.
+
+    Args:
+        size: Bytes available for the records.
+        buffer: Shared buffer of an existing ring, e.g. in the child process. None allocates a new one.
+    """
+
+    def __init__(self, size=RING_SIZE, buffer=None):
+        self.buffer = multiprocessing.RawArray(ctypes.c_char, 2 * _POSITION.size + size) if buffer is None else buffer
+        self.size = len(self.buffer) - 2 * _POSITION.size
+        self._view = memoryview(self.buffer).cast("B")
+
+    def _positions(self):
+        return (_POSITION.unpack_from(self._view, 0)[0], _POSITION.unpack_from(self._view, _POSITION.size)[0])
+
+    def put(self, records):
+        """Appends records without blocking. Returns how many fit, the remaining ones are dropped."""
+        write, read = self._positions()
+        base = 2 * _POSITION.size
+        written = 0
+        for timestamp, text in records:
+            data = text.encode("utf-8")
+            length = _RECORD.size + len(data)
+            offset = write % self.size
+            tail = self.size - offset
+            # Ein Datensatz wird nie geteilt: passt er nicht vor das Ende, beginnt er wieder am Anfang
+            skip = tail if tail < length else 0
+            if write + skip + length - read > self.size:
+                break
+            if skip:
+                if tail >= 4:
+                    struct.pack_into("<I", self._view, base + offset, _WRAP)
+                write += skip
+                offset = 0
+            _RECORD.pack_into(self._view, base + offset, len(data), timestamp)
+            start = base + offset + _RECORD.size
+            self._view[start:start + len(data)] = data
+            write += length
+            written += 1
+        _POSITION.pack_into(self._view, 0, write)
+        return written
+
+    def get(self):
+        """Removes and returns all records written since the last call, oldest first."""
+        write, read = self._positions()
+        base = 2 * _POSITION.size
+        records = []
+        while read < write:
+            offset = read % self.size
+            tail = self.size - offset
+            if tail < _RECORD.size or struct.unpack_from("<I", self._view, base + offset)[0] == _WRAP:
+                read += tail
+                continue
+            length, timestamp = _RECORD.unpack_from(self._view, base + offset)
+            start = base + offset + _RECORD.size
+            records.append((timestamp, str(self._view[start:start + length], "utf-8")))
+            read += _RECORD.size + length
+        _POSITION.pack_into(self._view, _POSITION.size, read)
+        return records
+
+    def clear(self):
+        """Discards all unread records, e.g. those of a child that was stopped during a read."""
+        _POSITION.pack_into(self._view, _POSITION.size, self._positions()[0])
+
+
+class ProcessTree:
+    """
+    A child process together with all processes started by it. On POSIX systems the child leads a session of its
+    own (see _serve), on Windows the tree is kept in a job object that also ends it when this process exits. Memory
+    of the tree is only measured on Linux and Windows, elsewhere rss() is 0.
+
+    Args:
+        pid: Process ID of the child, which must not have started any processes yet.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._job = _create_job(pid) if sys.platform == "win32" else None
+
+    def pids(self):
+        """Returns the process IDs of the tree that are still running."""
+        if self._job is not None:
+            return _job_pids(self._job)
+        if not os.path.isdir("/proc"):
+            return [self.pid]
+        pids = []
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat", "rb") as file:
+                    stat = file.read()
+            except OSError:
+                continue
+            # Nach dem Programmnamen in Klammern: Zustand, Elternprozess, Prozessgruppe, Session
+            if int(stat[stat.rindex(b")") + 2:].split()[3]) == self.pid:
+                pids.append(int(name))
+        return pids
+
+    def rss(self):
+        """Returns the sum of the resident memory of all processes of the tree in bytes."""
+        return sum(rss_bytes(pid) for pid in self.pids())
+
+    def kill(self):
+        """Terminates all processes of the tree immediately."""
+        if self._job is not None:
+            ctypes.windll.kernel32.TerminateJobObject(self._job, 1)
+            return
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError:
+            pass  # Die Gruppe existiert nicht mehr
+        # Prozesse, die eine eigene Prozessgruppe gebildet haben, gehören weiter zur Session
+        for pid in self.pids():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def close(self):
+        """Kills what is left of the tree and releases the job object."""
+        self.kill()
+        if self._job is not None:
+            ctypes.windll.kernel32.CloseHandle(self._job)
+            self._job = None
+
+
+def _create_job(pid):
+    """Creates a job object that terminates its processes when it is closed and assigns the process pid to it."""
+    from ctypes import wintypes
+
+    class BasicLimitInformation(ctypes.Structure):
+        _fields_ = [("PerProcessUserTimeLimit", ctypes.c_int64), ("PerJobUserTimeLimit", ctypes.c_int64),
+                    ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+                    ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+                    ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD),
+                    ("SchedulingClass", wintypes.DWORD)]
+
+    class ExtendedLimitInformation(ctypes.Structure):
+        _fields_ = [("BasicLimitInformation", BasicLimitInformation), ("IoInfo", ctypes.c_uint64 * 6),
+                    ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+                    ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t)]
+
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.SetInformationJobObject.argtypes = [wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, wintypes.DWORD]
+    kernel32.AssignProcessToJobObject.argtypes = [wintypes.HANDLE, wintypes.HANDLE]
+    kernel32.TerminateJobObject.argtypes = [wintypes.HANDLE, wintypes.UINT]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        raise AcquisitionError("Cannot create a job object for the session process.")
+    info = ExtendedLimitInformation()
+    info.BasicLimitInformation.LimitFlags = 0x2000  # JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+    # 9 = JobObjectExtendedLimitInformation
+    kernel32.SetInformationJobObject(job, 9, ctypes.byref(info), ctypes.sizeof(info))
+    # PROCESS_SET_QUOTA | PROCESS_TERMINATE
+    process = kernel32.OpenProcess(0x0100 | 0x0001, False, pid)
+    assigned = process and kernel32.AssignProcessToJobObject(job, process)
+    if process:
+        kernel32.CloseHandle(process)
+    if not assigned:
+        kernel32.CloseHandle(job)
+        raise AcquisitionError("Cannot assign the session process to a job object.")
+    return job
+
+
+def _job_pids(job, capacity=1024):
+    from ctypes import wintypes
+
+    class ProcessIdList(ctypes.Structure):
+        _fields_ = [("NumberOfAssignedProcesses", wintypes.DWORD), ("NumberOfProcessIdsInList", wintypes.DWORD),
+                    ("ProcessIdList", ctypes.c_size_t * capacity)]
+
+    kernel32 = ctypes.windll.kernel32
+    kernel32.QueryInformationJobObject.argtypes = [wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, wintypes.DWORD,
+                                                   ctypes.c_void_p]
+    ids = ProcessIdList()
+    # 3 = JobObjectBasicProcessIdList
+    if not kernel32.QueryInformationJobObject(job, 3, ctypes.byref(ids), ctypes.sizeof(ids), None):
+        return []
+    return list(ids.ProcessIdList[:ids.NumberOfProcessIdsInList])
+
+
+def _serve(conn, buffer, backend_name, login_url, options):
+    """Main function of the child process: creates the backend and runs the commands of the parent."""
+    # Strg+C trifft die ganze Prozessgruppe, den Kindprozess beendet aber nur der Hauptprozess
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, "setsid"):
+        # Eigene Session, damit der Hauptprozess den Treiber und den Browser mit dem Kindprozess beenden kann
+        os.setsid()
+    ring = SharedRing(buffer=buffer)
+
+    def login_prompt():
+        # Die Anmeldung bestätigt der Benutzer im Hauptprozess
+        conn.send(("login",))
+        conn.recv()
+
+    backend = create_backend(backend_name, login_url, login_prompt=login_prompt, **options)
+    try:
+        while True:
+            try:
+                command = conn.recv()
+            except EOFError:
+                break  # Der Hauptprozess existiert nicht mehr
+            if command == "close":
+                break
+            try:
+                if command == "read":
+                    batch = backend.read_batch()
+                    written = ring.put(batch)
+                    conn.send(("ok", written, len(batch) - written))
+                else:
+                    getattr(backend, command)()
+                    conn.send(("ok", 0, 0))
+            except AcquisitionError as e:
+                conn.send(("error", str(e)))
+    finally:
+        backend.close()
+
+
+class ProcessBackend(AcquisitionBackend):
+    """
+    Runs the session of another backend in a supervised child process.
+
+    Args:
+        backend_name: Backend run in the child, see xstream.backends.create_backend.
+        login_url: URL of the login page.
+        login_prompt: Called in this process while the backend in the child waits for a manual login. It may be
+            called from an acquisition thread when a restarted Selenium session needs a new login.
+        channels: Channel schema of the bottom line, the lines are parsed in this process.
+        read_timeout: Seconds a read may take before the child is considered hung and stopped.
+        connect_timeout: Seconds connect and reconnect may take, without the time spent in login_prompt.
+        memory_limit: Resident memory of the child and its processes (chromedriver, Chrome) in bytes above which the
+            session is restarted, None for no limit. Measured every MEMORY_INTERVAL seconds.
+        memory_interval: Seconds between two measurements of the memory.
+        ring_size: Bytes of the shared-memory ring, enough for the bottom lines of one read.
+        **options: Further arguments of create_backend, e.g. driver_path, username, password or observe.
+    """
+
+    name = "process"
+
+    def __init__(self, backend_name, login_url, login_prompt=None, channels=DEFAULT_CHANNELS,
+                 read_timeout=READ_TIMEOUT, connect_timeout=CONNECT_TIMEOUT, memory_limit=MEMORY_LIMIT,
+                 ring_size=RING_SIZE, memory_interval=MEMORY_INTERVAL, **options):
+        self.parser = BottomLineParser(channels)
+        self.backend_name = backend_name
+        self.login_url = login_url
+        self.login_prompt = login_prompt
+        self.options = dict(options, channels=channels)
+        self.read_timeout = read_timeout
+        self.connect_timeout = connect_timeout
+        self.memory_limit = memory_limit
+        self.memory_interval = memory_interval
+        self.ring = SharedRing(ring_size)
+        self.process = None
+        self.tree = None
+        self.restarts = 0
+        self.dropped = 0  # Zeilen, die nicht in den Ring passten
+        self.rss = 0  # Residenter Speicher des Kindprozesses und seiner Prozesse bei der letzten Messung
+        self._next_measurement = 0.0  # monotonic
+        self._conn = None
+        self._restart_reason = None
+        self._read_time = None
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self.ring.clear()
+        self.process = context.Process(target=_serve, name=f"xstream-{self.backend_name}", daemon=True,
+                                       args=(child_conn, self.ring.buffer, self.backend_name, self.login_url,
+                                             self.options))
+        self.process.start()
+        child_conn.close()
+        try:
+            self.tree = ProcessTree(self.process.pid)
+        except AcquisitionError:
+            self.process.kill()
+            self.process.join()
+            self._conn.close()
+            self.process = self._conn = None
+            raise
+        self.rss = 0
+        self._next_measurement = time.monotonic() + self.memory_interval
+
+    def _stop(self, kill=False):
+        if self.process is None:
+            return
+        if not kill and self.process.is_alive():
+            try:
+                self._conn.send("close")
+            except OSError:
+                pass
+            self.process.join(CLOSE_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        # Auch nach einem sauberen Ende bleibt kein Treiber- oder Browserprozess zurück
+        self.tree.close()
+        self._conn.close()
+        self.process = self.tree = self._conn = None
+
+    def _call(self, command, timeout):
+        """Sends a command to the child and returns its answer. A hung or dead child is stopped."""
+        if self.process is None:
+            raise AcquisitionError("Not connected.")
+        try:
+            self._conn.send(command)
+            while True:
+                if not self._conn.poll(timeout):
+                    self._stop(kill=True)
+                    raise AcquisitionError(f"The {self.backend_name} session did not respond within {timeout:g} s "
+                                           f"and was stopped.")
+                reply = self._conn.recv()
+                if reply[0] != "login":
+                    break
+                # Die Zeit der Anmeldung zählt nicht zum Timeout
+                if self.login_prompt is not None:
+                    self.login_prompt()
+                self._conn.send("login done")
+        except (EOFError, OSError) as e:
+            self._stop(kill=True)
+            raise AcquisitionError(f"The {self.backend_name} session has ended unexpectedly.") from e
+        if reply[0] == "error":
+            raise AcquisitionError(reply[1])
+        return reply
+
+    def connect(self):
+        self._stop()
+        self._restart_reason = None
+        self._start()
+        try:
+            self._call("connect", self.connect_timeout)
+        except AcquisitionError:
+            # Ohne verbundenes Backend ist der Kindprozess nutzlos, der nächste Versuch startet einen neuen
+            self._stop()
+            raise
+
+    def read_raw(self):
+        return self.read_batch()[-1][1]
+
+    def timestamp(self):
+        return self._read_time
+
+    def read_batch(self):
+        if self._restart_reason is not None:
+            # Die Zeilen der letzten Abfrage wurden noch übernommen, erst jetzt wird neu gestartet
+            reason = self._restart_reason
+            self._stop()
+            raise AcquisitionError(reason)
+        _, written, dropped = self._call("read", self.read_timeout)
+        batch = self.ring.get()
+        self.dropped += dropped
+        if self.memory_limit is not None and time.monotonic() >= self._next_measurement:
+            self.rss = self.tree.rss()
+            self._next_measurement = time.monotonic() + self.memory_interval
+        if self.memory_limit is not None and self.rss > self.memory_limit:
+            self._restart_reason = (f"The {self.backend_name} session uses {self.rss / 2**20:.0f} MB, more than "
+                                    f"the limit of {self.memory_limit / 2**20:.0f} MB, and is restarted.")
+        if not batch:
+            raise AcquisitionError("The bottom line did not fit into the shared-memory ring.")
+        self._read_time = batch[-1][0]
+        return batch
+
+    def reconnect(self):
+        if self.process is not None and self.process.is_alive():
+            # Die Sitzung im Kindprozess weiterverwenden, z. B. den angemeldeten Browser
+            self._call("reconnect", self.connect_timeout)
+            return
+        self.restarts += 1
+        self.connect()
+
+    def close(self):
+        self._restart_reason = None
+        self._stop()
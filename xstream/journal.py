@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# xstream/journal.py
+"""
+This module provides the crash-safe journal of a recording run. Every sample is appended to the journal before it
+is handed to the recorders, which keep rows in memory for up to flush_interval. Each record reaches the operating
+system immediately, so a crash of the application loses nothing; os.fsync is issued once for all records of the
+last commit_interval (group commit), so a power failure loses at most that much.
+
+The journal of the recording <base> is the directory <base>.journal with the run description run.json and segment
+files named after their first sequence number. Segments whose samples all recorders have written are deleted,
+except for the latest `keep` records, which refill the live plot after a restart. A clean stop deletes the journal;
+a journal found on startup belongs to an unfinished run and is continued with resume().
+
+Records, little-endian: uint32 payload length | uint32 CRC-32 of sequence number and payload | uint64 sequence
+number | payload, the JSON list [timestamp, device, gap, raw, errors, values, extra column values]. Reading a
+segment stops at its first incomplete or corrupt record.
+"""
+import glob
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from typing import NamedTuple
+
+from xstream.acquisition import Sample
+from xstream.recorder import open_recorders
+
+JOURNAL_EXTENSION = ".journal"
+JOURNAL_VERSION = 1
+RUN_FILE = "run.json"
+SEGMENT_EXTENSION = ".xsj"
+# Sekunden zwischen zwei fsync-Aufrufen
+COMMIT_INTERVAL = 0.2
+# Datensätze je Segmentdatei
+SEGMENT_RECORDS = 10000
+# Für das Wiederauffüllen des Live-Plots aufbewahrte Datensätze (entspricht PLOT_CAPACITY der Oberfläche)
+KEEP_RECORDS = 36000
+
+_HEADER = struct.Struct("<IIQ")
+_SEQUENCE = struct.Struct("<Q")
+
+
+class JournalError(Exception):
+    """Raised when a journal cannot be read."""
+
+
+def journal_path(base):
+    return base + JOURNAL_EXTENSION
+
+
+def _encode(sequence, sample, extra_columns):
+    payload = json.dumps([sample.timestamp, sample.device, sample.gap, sample.raw, list(sample.errors),
+                          sample.values, [sample.stats.get(column) for column in extra_columns]],
+                         separators=(",", ":")).encode("utf-8")
+    checksum = zlib.crc32(payload, zlib.crc32(_SEQUENCE.pack(sequence)))
+    return _HEADER.pack(len(payload), checksum, sequence) + payload
+
+
+def _decode(payloads, extra_columns):
+    """Decodes a list of record payloads to samples."""
+    # Ein einziger json.loads-Aufruf für alle Datensätze ist um ein Vielfaches schneller als einer je Datensatz
+    samples = []
+    for timestamp, device, gap, raw, errors, values, extra in json.loads(b"[" + b",".join(payloads) + b"]"):
+        stats = {column: value for column, value in zip(extra_columns, extra) if value is not None}
+        samples.append(Sample(timestamp, values, raw, tuple(errors), device, gap, stats))
+    return samples
+
+
+def _read_segment(path):
+    """Returns the valid records of a segment file as a list of (sequence, payload)."""
+    with open(path, "rb") as file:
+        data = file.read()
+    records = []
+    position = 0
+    while position + _HEADER.size <= len(data):
+        length, checksum, sequence = _HEADER.unpack_from(data, position)
+        start = position + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload, zlib.crc32(data[position + 8:start])) != checksum:
+            break  # Beim Absturz nur teilweise geschriebener Datensatz
+        records.append((sequence, payload))
+        position = start + length
+    return records
+
+
+def _segment_files(directory):
+    """Returns (first sequence, path) of the segment files of a journal, in order."""
+    segments = []
+    for path in glob.glob(os.path.join(glob.escape(directory), "*" + SEGMENT_EXTENSION)):
+        try:
+            segments.append((int(os.path.basename(path)[:-len(SEGMENT_EXTENSION)]), path))
+        except ValueError:
+            pass
+    return sorted(segments)
+
+
+def read_run(directory):
+    """Returns the run description (run.json) of a journal."""
+    try:
+        with open(os.path.join(directory, RUN_FILE), encoding="utf-8") as file:
+            run = json.load(file)
+    except (OSError, ValueError) as e:
+        raise JournalError(f"Cannot read journal {directory}: {e}") from e
+    if run.get("version") != JOURNAL_VERSION:
+        raise JournalError(f"Unsupported journal version {run.get('version')} in {directory}.")
+    return run
+
+
+def read_journal(directory):
+    """
+    Reads a journal.
+
+    Returns:
+        Tuple: The run description and the records as a list of (sequence, payload), in order. Records behind a gap
+        in the sequence (a damaged segment) are dropped.
+    """
+    run = read_run(directory)
+    records = []
+    for _, path in _segment_files(directory):
+        for sequence, payload in _read_segment(path):
+            if records and sequence != records[-1][0] + 1:
+                if sequence <= records[-1][0]:
+                    continue
+                return run, records
+            records.append((sequence, payload))
+    return run, records
+
+
+def is_unfinished(path):
+    """Returns True if path is the journal of an unfinished run."""
+    return os.path.isfile(os.path.join(path, RUN_FILE))
+
+
+def find_unfinished(directory):
+    """Returns the journals of unfinished runs in a directory, oldest first."""
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(directory), "*" + JOURNAL_EXTENSION))
+                  if is_unfinished(path))
+
+
+class Journal:
+    """
+    Write-ahead journal of the samples of one recording run.
+
+    Args:
+        base: Base path of the recording, the journal is written to <base>.journal.
+        recorders: The recorders of the run, see xstream.recorder. Records are deleted once all of them have
+            written the sample (rows_written) and the record is older than the latest `keep` records.
+        sequence: Number of the next record, non-zero when a run is resumed.
+        offsets: Rows per recorder format that were in the recordings before the run started; defaults to the
+            current rows_written of the recorders.
+        commit_interval: Seconds between the group commits (os.fsync).
+        keep: Number of latest records kept to refill the live plot on resume.
+        segment_records: Records per segment file.
+        metrics: xstream.metrics.Metrics receiving the commit times and the journal size (optional).
+    """
+
+    def __init__(self, base, recorders, sequence=0, offsets=None, commit_interval=COMMIT_INTERVAL,
+                 keep=KEEP_RECORDS, segment_records=SEGMENT_RECORDS, metrics=None):
+        self.base = base
+        self.directory = journal_path(base)
+        self.recorders = list(recorders)
+        self.sequence = sequence
+        self.offsets = offsets if offsets is not None else {recorder.extension: recorder.rows_written - sequence
+                                                            for recorder in self.recorders}
+        self.commit_interval = commit_interval
+        self.keep = keep
+        self.segment_records = segment_records
+        self.error = None
+        first = self.recorders[0]
+        self.extra_columns = first.extra_columns
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()  # Hält das Schließen eines Segments während fsync zurück
+        self._dirty = False
+        self._stop_event = threading.Event()
+        os.makedirs(self.directory, exist_ok=True)
+        run = {"version": JOURNAL_VERSION, "base": os.path.abspath(base),
+               "formats": [recorder.extension for recorder in self.recorders], "channels": first.channels,
+               "extra_columns": self.extra_columns, "devices": first.devices, "offsets": self.offsets,
+               "options": {"rotate_interval": first.rotate_interval, "rotate_size": first.rotate_size,
+                           "compression": first.compression}}
+        temporary = os.path.join(self.directory, RUN_FILE + ".tmp")
+        with open(temporary, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(run, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, os.path.join(self.directory, RUN_FILE))
+        self._segments = [first for first, _ in _segment_files(self.directory) if first < sequence]
+        self._open_segment()
+        self._commit_time = None
+        if metrics is not None:
+            self._commit_time = metrics.histogram("xstream_journal_commit_seconds",
+                                                  "Time of a group commit (fsync) of the journal in seconds.")
+            metrics.gauge("xstream_journal_records", "Samples written to the journal of the current run.",
+                          lambda: self.sequence)
+            metrics.gauge("xstream_journal_failed", "1 if the journal can no longer be written.",
+                          lambda: int(self.error is not None))
+        self._thread = threading.Thread(target=self._run, name="Journal", daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, first):
+        return os.path.join(self.directory, f"{first:012d}{SEGMENT_EXTENSION}")
+
+    def _open_segment(self):
+        self._segment_first = self.sequence
+        self._segments.append(self.sequence)
+        # Ungepuffert: jeder Datensatz erreicht sofort das Betriebssystem. Eine vorhandene Datei dieses Namens
+        # enthält nur den unvollständigen Rest eines abgebrochenen Laufs.
+        self._file = open(self._segment_path(self.sequence), "wb", buffering=0)
+
+    def append(self, sample):
+        """Appends a sample. Must be called before the sample is handed to the recorders, in the same order."""
+        with self._lock:
+            if self.error is not None:
+                return
+            try:
+                self._file.write(_encode(self.sequence, sample, self.extra_columns))
+                self.sequence += 1
+                self._dirty = True
+                if self.sequence - self._segment_first >= self.segment_records:
+                    with self._commit_lock:
+                        os.fsync(self._file.fileno())
+                        self._file.close()
+                    self._open_segment()
+            except OSError as e:
+                self.error = e
+
+    def commit(self):
+        """Forces the appended records to disk and deletes the segments no longer needed."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, False
+        if dirty and self.error is None:
+            with self._commit_lock:
+                start = time.perf_counter()
+                try:
+                    if not self._file.closed:
+                        os.fsync(self._file.fileno())
+                except OSError as e:
+                    self.error = e
+                if self._commit_time is not None:
+                    self._commit_time.observe(time.perf_counter() - start)
+        self._checkpoint()
+
+    def written(self):
+        """Returns the number of records that all recorders have written."""
+        return min(recorder.rows_written - self.offsets.get(recorder.extension, 0) for recorder in self.recorders)
+
+    def _checkpoint(self):
+        limit = min(self.written(), self.sequence - self.keep)
+        with self._lock:
+            # Ein Segment reicht bis zum Beginn des nächsten, das laufende bleibt immer erhalten
+            while len(self._segments) > 1 and self._segments[1] <= limit:
+                first = self._segments.pop(0)
+                try:
+                    os.remove(self._segment_path(first))
+                except OSError:
+                    pass
+
+    def _run(self):
+        while not self._stop_event.wait(self.commit_interval):
+            self.commit()
+
+    def close(self):
+        """
+        Stops the journal. Call after the recorders have been closed: if they have written every sample, the run is
+        finished and the journal is deleted, otherwise it is kept for resume().
+        """
+        self._stop_event.set()
+        self._thread.join()
+        self.commit()
+        with self._lock:
+            self._file.close()
+        if self.error is None and self.written() >= self.sequence:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ResumedRun(NamedTuple):
+    recorders: list
+    journal: Journal
+    samples: list  # Die zuletzt aufgezeichneten Messungen (höchstens keep), z. B. für den Live-Plot
+    recovered: int  # Messungen, die in mindestens einer Aufzeichnung fehlten und nachgetragen wurden
+
+
+def resume(directory, metrics=None, tail=KEEP_RECORDS, **options):
+    """
+    Continues an unfinished run: reopens its recordings, writes the journaled samples they are missing and opens
+    the journal for the further samples.
+
+    Args:
+        directory: The journal, see find_unfinished().
+        metrics: Passed to the recorders and the journal.
+        tail: Number of latest samples returned in ResumedRun.samples, at most the records the journal keeps.
+        options: Further recorder options, e.g. flush_rows.
+
+    Raises:
+        JournalError, OSError, RecorderError: If the journal or a recording cannot be opened.
+    """
+    run, records = read_journal(directory)
+    offsets = run["offsets"]
+    base = os.path.join(os.path.dirname(os.path.abspath(directory)),
+                        os.path.basename(directory)[:-len(JOURNAL_EXTENSION)])
+    recorders = open_recorders(base, run["formats"], run["channels"], devices=run["devices"], metrics=metrics,
+                               extra_columns=run["extra_columns"], **{**run["options"], **options})
+    extra_columns = run["extra_columns"]
+    first = records[0][0] if records else 0
+    sequence = records[-1][0] + 1 if records else max(recorder.rows_written - offsets.get(recorder.extension, 0)
+                                                      for recorder in recorders)
+    # Index des ersten Datensatzes, der der jeweiligen Aufzeichnung fehlt
+    missing = [min(max(recorder.rows_written - offsets.get(recorder.extension, 0) - first, 0), len(records))
+               for recorder in recorders]
+    start = min(missing + [max(len(records) - tail, 0)])
+    samples = _decode([payload for _, payload in records[start:]], extra_columns)
+    for recorder, index in zip(recorders, missing):
+        recorder.write_many(samples[index - start:])
+    journal = Journal(base, recorders, sequence, offsets=offsets, metrics=metrics)
+    return ResumedRun(recorders, journal, samples[max(len(records) - tail, 0) - start:],
+                      len(records) - min(missing))
+
+
+def compatible(directory, channels, extra_columns, devices, formats=None):
+    """Returns True if the unfinished run of a journal records the same columns (and formats) as a new run would."""
+    try:
+        run = read_run(directory)
+    except JournalError:
+        return False
+    return ((formats is None or run["formats"] == list(formats)) and run["channels"] == list(channels)
+            and run["extra_columns"] == list(extra_columns) and run["devices"] == (list(devices) if devices else None))
+
+
+def finish(directory, **options):
+    """Writes the journaled samples an unfinished run is missing and closes it. Returns the recovered samples."""
+    run = resume(directory, tail=0, **options)
+    for recorder in run.recorders:
+        recorder.close()
+    run.journal.close()
+    return run.recovered
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# xstream/live.py
+"""
+This module provides the live data server. It publishes every sample of the acquisition loop to any number of
+local consumers, so dashboards and other systems do not need their own browser session to the analyzer:
+
+    GET /snapshot   latest sample of every device as JSON
+    GET /events     Server-Sent Events stream with one "sample" event per sample, ?device=<name> filters a device
+
+Every subscriber of /events has a bounded queue. publish() only serializes the sample once and never blocks: a
+subscriber whose queue is full has fallen behind and is dropped (its stream ends with a "dropped" event), so a slow
+client cannot slow down the acquisition.
+"""
+import json
+import math
+import queue
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PORT = 9110
+# Anzahl der Messungen, die ein Abonnent im Rückstand sein darf, bevor er getrennt wird
+QUEUE_SIZE = 256
+# Sekunden ohne Messung, nach denen ein Kommentar die Verbindung offen hält
+KEEPALIVE = 15.0
+
+_CLOSED = None
+
+
+def _number(value):
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+def sample_to_json(sample):
+    """Returns the JSON-serializable form of a sample."""
+    return {
+        "device": sample.device,
+        "timestamp": sample.timestamp,
+        "time": datetime.fromtimestamp(sample.timestamp).isoformat(timespec="milliseconds"),
+        "gap": sample.gap,
+        "values": {key: _number(value) for key, value in sample.values.items()},
+        "stats": {key: _number(value) for key, value in sample.stats.items()},
+        "alarms": [{"channel": event.rule.channel, "kind": event.rule.kind, "active": event.active,
+                    "message": event.message} for event in sample.alarms],
+        "errors": list(sample.errors),
+    }
+
+
+class Subscriber:
+    """A consumer of the live stream with a bounded queue of encoded events."""
+
+    def __init__(self, device=None, size=QUEUE_SIZE):
+        self.device = device
+        self.dropped = False
+        self.queue = queue.Queue(size)
+
+    def offer(self, event):
+        """Queues an event without blocking. Returns False if the queue is full and the subscriber is dropped."""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped = True
+            return False
+        return True
+
+    def close(self):
+        try:
+            self.queue.put_nowait(_CLOSED)
+        except queue.Full:
+            self.dropped = True  # Der Handler beendet den Stream beim nächsten Ereignis
+
+
+class _LiveHandler(BaseHTTPRequestHandler):
+    # Ein Client, der nicht mehr liest, blockiert seinen Handler höchstens so lange
+    timeout = 2 * KEEPALIVE
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in ("/", "/snapshot"):
+            self._send_snapshot()
+        elif url.path == "/events":
+            device = parse_qs(url.query).get("device", [None])[0]
+            self._stream(device)
+        else:
+            self.send_error(404)
+
+    def _send_snapshot(self):
+        payload = json.dumps(self.server.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, device):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        subscriber = self.server.subscribe(device)
+        try:
+            self.wfile.write(b"retry: 2000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    event = b": keepalive\n\n"
+                if event is _CLOSED or subscriber.dropped:
+                    if subscriber.dropped:
+                        self.wfile.write(b"event: dropped\ndata: {}\n\n")
+                    break
+                self.wfile.write(event)
+                self.wfile.flush()
+        except OSError:
+            pass  # Der Client hat die Verbindung geschlossen
+        finally:
+            self.server.unsubscribe(subscriber)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveServer(ThreadingHTTPServer):
+    """
+    Serves the live samples on http://<host>:<port>/events (Server-Sent Events) and /snapshot (JSON).
+
+    Args:
+        port: TCP port, 0 picks a free port (see server_address).
+        host: Interface to listen on, only the local machine by default.
+        queue_size: Samples a subscriber may lag behind before it is dropped.
+        metrics: xstream.metrics.Metrics receiving the subscriber count and the dropped subscribers (optional).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=DEFAULT_PORT, host="127.0.0.1", queue_size=QUEUE_SIZE, metrics=None):
+        super().__init__((host, port), _LiveHandler)
+        self.queue_size = queue_size
+        self.latest = {}  # Gerät -> letzte Messung
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._dropped = None
+        if metrics is not None:
+            metrics.gauge("xstream_live_subscribers", "Connected subscribers of the live stream.",
+                          lambda: len(self._subscribers))
+            self._dropped = metrics.counter("xstream_live_dropped_total",
+                                            "Live subscribers dropped because they fell behind.")
+
+    def publish(self, sample):
+        """Hands a sample to all subscribers. Called from the acquisition threads, never blocks."""
+        with self._lock:
+            self.latest[sample.device] = sample
+            subscribers = list(self._subscribers)
+        event = None
+        for subscriber in subscribers:
+            if subscriber.device is not None and subscriber.device != sample.device:
+                continue
+            if event is None:
+                # Einmal je Messung kodieren, unabhängig von der Zahl der Abonnenten
+                event = b"event: sample\ndata: " + json.dumps(sample_to_json(sample)).encode("utf-8") + b"\n\n"
+            if not subscriber.offer(event):
+                self.unsubscribe(subscriber)
+                if self._dropped is not None:
+                    self._dropped.inc()
+
+    def subscribe(self, device=None):
+        subscriber = Subscriber(device, self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def snapshot(self):
+        """Returns the latest sample of every device and the number of subscribers."""
+        with self._lock:
+            latest = dict(self.latest)
+            subscribers = len(self._subscribers)
+        return {"devices": {device: sample_to_json(sample) for device, sample in latest.items()},
+                "subscribers": subscribers}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="LiveServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -3,45 +3,106 @@
 '''This module provides XSTREAM application.'''
 
 import sys
-from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
-from xstream.views import SplashScreen, ConnectionDialog, MainWindow
+from xstream import startup
+
+def main(metrics_port=None, metrics_file=None, max_fps=None, opengl=False, live_port=None):
+    # Nur Qt-Widgets und den SplashScreen laden, alles Weitere erst, wenn der SplashScreen sichtbar ist
+    from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
+    from xstream.splash import SplashScreen
+    startup.mark("qt")
 
-def main():
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
     # Splashscreen erstellen und sofort anzeigen
     splash = SplashScreen()
     splash.show()
-    splash.update_status("Waiting for connection settings...")
+    splash.update_status("Loading...")
     app.processEvents()  # Sicherstellen, dass der SplashScreen vollständig gerendert wird
+    startup.mark("splash")
+
+    # Schwere Module (NumPy, pyqtgraph) laden, während der SplashScreen angezeigt wird
+    from xstream.backends import AcquisitionError, create_backend, device_name
+    from xstream.isolation import ProcessBackend
+    from xstream.parser import DEFAULT_CHANNELS, load_channels
+    from xstream.stats import load_statistics
+    startup.mark("acquisition")
+    app.processEvents()
+    from xstream.views import DEFAULT_MAX_FPS, ConnectionDialog, LoginPrompt, MainWindow
+    startup.mark("views")
+    splash.update_status("Waiting for connection settings...")
+    app.processEvents()
+    startup.mark("ready")
+    startup.report()
 
     while True:
         # Zeige das Verbindungsdialogfenster
         connection_dialog = ConnectionDialog()
         if connection_dialog.exec() == QDialog.DialogCode.Accepted:
-            login_url = connection_dialog.get_login_url()
+            startup.mark("settings")
+            login_urls = connection_dialog.get_login_urls()
             path = connection_dialog.get_webdriver_path()
+            username, password = connection_dialog.get_credentials()
 
-            splash.update_status("Initializing WebDriver...")  # Statusmeldung
+            splash.update_status(f"Connecting to {len(login_urls)} analyzer(s)...")  # Statusmeldung
             app.processEvents()  # Aktualisiere GUI, damit SplashScreen sichtbar bleibt
 
             try:
+                schema_path = connection_dialog.get_schema_path()
+                try:
+                    channels = load_channels(schema_path) if schema_path else DEFAULT_CHANNELS
+                except (OSError, ValueError, KeyError) as e:
+                    raise AcquisitionError(f"Invalid channel schema {schema_path}: {e}") from e
+                statistics_path = connection_dialog.get_statistics_path()
+                try:
+                    statistics = load_statistics(statistics_path, channels) if statistics_path else None
+                except (OSError, ValueError, KeyError) as e:
+                    raise AcquisitionError(f"Invalid statistics file {statistics_path}: {e}") from e
+                backends = {}
+                try:
+                    if connection_dialog.get_backend_name() == "replay":
+                        # Eine Wiedergabe je Gerät der Aufzeichnung
+                        from xstream.replay import replay_backends
+                        for recording in login_urls:
+                            backends.update(replay_backends(recording, channels=channels))
+                    else:
+                        # Ein Backend (eine Verbindung) je Analysator, auf Wunsch in einem eigenen Prozess
+                        factory = ProcessBackend if connection_dialog.get_isolate() else create_backend
+                        login_prompt = LoginPrompt()
+                        for login_url in login_urls:
+                            backends[device_name(login_url)] = factory(
+                                connection_dialog.get_backend_name(), login_url, driver_path=path,
+                                username=username, password=password, observe=connection_dialog.get_observe_changes(),
+                                login_prompt=login_prompt, channels=channels,
+                            )
+                except Exception:
+                    # Schlägt ein späteres Backend fehl, die bereits erstellten nicht offen lassen
+                    for backend in backends.values():
+                        backend.close()
+                    raise
                 # Initiale Gasdaten abrufen
-                initial_data, driver = MainWindow.fetch_initial_data(path, login_url)
-                if initial_data:
+                initial_data = {device: MainWindow.fetch_initial_data(backend) for device, backend in backends.items()}
+                startup.mark("connect")
+                if all(initial_data.values()):
                     splash.update_status("Initializing Main Window...")  # Status aktualisieren
                     app.processEvents()
 
                     # Hauptfenster erstellen und anzeigen
-                    window = MainWindow(path, login_url, driver, initial_data=initial_data)
+                    window = MainWindow(backends, initial_data=initial_data, metrics_port=metrics_port,
+                                        metrics_file=metrics_file, statistics=statistics,
+                                        max_fps=DEFAULT_MAX_FPS if max_fps is None else max_fps, opengl=opengl,
+                                        live_port=live_port)
                     splash.close()  # SplashScreen schließen
                     window.show()
+                    startup.mark("main window")
+                    startup.report()
                     sys.exit(app.exec())
                 else:
+                    for backend in backends.values():
+                        backend.close()
                     splash.update_status("Failed to fetch initial data. Retrying...")
                     QMessageBox.warning(None, "Data Error", "Failed to fetch initial gas data. Please try again.")
-            except Exception as e:
+            except AcquisitionError as e:
                 splash.update_status("Connection failed. Retrying...")
                 QMessageBox.warning(None, "Connection Error", f"Failed to connect: {str(e)}")
         else:
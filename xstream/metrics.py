@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# xstream/metrics.py
+"""
+This module provides the runtime metrics of XSTREAM: counters, gauges and rolling histograms of the time spent in
+the hot path (fetch, parse, plot update, disk write), missed and late ticks and the memory of the process. The
+metrics are rendered in the Prometheus text format, either served on a local HTTP endpoint (MetricsServer) or
+written periodically to a file (MetricsFileWriter), e.g. for the textfile collector of the node exporter.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket-Grenzen in Sekunden, von 0,5 ms bis 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FETCH = "xstream_fetch_seconds"
+PARSE = "xstream_parse_seconds"
+PLOT = "xstream_plot_seconds"
+WRITE = "xstream_write_seconds"
+TICK_LAG = "xstream_tick_lag_seconds"
+TICKS = "xstream_ticks_total"
+LATE_TICKS = "xstream_late_ticks_total"
+SKIPPED_TICKS = "xstream_skipped_ticks_total"
+MISSED = "xstream_missed_samples_total"
+GAPS = "xstream_gap_samples_total"
+RECONNECTS = "xstream_reconnects_total"
+RSS = "xstream_resident_memory_bytes"
+POLL_RATE = "xstream_poll_rate_hz"
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self, function=None):
+        self.function = function
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self.function() if self.function is not None else self._value
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts for export and a rolling window of the latest observations for percentiles.
+
+    Args:
+        buckets: Upper bounds of the buckets in seconds.
+        window: Number of latest observations kept for percentile().
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # letzter Eintrag: +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self._recent.append(value)
+
+    def time(self):
+        """Returns a context manager that observes the duration of its block."""
+        return _Timer(self)
+
+    def percentile(self, q):
+        """Returns the q-th percentile of the rolling window or None without observations."""
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return None
+        return recent[min(int(q / 100 * len(recent)), len(recent) - 1)]
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry of all metrics. Metrics are created on first use and identified by name and labels."""
+
+    def __init__(self):
+        self._families = {}  # Name -> (Typ, Hilfetext, {Labels: Metrik})
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, help, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get("counter", Counter, name, help, labels)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get("histogram", lambda: Histogram(buckets), name, help, labels)
+
+    def gauge(self, name, help="", function=None, **labels):
+        """Returns a gauge. If function is given, the gauge reports its return value from now on."""
+        gauge = self._get("gauge", Gauge, name, help, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def family(self, name):
+        """Returns {labels: metric} of a metric name."""
+        with self._lock:
+            family = self._families.get(name)
+            return dict(family[2]) if family else {}
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            families = [(name, kind, help, dict(metrics)) for name, (kind, help, metrics) in self._families.items()]
+        lines = []
+        for name, kind, help, metrics in sorted(families):
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(metrics.items()):
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), list(metric.counts)):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} "
+                                     f"{cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum!r}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def rss_bytes(pid=None):
+    """
+    Returns the resident set size of this process, or of the process pid, in bytes (working set on Windows). 0 if
+    the process no longer exists or cannot be queried.
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+        # PROCESS_QUERY_LIMITED_INFORMATION genügt für GetProcessMemoryInfo
+        handle = kernel32.GetCurrentProcess() if pid is None else kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return 0
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            if psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return 0
+        finally:
+            if pid is not None:
+                kernel32.CloseHandle(handle)
+    try:
+        with open(f"/proc/{'self' if pid is None else pid}/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        if pid is not None:
+            return 0
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def register_process_metrics(metrics):
+    metrics.gauge(RSS, "Resident memory of the process in bytes.", rss_bytes)
+
+
+def format_summary(metrics):
+    """Returns a one-line summary, e.g. "p95 fetch 12.0 ms, ... | late 0, skipped 0, missed 0 | RSS 98 MB"."""
+    parts = []
+    for label, name in (("fetch", FETCH), ("parse", PARSE), ("plot", PLOT), ("write", WRITE)):
+        values = [histogram.percentile(95) for histogram in metrics.family(name).values()]
+        values = [value for value in values if value is not None]
+        if values:
+            # Bei mehreren Geräten bzw. Formaten zählt das langsamste
+            worst = 1000 * max(values)
+            parts.append(f"{label} {worst:.2f} ms" if worst < 1 else f"{label} {worst:.1f} ms")
+    late = sum(counter.value for counter in metrics.family(LATE_TICKS).values())
+    skipped = sum(counter.value for counter in metrics.family(SKIPPED_TICKS).values())
+    missed = sum(counter.value for counter in metrics.family(MISSED).values())
+    summary = f"p95 {', '.join(parts)} | " if parts else ""
+    rates = [gauge.value for gauge in metrics.family(POLL_RATE).values()]
+    rate = f"rate {rates[0]:.3g} Hz | " if rates and rates[0] else ""
+    return f"{summary}{rate}late {late}, skipped {skipped}, missed {missed} | RSS {rss_bytes() / 2 ** 20:.0f} MB"
+
+
+class MetricsFileWriter:
+    """
+    Writes the metrics to a file every interval seconds. The file is replaced atomically, so readers never see a
+    partially written file.
+    """
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def write(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8", newline="\n") as file:
+            file.write(self.metrics.render())
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass  # Nächster Versuch im nächsten Intervall
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="MetricsFileWriter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        payload = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves the metrics in the Prometheus text format on http://<host>:<port>/metrics."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics, port=9108, host="127.0.0.1"):
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
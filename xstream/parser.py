@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# xstream/parser.py
+"""
+This module provides the schema-driven parser of the bottom line shown by the X-STREAM web interface, e.g.
+"Ch1/R4: 0.02 Vol% Ch2/R4: 0.00 Vol% ...". The channels are described by a schema, the line is parsed in a single
+pass with a precompiled pattern and malformed lines are reported instead of raising.
+"""
+import json
+import re
+from dataclasses import dataclass, asdict
+from typing import NamedTuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Channel:
+    """A measuring channel of the analyzer."""
+
+    id: int  # Kanalnummer N aus "ChN/R4:"
+    key: str
+    unit: str = "Vol%"
+    color: str = "#000000"
+    label: str = ""  # Anzeigename, z. B. mit tiefgestellten Zahlen
+
+    @property
+    def display_name(self):
+        return self.label or self.key
+
+
+DEFAULT_CHANNELS = (
+    Channel(1, "CO2", "Vol%", "#808080", "CO₂"),
+    Channel(2, "CO", "Vol%", "#000000", "CO"),
+    Channel(3, "CH4", "Vol%", "#008000", "CH₄"),
+    Channel(4, "H2", "Vol%", "#FF0000", "H₂"),
+    Channel(5, "O2", "Vol%", "#0000FF", "O₂"),
+)
+
+
+def channel_keys(channels):
+    return [channel.key for channel in channels]
+
+
+def channels_from_config(entries):
+    """Creates a channel schema from a list of dictionaries with the fields of Channel."""
+    return tuple(Channel(int(entry["id"]), entry["key"], entry.get("unit", "Vol%"), entry.get("color", "#000000"),
+                         entry.get("label", "")) for entry in entries)
+
+
+def load_channels(path):
+    """Reads a channel schema from a JSON file containing a list of channel objects."""
+    with open(path, encoding="utf-8") as file:
+        return channels_from_config(json.load(file))
+
+
+def channels_to_config(channels):
+    return [asdict(channel) for channel in channels]
+
+
+class ParseResult(NamedTuple):
+    values: dict  # Schlüssel -> Wert der erfolgreich gelesenen Kanäle
+    errors: tuple  # Beschreibungen aller Fehler der Zeile
+
+
+# Kanal-Token, Wert (Zahl oder ungültiges Wort) und optionale Einheit, die nicht schon das nächste Kanal-Token ist
+_TOKEN_RE = re.compile(
+    r"Ch(\d+)/R\d+:\s*"
+    r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|\S+?)\s*"
+    r"((?!Ch\d)[^\s\d.+-]\S*?)?"
+    r"(?=\s|$|Ch\d)"
+)
+
+
+class BottomLineParser:
+    """
+    Parses bottom lines according to a channel schema.
+
+    Args:
+        channels: Sequence of Channel, defaults to the five gases of the X-STREAM.
+    """
+
+    def __init__(self, channels=DEFAULT_CHANNELS):
+        self.channels = tuple(channels)
+        self.keys = channel_keys(self.channels)
+        self._by_id = {channel.id: (column, channel) for column, channel in enumerate(self.channels)}
+
+    def parse(self, raw_text):
+        """Parses one line. Never raises, problems are returned in ParseResult.errors."""
+        values = {}
+        errors = []
+        seen = set()
+        for match in _TOKEN_RE.finditer(raw_text or ""):
+            entry = self._by_id.get(int(match.group(1)))
+            if entry is None:
+                continue  # Kanal ist nicht im Schema
+            channel = entry[1]
+            seen.add(channel.id)
+            try:
+                value = float(match.group(2))
+            except ValueError:
+                errors.append(f"Ch{channel.id} ({channel.key}): invalid value {match.group(2)!r}")
+                continue
+            unit = match.group(3)
+            if unit and unit != channel.unit:
+                errors.append(f"Ch{channel.id} ({channel.key}): unit {unit!r} instead of {channel.unit!r}")
+                continue
+            values[channel.key] = value
+        for channel in self.channels:
+            if channel.id not in seen:
+                errors.append(f"Ch{channel.id} ({channel.key}): missing")
+        return ParseResult(values, tuple(errors))
+
+    def parse_many(self, lines):
+        """
+        Parses many raw lines, e.g. of a captured raw log.
+
+        Returns:
+            numpy.ndarray: Shape (len(lines), channels), NaN where a value could not be parsed.
+        """
+        lines = list(lines)
+        result = np.full((len(lines), len(self.channels)), np.nan)
+        by_id = {channel_id: column for channel_id, (column, _) in self._by_id.items()}
+        units = [channel.unit for channel in self.channels]
+        for row, line in enumerate(lines):
+            for match in _TOKEN_RE.finditer(line or ""):
+                column = by_id.get(int(match.group(1)))
+                if column is None:
+                    continue
+                unit = match.group(3)
+                if unit and unit != units[column]:
+                    continue
+                try:
+                    result[row, column] = float(match.group(2))
+                except ValueError:
+                    pass
+        return result
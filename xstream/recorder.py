@@ -0,0 +1,866 @@
+# -*- coding: utf-8 -*-
+# xstream/recorder.py
+"""
+This module provides the recorders that persist the acquired samples. A recorder keeps its file open, collects
+samples in memory and writes them in batches on a background thread, flushing when either the configured number
+of rows or the configured time has been reached. Besides CSV, samples can be recorded in a chunked binary format
+that is read back into NumPy arrays without parsing text, and the raw bottom lines can be logged for a later replay.
+
+Long recordings can be rotated by size or on the hour or day. The recording is then split into numbered segments
+(<base>_0001.csv, ...); closed segments are compressed on a background thread (gzip, or zstd if the zstandard
+package is installed) and the manifest <base>.<format>.manifest.json lists the time range, row count and size of
+every segment, so readers only open the segments of the range they need.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from xstream.metrics import WRITE
+
+_CLOSE = object()
+
+ROTATE_INTERVALS = ("hourly", "daily")
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+MANIFEST_EXTENSION = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+class RecorderError(Exception):
+    """Raised when a recorder can no longer write to its file."""
+
+
+class Recorder:
+    """
+    Base class of the buffered background recorders.
+
+    Args:
+        path: Path of the recording file.
+        channels: Keys of the gas channels in column order.
+        flush_rows: Number of buffered rows that triggers a flush.
+        flush_interval: Maximum time in seconds a row stays in memory.
+        fsync: If True, every flush is followed by os.fsync.
+        devices: Names of the analyzers sharing this recorder. If given, every row is tagged with its device.
+        metrics: xstream.metrics.Metrics receiving the write times, the queue length and the age of the last flush
+            (optional).
+        extra_columns: Keys of Sample.stats written after the gas channels, e.g. rolling statistics (see
+            xstream.stats). Raw logs have no columns and ignore them.
+        rotate_interval: "hourly" or "daily" starts a new segment at every full local hour or day (optional).
+        rotate_size: A new segment is started once the current one has reached this size in bytes (optional).
+        compression: "gzip" or "zstd" compresses every closed segment in the background (optional).
+
+    With rotation or compression, path is the base of the segmented recording: the segments are written to
+    <base>_0001.<format>, ... and listed in <path>.manifest.json, and the attribute path names the current segment.
+    An unfinished segment of an earlier run with the same base is continued.
+
+    An existing recording is continued: an incomplete last row (e.g. after a crash) is cut off and rows_written
+    starts with the number of rows already recorded.
+    """
+
+    extension = ""
+
+    def __init__(self, path, channels, flush_rows=100, flush_interval=5.0, fsync=False, devices=None,
+                 metrics=None, extra_columns=(), rotate_interval=None, rotate_size=None, compression=None):
+        if rotate_interval is not None and rotate_interval not in ROTATE_INTERVALS:
+            raise RecorderError(f"Unknown rotation interval {rotate_interval!r}, expected one of {ROTATE_INTERVALS}.")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise RecorderError(f"Unknown compression {compression!r}, expected one of {tuple(COMPRESSIONS)}.")
+        if compression == "zstd":
+            _zstandard()
+        self.path = path
+        self.base_path = path
+        self.rotate_interval = rotate_interval
+        self.rotate_size = rotate_size
+        self.compression = compression
+        self.manifest = None
+        self._segment = None  # Manifest-Eintrag des laufenden Segments
+        self._segment_until = None  # Epoch-Zeitpunkt, ab dem ein neues Segment beginnt
+        self._compressor = None
+        self.channels = list(channels)
+        self.extra_columns = list(extra_columns)
+        self.devices = list(devices) if devices else None
+        self.flush_rows = max(int(flush_rows), 1)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rows_written = 0
+        self.error = None
+        self._file = None
+        self._appended = False  # True, wenn _open eine vorhandene Datei fortsetzt
+        self._queue = queue.Queue()
+        self._unwritten_since = None  # monotonic, Zeitpunkt der ältesten noch nicht geschriebenen Messung
+        self._write_time = None
+        if metrics is not None:
+            self._register_metrics(metrics)
+        if rotate_interval or rotate_size or compression:
+            self.manifest = SegmentManifest(manifest_path(path), self.extension, self.channels + self.extra_columns,
+                                            self.devices)
+            if compression:
+                self._compressor = ThreadPoolExecutor(1, thread_name_prefix=f"{type(self).__name__}Compression")
+            self._start_segment(resume=True)
+        self._open()
+        self.rows_written = self._recorded_rows()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def write(self, sample):
+        """Queues a sample for writing. Never blocks on disk I/O."""
+        if self.error is not None:
+            raise RecorderError(f"Recording to {self.path} failed: {self.error}")
+        if self._unwritten_since is None:
+            self._unwritten_since = time.monotonic()
+        self._queue.put(sample)
+
+    def write_many(self, samples):
+        """Queues several samples at once, e.g. the samples recovered from a journal."""
+        if self.error is not None:
+            raise RecorderError(f"Recording to {self.path} failed: {self.error}")
+        if samples:
+            if self._unwritten_since is None:
+                self._unwritten_since = time.monotonic()
+            self._queue.put(list(samples))
+
+    def close(self):
+        """Writes all queued samples and closes the file."""
+        if self._thread is None:
+            return
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._thread = None
+
+    def _unwritten_age(self):
+        since = self._unwritten_since
+        return 0.0 if since is None else time.monotonic() - since
+
+    def _register_metrics(self, metrics):
+        labels = {"format": self.extension}
+        self._write_time = metrics.histogram(WRITE, "Time to write and flush a batch of rows in seconds.", **labels)
+        metrics.gauge("xstream_recorder_queue_length", "Samples queued for the recorder thread.",
+                      self._queue.qsize, **labels)
+        metrics.gauge("xstream_recorder_unwritten_age_seconds", "Age of the oldest sample not yet written in seconds.",
+                      self._unwritten_age, **labels)
+        metrics.gauge("xstream_recorder_rows_written", "Rows written to the current recording.",
+                      lambda: self.rows_written, **labels)
+        metrics.gauge("xstream_recorder_failed", "1 if the recorder can no longer write its file.",
+                      lambda: int(self.error is not None), **labels)
+
+    def _run(self):
+        pending = []
+        deadline = None
+        closing = False
+        while not closing:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                closing = True
+            elif item is not None:
+                if isinstance(item, list):
+                    pending.extend(item)
+                else:
+                    pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (closing or len(pending) >= self.flush_rows or time.monotonic() >= deadline):
+                if self.error is None:
+                    try:
+                        start = time.perf_counter()
+                        if self.manifest is None:
+                            self._write_rows(pending)
+                        else:
+                            self._write_segmented(pending)
+                        self._flush()
+                        if self._write_time is not None:
+                            self._write_time.observe(time.perf_counter() - start)
+                        self.rows_written += len(pending)
+                        self._unwritten_since = time.monotonic() if not self._queue.empty() else None
+                    except Exception as e:
+                        # Nicht nur Ein-/Ausgabefehler: der Thread muss weiterlaufen, damit close() nicht hängt und
+                        # write() sowie xstream_recorder_failed den Fehler melden
+                        self.error = e
+                pending = []
+                deadline = None
+        try:
+            self._close_file()
+            if self.manifest is not None:
+                self._finish_segment(last=True)
+        except Exception as e:
+            self.error = self.error or e
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+
+    # Segmente
+
+    def _start_segment(self, resume=False):
+        segments = self.manifest.segments
+        if resume and segments and not segments[-1]["closed"] and os.path.isfile(self._segment_path(segments[-1])):
+            # Unvollständiges Segment eines früheren Laufs fortsetzen
+            self._segment = segments[-1]
+        else:
+            self._segment = self.manifest.add(os.path.basename(segment_path(self.base_path, len(segments) + 1)))
+        self.path = self._segment_path(self._segment)
+        start = self._segment["start"]
+        self._segment_until = None if start is None or not self.rotate_interval else _interval_end(
+            start, self.rotate_interval)
+
+    def _segment_path(self, segment):
+        return os.path.join(os.path.dirname(self.base_path), segment["file"])
+
+    def _finish_segment(self, last=False):
+        segment = self._segment
+        path = self._segment_path(segment)
+        if not segment["rows"] and (not last or len(self.manifest.segments) > 1):
+            # Leere Segmente nicht aufbewahren, außer es ist das einzige
+            self.manifest.remove(segment)
+            os.remove(path)
+            return
+        self.manifest.update(segment, closed=True, bytes=os.path.getsize(path))
+        if self._compressor is not None:
+            self._compressor.submit(self._compress_segment, segment, path)
+
+    def _compress_segment(self, segment, path):
+        try:
+            target = compress_file(path, self.compression)
+        except Exception:
+            return  # Das Segment bleibt unkomprimiert lesbar
+        self.manifest.update(segment, file=os.path.basename(target), compression=self.compression,
+                             bytes=os.path.getsize(target))
+
+    def _rotate(self):
+        self._flush()
+        self._close_file()
+        self._finish_segment()
+        self._start_segment()
+        self._open()
+
+    def _write_segmented(self, samples):
+        if self.rotate_size and self._segment["rows"] and os.fstat(self._file.fileno()).st_size >= self.rotate_size:
+            self._rotate()
+        first = 0
+        for i, sample in enumerate(samples):
+            if not self.rotate_interval:
+                break
+            if self._segment_until is None:
+                self._segment_until = _interval_end(sample.timestamp, self.rotate_interval)
+            elif sample.timestamp >= self._segment_until:
+                self._write_segment_rows(samples[first:i])
+                first = i
+                self._rotate()
+                self._segment_until = _interval_end(sample.timestamp, self.rotate_interval)
+        self._write_segment_rows(samples[first:])
+
+    def _write_segment_rows(self, samples):
+        if not samples:
+            return
+        self._write_rows(samples)
+        segment = self._segment
+        first = min(sample.timestamp for sample in samples)
+        last = max(sample.timestamp for sample in samples)
+        opened = segment["start"] is None
+        # Das Manifest wird nur beim Beginn und beim Schließen eines Segments geschrieben
+        self.manifest.update(segment, save=opened, rows=segment["rows"] + len(samples),
+                             start=first if opened else min(segment["start"], first),
+                             end=last if segment["end"] is None else max(segment["end"], last))
+
+    def _recorded_rows(self):
+        """Returns the number of rows already in the recording, 0 for a new one."""
+        rows = self._count_rows() if self._appended else 0
+        if self.manifest is None:
+            return rows
+        self.manifest.update(self._segment, save=False, rows=rows)
+        return sum(segment["rows"] for segment in self.manifest.segments)
+
+    def _count_rows(self):
+        """Returns the number of complete rows in the file at path."""
+        raise NotImplementedError
+
+    def _flush(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_rows(self, samples):
+        raise NotImplementedError
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _cell(value):
+    return "" if value is None else round(value, 6)
+
+
+def _truncate_partial_line(path):
+    """Cuts off an incomplete last line of a text recording, e.g. after a crash."""
+    with open(path, "r+b") as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - 65536, 0)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            file.truncate(position)
+
+
+def _count_lines(path):
+    count = 0
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            count += block.count(b"\n")
+    return count
+
+
+class CsvRecorder(Recorder):
+    """
+    Writes samples as CSV rows "Timestamp, <channels>, <extra columns>" with the timestamp formatted to milliseconds.
+    A recorder shared by several analyzers writes "Timestamp, Device, <channels>, <extra columns>".
+    """
+
+    extension = "csv"
+    # %f wird auf Millisekunden gekürzt, siehe format_timestamp
+    timestamp_format = "%Y-%m-%d %H:%M:%S.%f"
+
+    def _open(self):
+        header = ["Timestamp"] + (["Device"] if self.devices else []) + self.channels + self.extra_columns
+        new_file = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        if not new_file:
+            with open(self.path, newline="") as file:
+                existing = next(csv.reader(file), [])
+            # Sonst stünden die neuen Zeilen verschoben unter den Spalten der alten Kopfzeile
+            if existing != header:
+                raise RecorderError(f"{self.path} was recorded with the columns {existing}.")
+            _truncate_partial_line(self.path)
+            self._appended = True
+        self._file = open(self.path, mode="a", newline="")
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(header)
+            self._file.flush()
+
+    def _count_rows(self):
+        return max(_count_lines(self.path) - 1, 0)  # ohne Kopfzeile
+
+    def _write_rows(self, samples):
+        self._writer.writerows(
+            [format_timestamp(sample.timestamp, self.timestamp_format)]
+            + ([sample.device] if self.devices else [])
+            + [sample.values.get(channel, "") for channel in self.channels]
+            + [_cell(sample.stats.get(column)) for column in self.extra_columns]
+            for sample in samples
+        )
+
+
+def format_timestamp(timestamp, timestamp_format=CsvRecorder.timestamp_format):
+    """Formats an epoch timestamp for a CSV row, a fraction of a second (%f) to milliseconds."""
+    text = datetime.fromtimestamp(timestamp).strftime(timestamp_format)
+    return text[:-3] if timestamp_format.endswith("%f") else text
+
+
+def parse_timestamp(text, timestamp_format=CsvRecorder.timestamp_format):
+    """
+    Parses a CSV timestamp to epoch seconds. Timestamps without a fraction of a second, as written by older versions,
+    are accepted as well.
+
+    Raises:
+        ValueError: If text matches neither form.
+    """
+    try:
+        return datetime.strptime(text, timestamp_format).timestamp()
+    except ValueError:
+        if not timestamp_format.endswith(".%f"):
+            raise
+        return datetime.strptime(text, timestamp_format[:-3]).timestamp()
+
+
+class RawLogRecorder(Recorder):
+    """
+    Logs the raw bottom lines as text lines "<epoch timestamp>\t<device>\t<bottom line>", e.g. to replay a run later
+    with xstream.replay. Gap samples are logged with an empty bottom line.
+    """
+
+    extension = "log"
+
+    def _open(self):
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            _truncate_partial_line(self.path)
+            self._appended = True
+        self._file = open(self.path, mode="a", encoding="utf-8", newline="\n")
+
+    def _count_rows(self):
+        return _count_lines(self.path)
+
+    def _write_rows(self, samples):
+        self._file.write("".join(f"{sample.timestamp:.3f}\t{sample.device}\t{' '.join(sample.raw.split())}\n"
+                                 for sample in samples))
+
+
+def read_raw_log(path):
+    """
+    Reads a raw bottom-line log, also a compressed segment (.log.gz, .log.zst).
+
+    Returns:
+        Tuple: Lists of the timestamps, the device names and the bottom lines.
+    """
+    timestamps, devices, lines = [], [], []
+    with io.TextIOWrapper(open_recording(path), encoding="utf-8") as file:
+        for line in file:
+            fields = line.rstrip("\n").split("\t", 2)
+            if len(fields) < 3:
+                continue  # Unvollständige letzte Zeile nach einem Absturz
+            timestamps.append(float(fields[0]))
+            devices.append(fields[1])
+            lines.append(fields[2])
+    return timestamps, devices, lines
+
+
+RECORDER_CLASSES = {"csv": CsvRecorder, "log": RawLogRecorder}
+
+
+# Segmentierte Aufzeichnungen
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RecorderError("zstd compression requires the zstandard package.") from e
+    return zstandard
+
+
+def parse_rotation(text):
+    """
+    Parses a rotation setting: "hourly", "daily" or a size such as "500MB" or "2 GB", "" for no rotation.
+
+    Returns:
+        Tuple: rotate_interval and rotate_size in bytes, see Recorder.
+    """
+    text = text.strip().lower()
+    if not text or text in ("no", "none", "off"):
+        return None, None
+    if text in ROTATE_INTERVALS:
+        return text, None
+    for unit, factor in (("kb", 2 ** 10), ("mb", 2 ** 20), ("gb", 2 ** 30), ("b", 1), ("", 1)):
+        if text.endswith(unit):
+            try:
+                size = float(text[:len(text) - len(unit)]) * factor
+            except ValueError:
+                break
+            if size > 0:
+                return None, int(size)
+            break
+    raise ValueError(f"Invalid rotation {text!r}, expected hourly, daily or a size such as 500MB.")
+
+
+def _interval_end(timestamp, interval):
+    """Returns the epoch time of the next full local hour or day after timestamp."""
+    moment = datetime.fromtimestamp(timestamp).replace(minute=0, second=0, microsecond=0)
+    if interval == "hourly":
+        return (moment + timedelta(hours=1)).timestamp()
+    return (moment.replace(hour=0) + timedelta(days=1)).timestamp()
+
+
+def segment_path(path, number):
+    """Returns the path of a segment, e.g. <base>_0001.csv for <base>.csv."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}_{number:04d}{extension}"
+
+
+def manifest_path(path):
+    return path + MANIFEST_EXTENSION
+
+
+def split_compression(path):
+    """Returns the path without a compression suffix and the compression ("gzip", "zstd" or None)."""
+    for compression, suffix in COMPRESSIONS.items():
+        if path.lower().endswith(suffix):
+            return path[:-len(suffix)], compression
+    return path, None
+
+
+def open_recording(path):
+    """Opens a recording file for binary reading. Compressed segments are decompressed transparently."""
+    compression = split_compression(path)[1]
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        zstandard = _zstandard()
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def compress_file(path, compression):
+    """Compresses a closed segment to <path>.gz or <path>.zst, removes the original and returns the new path."""
+    target = path + COMPRESSIONS[compression]
+    temporary = target + ".tmp"
+    with open(path, "rb") as source, open(temporary, "wb") as file:
+        if compression == "gzip":
+            with gzip.GzipFile(os.path.basename(path), "wb", 6, file) as destination:
+                shutil.copyfileobj(source, destination, 2 ** 20)
+        else:
+            with _zstandard().ZstdCompressor(level=3).stream_writer(file, closefd=False) as destination:
+                shutil.copyfileobj(source, destination, 2 ** 20)
+    os.replace(temporary, target)
+    os.remove(path)
+    return target
+
+
+class SegmentManifest:
+    """
+    The manifest of a segmented recording. Every segment is listed with its file name, the first and last timestamp,
+    the row count, its size on disk and its compression. The file is replaced atomically on every change, so it can
+    be read while the recording is running; the running segment is listed with "closed": false.
+    """
+
+    def __init__(self, path, format, columns, devices=None):
+        self.path = path
+        self.format = format
+        self.columns = list(columns)
+        self.devices = devices
+        self.segments = []
+        self._lock = threading.RLock()
+        if os.path.isfile(path):
+            manifest = read_manifest(path)
+            if manifest["format"] != format or manifest["columns"] != self.columns:
+                raise RecorderError(f"{path} belongs to a {manifest['format']} recording with the columns "
+                                    f"{manifest['columns']}.")
+            self.segments = [{key: value for key, value in segment.items() if key != "path"}
+                             for segment in manifest["segments"]]
+
+    def add(self, file):
+        segment = {"file": file, "start": None, "end": None, "rows": 0, "bytes": 0, "compression": None,
+                   "closed": False}
+        with self._lock:
+            self.segments.append(segment)
+            self.save()
+        return segment
+
+    def remove(self, segment):
+        with self._lock:
+            self.segments.remove(segment)
+            self.save()
+
+    def update(self, segment, save=True, **changes):
+        with self._lock:
+            segment.update(changes)
+            if save:
+                self.save()
+
+    def save(self):
+        with self._lock:
+            manifest = {"version": MANIFEST_VERSION, "format": self.format, "columns": self.columns,
+                        "devices": self.devices, "segments": self.segments}
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8", newline="\n") as file:
+                json.dump(manifest, file, indent=1)
+            os.replace(temporary, self.path)
+
+
+def read_manifest(path):
+    """
+    Reads the manifest of a segmented recording. Every segment additionally gets its full "path".
+
+    Raises:
+        RecorderError: If the file is not a manifest of a supported version.
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            manifest = json.load(file)
+    except ValueError as e:
+        raise RecorderError(f"{path} is not a recording manifest: {e}") from e
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        raise RecorderError(f"{path} is not a recording manifest of version {MANIFEST_VERSION}.")
+    directory = os.path.dirname(path)
+    for segment in manifest["segments"]:
+        segment["path"] = os.path.join(directory, segment["file"])
+    return manifest
+
+
+def select_segments(segments, start=None, stop=None):
+    """Returns the segments that may contain rows in [start, stop]. The running segment is open-ended."""
+    selected = []
+    for segment in segments:
+        if segment["start"] is None:
+            if segment["closed"]:
+                continue
+            selected.append(segment)  # Laufendes Segment ohne geschriebene Zeilen
+        elif ((start is None or segment["end"] is None or not segment["closed"] or segment["end"] >= start)
+              and (stop is None or segment["start"] <= stop)):
+            selected.append(segment)
+    return selected
+
+
+def recording_base_path(directory, now=None):
+    """Returns the path of a new recording without extension, e.g. <directory>/xtream_data_2024-11-20_10-15."""
+    now = now or datetime.now()
+    return os.path.join(directory, f"xtream_data_{now.strftime('%Y-%m-%d_%H-%M')}")
+
+
+def open_recorders(base, formats, channels, devices=None, **options):
+    """
+    Creates one recorder per format ("csv", "xsb", "log") for the files <base>.<format>.
+
+    Raises:
+        OSError, RecorderError: If a file cannot be created. Already opened recorders are closed again.
+    """
+    recorders = []
+    try:
+        for extension in formats:
+            recorders.append(RECORDER_CLASSES[extension](f"{base}.{extension}", channels, devices=devices, **options))
+    except (OSError, RecorderError):
+        for recorder in recorders:
+            recorder.close()
+        raise
+    return recorders
+
+
+# Binärformat (.xsb), alle Werte little-endian:
+#   Dateikopf:  b"XSTREAM1" | uint32 Länge des JSON-Kopfs | JSON {"version", "channels", ["devices"], ...}
+#   Chunk:      b"CHNK" | uint32 Zeilenanzahl n | n x float64 Zeitstempel (Epoch-Sekunden)
+#               | nur mit "devices": n x uint16 Index in die Geräteliste
+#               | n x len(channels) float32 Gaswerte, zeilenweise, fehlende Werte als NaN
+# Ein unvollständiger letzter Chunk (z. B. nach einem Absturz) wird beim Lesen ignoriert.
+BINARY_MAGIC = b"XSTREAM1"
+CHUNK_MAGIC = b"CHNK"
+BINARY_VERSION = 1
+
+
+def _read_binary_header(file, path):
+    magic = file.read(len(BINARY_MAGIC))
+    if magic != BINARY_MAGIC:
+        raise RecorderError(f"{path} is not an X-STREAM binary recording.")
+    (length,) = struct.unpack("<I", file.read(4))
+    header = json.loads(file.read(length).decode("utf-8"))
+    if header.get("version") != BINARY_VERSION:
+        raise RecorderError(f"Unsupported binary recording version {header.get('version')} in {path}.")
+    return header
+
+
+def read_binary_header(path):
+    """Returns the JSON header of a binary recording."""
+    with open_recording(path) as file:
+        return _read_binary_header(file, path)
+
+
+def _row_size(header):
+    return 8 + (2 if header.get("devices") else 0) + 4 * len(header["channels"])
+
+
+class BinaryRecorder(Recorder):
+    """
+    Writes samples in the chunked binary format (.xsb) with float64 epoch timestamps and float32 gas channels.
+    Extra columns are stored as further channels. Every flush appends one chunk, so the file can be read back while
+    it is still being recorded.
+    """
+
+    extension = "xsb"
+
+    def _open(self):
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            header = read_binary_header(self.path)
+            if header["channels"] != self.channels + self.extra_columns or header.get("devices") != self.devices:
+                raise RecorderError(f"{self.path} was recorded with the channels {header['channels']} "
+                                    f"and the devices {header.get('devices')}.")
+            # Einen unvollständigen letzten Chunk abschneiden, bevor angehängt wird
+            end = _complete_length(self.path)
+            self._file = open(self.path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+            self._appended = True
+        else:
+            self._file = open(self.path, "wb")
+            header = {"version": BINARY_VERSION, "channels": self.channels + self.extra_columns, "timestamp": "<f8",
+                      "values": "<f4"}
+            if self.devices:
+                header["devices"] = self.devices
+            header = json.dumps(header).encode("utf-8")
+            self._file.write(BINARY_MAGIC + struct.pack("<I", len(header)) + header)
+            self._file.flush()
+        self._device_index = {device: i for i, device in enumerate(self.devices or [])}
+
+    def _count_rows(self):
+        return _scan_chunks(self.path)[1]
+
+    def _write_rows(self, samples):
+        timestamps = np.fromiter((sample.timestamp for sample in samples), dtype="<f8", count=len(samples))
+        values = np.full((len(samples), len(self.channels) + len(self.extra_columns)), np.nan, dtype="<f4")
+        for row, sample in enumerate(samples):
+            for column, channel in enumerate(self.channels):
+                value = sample.values.get(channel)
+                if value is not None:
+                    values[row, column] = value
+            for column, key in enumerate(self.extra_columns, len(self.channels)):
+                value = sample.stats.get(key)
+                if value is not None:
+                    values[row, column] = value
+        chunk = [CHUNK_MAGIC + struct.pack("<I", len(samples)), timestamps.tobytes()]
+        if self.devices:
+            chunk.append(np.fromiter((self._device_index[sample.device] for sample in samples), dtype="<u2",
+                                     count=len(samples)).tobytes())
+        chunk.append(values.tobytes())
+        self._file.write(b"".join(chunk))
+
+
+RECORDER_CLASSES["xsb"] = BinaryRecorder
+
+
+def _scan_chunks(path):
+    """Returns the file offset behind the last complete chunk of a binary recording and its number of rows."""
+    with open(path, "rb") as file:
+        row_size = _row_size(_read_binary_header(file, path))
+        end = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        total = 0
+        while True:
+            head = file.read(8)
+            if len(head) < 8 or head[:4] != CHUNK_MAGIC:
+                return end, total
+            (rows,) = struct.unpack("<I", head[4:])
+            if end + 8 + rows * row_size > size:
+                return end, total
+            end += 8 + rows * row_size
+            total += rows
+            file.seek(end)
+
+
+def _complete_length(path):
+    """Returns the file offset behind the last complete chunk of a binary recording."""
+    return _scan_chunks(path)[0]
+
+
+def iter_binary_chunks(path, with_devices=False):
+    """
+    Yields the chunks of a binary recording, also of a compressed segment (.xsb.gz, .xsb.zst).
+
+    Returns:
+        Iterator: Tuples (timestamps, values) with shapes (n,) and (n, channels). With with_devices=True, tuples
+        (timestamps, values, device_indices) where device_indices is None for single-device recordings.
+    """
+    with open_recording(path) as file:
+        header = _read_binary_header(file, path)
+        channels = len(header["channels"])
+        has_devices = bool(header.get("devices"))
+        row_size = _row_size(header)
+        while True:
+            head = file.read(8)
+            if len(head) < 8 or head[:4] != CHUNK_MAGIC:
+                return
+            (rows,) = struct.unpack("<I", head[4:])
+            payload = file.read(rows * row_size)
+            if len(payload) < rows * row_size:
+                return
+            timestamps = np.frombuffer(payload, dtype="<f8", count=rows)
+            offset = rows * 8
+            devices = None
+            if has_devices:
+                devices = np.frombuffer(payload, dtype="<u2", count=rows, offset=offset)
+                offset += rows * 2
+            values = np.frombuffer(payload, dtype="<f4", offset=offset).reshape(rows, channels)
+            yield (timestamps, values, devices) if with_devices else (timestamps, values)
+
+
+def read_binary(path, with_devices=False):
+    """
+    Reads a binary recording into NumPy arrays.
+
+    Returns:
+        Tuple: Timestamps (float64, shape (n,)), values (float32, shape (n, channels)) and the channel keys. With
+        with_devices=True, additionally an array with the device name of every row (empty names for single-device
+        recordings).
+    """
+    header = read_binary_header(path)
+    channels = header["channels"]
+    names = np.array(header.get("devices") or [""])
+    chunks = list(iter_binary_chunks(path, with_devices=True))
+    if not chunks:
+        timestamps, values, devices = np.empty(0, dtype="<f8"), np.empty((0, len(channels)), dtype="<f4"), names[:0]
+    else:
+        timestamps = np.concatenate([chunk[0] for chunk in chunks])
+        values = np.concatenate([chunk[1] for chunk in chunks])
+        indices = [chunk[2] if chunk[2] is not None else np.zeros(len(chunk[0]), dtype="<u2") for chunk in chunks]
+        devices = names[np.concatenate(indices)]
+    if with_devices:
+        return timestamps, values, channels, devices
+    return timestamps, values, channels
+
+
+def export_csv(source, destination, timestamp_format=CsvRecorder.timestamp_format):
+    """Exports a binary recording (also a compressed segment) to a CSV file in the format of CsvRecorder."""
+    header = read_binary_header(source)
+    devices = header.get("devices")
+    with open(destination, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Timestamp"] + (["Device"] if devices else []) + header["channels"])
+        for timestamps, values, indices in iter_binary_chunks(source, with_devices=True):
+            for row, (timestamp, row_values) in enumerate(zip(timestamps.tolist(), values.tolist())):
+                writer.writerow([format_timestamp(timestamp, timestamp_format)]
+                                + ([devices[indices[row]]] if devices else [])
+                                + ["" if value != value else round(value, 6) for value in row_values])
+
+
+def export_range(manifest, destination, start=None, stop=None, timestamp_format=CsvRecorder.timestamp_format):
+    """
+    Exports the rows of a segmented CSV or binary recording in [start, stop] (epoch seconds, None for open ends) to
+    one CSV file in the format of CsvRecorder. Only the segments overlapping the range are read; rows are only
+    parsed in segments that extend beyond the range.
+
+    Returns:
+        int: Number of exported rows.
+    """
+    manifest = read_manifest(manifest)
+    if manifest["format"] not in ("csv", "xsb"):
+        raise RecorderError(f"Cannot export a {manifest['format']} recording to CSV.")
+    devices = manifest.get("devices")
+    rows = 0
+    with open(destination, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Timestamp"] + (["Device"] if devices else []) + manifest["columns"])
+        for segment in select_segments(manifest["segments"], start, stop):
+            # Segmente ganz innerhalb des Bereichs werden ohne Zeitvergleich übernommen
+            inside = (segment["closed"] and segment["start"] is not None
+                      and (start is None or segment["start"] >= start) and (stop is None or segment["end"] <= stop))
+            if manifest["format"] == "xsb":
+                for timestamps, values, indices in iter_binary_chunks(segment["path"], with_devices=True):
+                    for row, (timestamp, row_values) in enumerate(zip(timestamps.tolist(), values.tolist())):
+                        if inside or ((start is None or timestamp >= start) and (stop is None or timestamp <= stop)):
+                            writer.writerow([format_timestamp(timestamp, timestamp_format)]
+                                            + ([devices[indices[row]]] if devices else [])
+                                            + ["" if value != value else round(value, 6) for value in row_values])
+                            rows += 1
+                continue
+            with io.TextIOWrapper(open_recording(segment["path"]), newline="") as source:
+                reader = csv.reader(source)
+                next(reader, None)
+                for row in reader:
+                    if not row:
+                        continue
+                    if not inside:
+                        try:
+                            timestamp = parse_timestamp(row[0], timestamp_format)
+                        except ValueError:
+                            continue
+                        if (start is not None and timestamp < start) or (stop is not None and timestamp > stop):
+                            continue
+                    writer.writerow(row)
+                    rows += 1
+    return rows
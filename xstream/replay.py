@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# xstream/replay.py
+"""
+This module provides the replay backend. It feeds a recording back through the acquisition pipeline, so the
+parser, the plot and the recorders can be exercised without an analyzer. Supported sources are CSV recordings, binary
+recordings (.xsb) and raw bottom-line logs (.log, see xstream.recorder.RawLogRecorder), also compressed segments and
+segmented recordings given by their manifest. Values of CSV and binary recordings are turned back into bottom lines
+according to the channel schema, so parsing is replayed as well.
+
+The replay speed is set through the polling period: `period` is the median interval of the recording divided by
+`speed`, a speed of 0 replays as fast as the pipeline can take it.
+"""
+import csv
+import io
+import os
+
+import numpy as np
+
+from xstream.backends import AcquisitionBackend, AcquisitionError, EndOfData
+from xstream.parser import BottomLineParser, DEFAULT_CHANNELS
+from xstream.recorder import (MANIFEST_EXTENSION, CsvRecorder, RecorderError, open_recording,
+                              parse_timestamp, read_binary, read_manifest, read_raw_log, split_compression)
+
+
+def format_bottom_line(channels, values):
+    """Returns the bottom line the analyzer shows for a dictionary channel key -> value."""
+    parts = []
+    for channel in channels:
+        value = values.get(channel.key)
+        if value is not None and value == value:
+            parts.append(f"Ch{channel.id}/R4: {value:.6g} {channel.unit}")
+    return "  ".join(parts)
+
+
+def _load_csv(path, channels, timestamp_format):
+    with io.TextIOWrapper(open_recording(path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if not header or header[0] != "Timestamp":
+            raise AcquisitionError(f"{path} is not an X-STREAM CSV recording.")
+        has_device = len(header) > 1 and header[1] == "Device"
+        keys = header[2:] if has_device else header[1:]
+        timestamps, devices, lines = [], [], []
+        for row in reader:
+            if not row:
+                continue
+            timestamps.append(parse_timestamp(row[0], timestamp_format))
+            devices.append(row[1] if has_device else "")
+            cells = row[2:] if has_device else row[1:]
+            values = {key: float(cell) for key, cell in zip(keys, cells) if cell}
+            lines.append(format_bottom_line(channels, values))
+    return timestamps, devices, lines
+
+
+def _load_binary(path, channels):
+    timestamps, values, keys, devices = read_binary(path, with_devices=True)
+    lines = [format_bottom_line(channels, dict(zip(keys, row))) for row in values.tolist()]
+    return timestamps.tolist(), devices.tolist(), lines
+
+
+def load_recording(path, channels=DEFAULT_CHANNELS, timestamp_format=CsvRecorder.timestamp_format):
+    """
+    Reads a recording as bottom lines.
+
+    Returns:
+        Tuple: Lists of the timestamps, the device names ("" for single-device recordings) and the bottom lines.
+    """
+    if path.lower().endswith(MANIFEST_EXTENSION):
+        # Segmentierte Aufzeichnung: Segmente in ihrer Reihenfolge aneinanderhängen
+        try:
+            segments = read_manifest(path)["segments"]
+        except (OSError, RecorderError) as e:
+            raise AcquisitionError(f"Cannot read recording {path}: {e}") from e
+        timestamps, devices, lines = [], [], []
+        for segment in segments:
+            if segment["rows"] or not segment["closed"]:
+                for result, part in zip((timestamps, devices, lines),
+                                        load_recording(segment["path"], channels, timestamp_format)):
+                    result.extend(part)
+        return timestamps, devices, lines
+    extension = os.path.splitext(split_compression(path)[0])[1].lower()
+    try:
+        if extension == ".csv":
+            return _load_csv(path, channels, timestamp_format)
+        if extension == ".xsb":
+            return _load_binary(path, channels)
+        if extension == ".log":
+            return read_raw_log(path)
+    except (OSError, ValueError, RecorderError) as e:
+        raise AcquisitionError(f"Cannot read recording {path}: {e}") from e
+    raise AcquisitionError(f"Unknown recording format: {path}")
+
+
+def recording_devices(path):
+    """Returns the device names contained in a recording, [""] for single-device recordings."""
+    _, devices, _ = load_recording(path)
+    return list(dict.fromkeys(devices)) or [""]
+
+
+def _sample_interval(timestamps):
+    """Returns the typical time between two samples of a recording in seconds, 1 for a single sample."""
+    if len(timestamps) < 2:
+        return 1.0
+    steps = np.diff(timestamps)
+    if np.any(steps <= 0):
+        # Auf ganze Sekunden gerundete Zeitstempel (ältere CSV-Aufzeichnungen): der Median wäre 0 oder zu groß,
+        # der Mittelwert über die ganze Aufzeichnung bleibt richtig
+        return float(timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+    return float(np.median(steps))
+
+
+class ReplayBackend(AcquisitionBackend):
+    """
+    Replays a recording line by line, one line per read.
+
+    Args:
+        path: Path of the recording (.csv, .xsb or .log, optionally compressed) or of a segment manifest.
+        device: Replay only the rows of this device of a multi-device recording, None replays all rows.
+        speed: Replay speed relative to the recording, 0 for maximum speed.
+        loop: If True, the recording starts over at its end instead of raising EndOfData.
+        channels: Channel schema of the bottom line, see xstream.parser.
+    """
+
+    name = "replay"
+
+    def __init__(self, path, device=None, speed=1.0, loop=False, channels=DEFAULT_CHANNELS):
+        self.parser = BottomLineParser(channels)
+        self.path = path
+        self.device = device
+        self.speed = speed
+        self.loop = loop
+        self.timestamps = []
+        self.lines = []
+        self.position = 0
+        self.period = None
+        self._interval = 1.0
+        self._offset = 0.0
+        self._timestamp = None
+
+    def connect(self):
+        timestamps, devices, lines = load_recording(self.path, self.parser.channels)
+        if self.device is not None:
+            rows = [i for i, device in enumerate(devices) if device == self.device]
+            timestamps, lines = [timestamps[i] for i in rows], [lines[i] for i in rows]
+        if not lines:
+            raise AcquisitionError(f"No samples in {self.path}.")
+        self.timestamps, self.lines = timestamps, lines
+        self.position = 0
+        self._offset = 0.0
+        self._interval = _sample_interval(timestamps)
+        if self._interval <= 0:
+            raise AcquisitionError(f"The samples in {self.path} have no time between them.")
+        self.period = self._interval / self.speed if self.speed else 0.0
+
+    def read_raw(self):
+        if not self.lines:
+            raise AcquisitionError("Not connected.")
+        if self.position >= len(self.lines):
+            if not self.loop:
+                raise EndOfData(f"End of replay {self.path}.")
+            # Zeitstempel beim erneuten Durchlauf fortsetzen, damit sie monoton bleiben
+            self._offset += self.timestamps[-1] - self.timestamps[0] + self._interval
+            self.position = 0
+        self._timestamp = self.timestamps[self.position] + self._offset
+        self.position += 1
+        return self.lines[self.position - 1]
+
+    def timestamp(self):
+        return self._timestamp
+
+    def reconnect(self):
+        # Eine Wiedergabe kann die Verbindung nicht verlieren, die Position bleibt erhalten
+        if not self.lines:
+            self.connect()
+
+
+def replay_backends(path, speed=1.0, loop=False, channels=DEFAULT_CHANNELS):
+    """Returns one ReplayBackend per device of a recording, keyed by device name (the file name for one device)."""
+    devices = recording_devices(path)
+    if devices == [""]:
+        return {os.path.basename(path): ReplayBackend(path, speed=speed, loop=loop, channels=channels)}
+    return {device: ReplayBackend(path, device, speed=speed, loop=loop, channels=channels) for device in devices}
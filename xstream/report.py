@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+# xstream/report.py
+"""
+This module provides the batch post-processing of a folder of recordings: hourly and daily mean, minimum, maximum,
+peak time and time above a threshold per gas and device, written as CSV tables and optionally as a PDF summary.
+
+Every recording (.csv, .xsb, also compressed segments) is summarized by a worker process of a pool. A worker reads
+its file in chunks (see xstream.history._CsvSource and xstream.recorder.iter_binary_chunks) and aggregates each chunk
+with vectorized NumPy reductions into hourly buckets, so the memory use does not depend on the file size. The buckets
+of a file are cached in <out>/report_cache.json, keyed by its size and modification time; running the report again
+after new recordings have arrived only processes the new and the changed files.
+
+Hours are UTC hours (the local hours of all time zones with whole-hour offsets), days are local calendar days. The
+time above a threshold is the sum of the intervals between consecutive samples of a device that end in a sample above
+the threshold; intervals longer than max_gap (connection loss, pauses between runs) are not counted.
+"""
+import csv
+import glob
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from xstream.history import SCAN_BYTES, HistoryError, _CsvSource
+from xstream.recorder import RecorderError, iter_binary_chunks, read_binary_header, split_compression
+
+log = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+CACHE_FILE = "report_cache.json"
+HOURLY_FILE = "hourly.csv"
+DAILY_FILE = "daily.csv"
+PDF_FILE = "report.pdf"
+HOUR = 3600
+# Längstes Intervall zwischen zwei Messungen eines Geräts in s, das noch als Messzeit zählt
+MAX_GAP = 60.0
+RECORDING_EXTENSIONS = (".csv", ".xsb")
+# Geräteindex und Stunde werden zu einem Gruppierungsschlüssel zusammengefasst
+_DEVICES = 65536
+
+
+class ReportError(Exception):
+    """Raised when a recording cannot be summarized."""
+
+
+def find_recordings(folder):
+    """
+    Returns the recordings (.csv, .xsb, also compressed) in a folder, sorted by name. A run recorded in both formats
+    is returned once, as the binary recording, which is read faster.
+    """
+    recordings = {}
+    for path in glob.glob(os.path.join(glob.escape(folder), "*")):
+        stem, extension = os.path.splitext(split_compression(path)[0])
+        if os.path.isfile(path) and extension.lower() in RECORDING_EXTENSIONS:
+            if stem not in recordings or extension.lower() == ".xsb":
+                recordings[stem] = path
+    return sorted(recordings.values())
+
+
+def parse_thresholds(texts):
+    """Parses thresholds given as "GAS=VALUE", e.g. ["CO=0.003", "CH4=1"]."""
+    thresholds = {}
+    for text in texts or ():
+        key, separator, value = text.partition("=")
+        try:
+            thresholds[key.strip()] = float(value)
+        except ValueError:
+            separator = ""
+        if not separator or not key.strip():
+            raise ValueError(f"Invalid threshold {text!r}, expected GAS=VALUE, e.g. CO=0.003.")
+    return thresholds
+
+
+class Bucket:
+    """Aggregates of one device in one period, one entry per gas of the report."""
+
+    def __init__(self, columns, seconds=0.0, counts=None, sums=None, minima=None, maxima=None, peak_times=None,
+                 above=None):
+        self.seconds = seconds  # Gezählte Messzeit
+        self.counts = np.zeros(columns, dtype=np.int64) if counts is None else counts
+        self.sums = np.zeros(columns) if sums is None else sums
+        self.minima = np.full(columns, np.nan) if minima is None else minima
+        self.maxima = np.full(columns, np.nan) if maxima is None else maxima
+        self.peak_times = np.full(columns, np.nan) if peak_times is None else peak_times
+        self.above = np.zeros(columns) if above is None else above  # Sekunden über dem Grenzwert
+
+    def merge(self, other):
+        later = (other.maxima > self.maxima) | (np.isnan(self.maxima) & ~np.isnan(other.maxima))
+        self.peak_times = np.where(later, other.peak_times, self.peak_times)
+        self.maxima = np.fmax(self.maxima, other.maxima)
+        self.minima = np.fmin(self.minima, other.minima)
+        self.seconds += other.seconds
+        self.counts = self.counts + other.counts
+        self.sums = self.sums + other.sums
+        self.above = self.above + other.above
+
+    @property
+    def means(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.counts > 0, self.sums / np.maximum(self.counts, 1), np.nan)
+
+    def to_json(self):
+        def floats(array):
+            return [None if math.isnan(value) else value for value in array.tolist()]
+        return [self.seconds, self.counts.tolist(), self.sums.tolist(), floats(self.minima), floats(self.maxima),
+                floats(self.peak_times), self.above.tolist()]
+
+    @classmethod
+    def from_json(cls, data):
+        seconds, counts, sums, minima, maxima, peak_times, above = data
+
+        def floats(values):
+            return np.array([math.nan if value is None else value for value in values], dtype=np.float64)
+        return cls(len(counts), seconds, np.array(counts, dtype=np.int64), np.array(sums, dtype=np.float64),
+                   floats(minima), floats(maxima), floats(peak_times), np.array(above, dtype=np.float64))
+
+
+def _read_chunks(path):
+    """
+    Reads a recording chunk by chunk.
+
+    Returns:
+        Tuple: The column keys, the device names and an iterator of (timestamps, device indices, values) with values
+        of shape (n, columns).
+    """
+    extension = os.path.splitext(split_compression(path)[0])[1].lower()
+    if extension == ".xsb":
+        header = read_binary_header(path)
+        devices = header.get("devices") or [""]
+
+        def binary_chunks():
+            for timestamps, values, indices in iter_binary_chunks(path, with_devices=True):
+                yield timestamps, np.zeros(len(timestamps), dtype=np.int64) if indices is None else indices, values
+        return header["channels"], devices, binary_chunks()
+    source = _CsvSource(path)
+    devices = [""]
+
+    def csv_chunks():
+        # Gerätenamen werden in der Reihenfolge ihres Auftretens nummeriert
+        numbers = {}
+        try:
+            source.load()
+            position = source.data_offset
+            while position < source.size:
+                data, position = source.read(position, min(position + SCAN_BYTES, source.size))
+                if not data:
+                    break  # Nur noch eine unvollständige letzte Zeile
+                _, timestamps, names, values = source.parse(data)
+                if names is None:
+                    indices = np.zeros(len(timestamps), dtype=np.int64)
+                else:
+                    for name in set(names) - numbers.keys():
+                        numbers[name] = len(numbers)
+                    devices[:] = sorted(numbers, key=numbers.get)
+                    indices = np.array([numbers[name] for name in names], dtype=np.int64)
+                yield timestamps, indices, values
+        finally:
+            source.close()
+    return source.columns, devices, csv_chunks()
+
+
+def _durations(timestamps, devices, last, max_gap):
+    """Returns the interval before every sample to the previous sample of the same device, 0 above max_gap."""
+    durations = np.zeros(len(timestamps))
+    for device in np.unique(devices).tolist():
+        rows = np.flatnonzero(devices == device)
+        times = timestamps[rows]
+        previous = np.concatenate(([last.get(device, np.nan)], times[:-1]))
+        delta = times - previous
+        durations[rows] = np.where((delta >= 0) & (delta <= max_gap), delta, 0.0)
+        last[device] = times[-1]
+    return durations
+
+
+def _aggregate(buckets, timestamps, devices, values, durations, thresholds):
+    """Adds the rows of a chunk to the hourly buckets {(device index, hour): Bucket}."""
+    hours = np.floor(timestamps / HOUR).astype(np.int64)
+    keys, groups = np.unique(hours * _DEVICES + devices, return_inverse=True)
+    order = np.argsort(groups, kind="stable")
+    starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+    values, times, durations = values[order].astype(np.float64), timestamps[order], durations[order]
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    with np.errstate(invalid="ignore"):
+        minima = np.fmin.reduceat(values, starts, axis=0)
+        maxima = np.fmax.reduceat(values, starts, axis=0)
+        # Zeitpunkt des ersten Maximums jeder Gruppe
+        peaks = values == np.repeat(maxima, np.diff(np.append(starts, len(values))), axis=0)
+        peak_times = np.fmin.reduceat(np.where(peaks, times[:, None], np.nan), starts, axis=0)
+        above = np.add.reduceat(np.where(values > thresholds, durations[:, None], 0.0), starts, axis=0)
+    seconds = np.add.reduceat(durations, starts)
+    for i, key in enumerate(keys.tolist()):
+        bucket = Bucket(len(thresholds), float(seconds[i]), counts[i], sums[i], minima[i], maxima[i], peak_times[i],
+                        above[i])
+        key = (key % _DEVICES, key // _DEVICES)
+        if key in buckets:
+            buckets[key].merge(bucket)
+        else:
+            buckets[key] = bucket
+
+
+def summarize_recording(path, gases, thresholds=None, max_gap=MAX_GAP):
+    """
+    Aggregates a recording into hourly buckets. Runs in the worker processes of build_report().
+
+    Args:
+        path: Recording (.csv or .xsb, also compressed).
+        gases: Keys of the reported gases; gases not in the recording stay empty.
+        thresholds: Threshold per gas key for the time above it (optional).
+        max_gap: Longest interval between two samples of a device that is counted, in seconds.
+
+    Returns:
+        Dictionary: {"buckets": [[device name, hour start (epoch seconds), Bucket.to_json()], ...]}, serializable
+        for the cache.
+
+    Raises:
+        ReportError: If the recording cannot be read.
+    """
+    thresholds = thresholds or {}
+    limits = np.array([thresholds.get(gas, np.nan) for gas in gases])
+    try:
+        columns, devices, chunks = _read_chunks(path)
+        positions = [columns.index(gas) if gas in columns else None for gas in gases]
+        buckets = {}
+        last = {}
+        for timestamps, indices, values in chunks:
+            if not len(timestamps):
+                continue
+            selected = np.full((len(timestamps), len(gases)), np.nan)
+            for i, position in enumerate(positions):
+                if position is not None:
+                    selected[:, i] = values[:, position]
+            durations = _durations(timestamps, indices, last, max_gap)
+            _aggregate(buckets, timestamps, indices, selected, durations, limits)
+    except (OSError, ValueError, RecorderError, HistoryError) as e:
+        raise ReportError(f"Cannot summarize {path}: {e}") from e
+    return {"buckets": [[devices[device], hour * HOUR, bucket.to_json()]
+                        for (device, hour), bucket in sorted(buckets.items(), key=lambda item: item[0][::-1])]}
+
+
+def _load_cache(path, options):
+    try:
+        with open(path, encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != REPORT_VERSION or cache.get("options") != options:
+        return {}  # Andere Gase, Grenzwerte oder Lücken: alles neu berechnen
+    return cache.get("files", {})
+
+
+def _save_cache(path, options, files):
+    temporary = path + ".tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"version": REPORT_VERSION, "options": options, "files": files}, file)
+        os.replace(temporary, path)
+    except OSError as e:
+        log.warning("Cannot write the report cache %s: %s", path, e)
+
+
+def build_report(folder, out, gases, thresholds=None, max_gap=MAX_GAP, jobs=None, use_cache=True, pdf=False):
+    """
+    Summarizes all recordings of a folder into <out>/hourly.csv, <out>/daily.csv and with pdf=True <out>/report.pdf.
+
+    Args:
+        folder: Folder with the recordings.
+        out: Output folder, also holds the cache.
+        gases: Keys of the reported gases.
+        thresholds: Threshold per gas key for the time above it (optional).
+        max_gap: Longest interval between two samples of a device that is counted, in seconds.
+        jobs: Number of worker processes, defaults to the number of CPUs.
+        use_cache: If False, every recording is processed again.
+        pdf: If True, the daily summary is also written as a PDF.
+
+    Returns:
+        Tuple: Number of recordings processed and taken from the cache.
+    """
+    thresholds = thresholds or {}
+    os.makedirs(out, exist_ok=True)
+    cache_path = os.path.join(out, CACHE_FILE)
+    options = {"gases": list(gases), "thresholds": thresholds, "max_gap": max_gap}
+    cached = _load_cache(cache_path, options) if use_cache else {}
+    files = {}
+    pending = []
+    for path in find_recordings(folder):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = cached.get(key)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            files[key] = entry
+        else:
+            pending.append((key, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}))
+    from_cache = len(files)
+    if pending:
+        log.info("Summarizing %d recordings, %d unchanged from the cache", len(pending), from_cache)
+        if len(pending) == 1 or jobs == 1:
+            results = ((key, entry, _call(summarize_recording, key, gases, thresholds, max_gap))
+                       for key, entry in pending)
+            _collect(results, files, len(pending))
+        else:
+            with ProcessPoolExecutor(jobs) as executor:
+                futures = {executor.submit(summarize_recording, key, gases, thresholds, max_gap): (key, entry)
+                           for key, entry in pending}
+                results = (futures[future] + (_result(future),) for future in as_completed(futures))
+                _collect(results, files, len(pending))
+        if use_cache:
+            _save_cache(cache_path, options, files)
+
+    hourly, daily = {}, {}
+    for entry in files.values():
+        for device, hour, data in entry["result"]["buckets"]:
+            day = datetime.fromtimestamp(hour).strftime("%Y-%m-%d")
+            for table, period in ((hourly, hour), (daily, day)):
+                if (period, device) in table:
+                    table[period, device].merge(Bucket.from_json(data))
+                else:
+                    table[period, device] = Bucket.from_json(data)
+    write_table(os.path.join(out, HOURLY_FILE), hourly, gases, thresholds,
+                lambda hour: datetime.fromtimestamp(hour).strftime("%Y-%m-%d %H:%M"))
+    write_table(os.path.join(out, DAILY_FILE), daily, gases, thresholds, str)
+    if pdf:
+        write_pdf(os.path.join(out, PDF_FILE), daily, gases, thresholds, folder)
+    return len(pending), from_cache
+
+
+def _call(function, *args):
+    try:
+        return function(*args)
+    except ReportError as e:
+        return e
+
+
+def _result(future):
+    try:
+        return future.result()
+    except ReportError as e:
+        return e
+
+
+def _collect(results, files, total):
+    for done, (key, entry, result) in enumerate(results, 1):
+        if isinstance(result, ReportError):
+            log.warning("%s, skipped", result)
+            continue
+        files[key] = dict(entry, result=result)
+        log.info("[%d/%d] %s", done, total, os.path.basename(key))
+
+
+def _number(value):
+    # Sechs signifikante Stellen verbergen die Rundungsfehler der float32-Werte
+    return "" if math.isnan(value) else f"{value:.6g}"
+
+
+def _time(timestamp):
+    return "" if math.isnan(timestamp) else datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def table_rows(table, gases, thresholds, format_period):
+    """Yields the rows of an hourly or daily table, one per period, device and gas."""
+    for (period, device), bucket in sorted(table.items()):
+        means = bucket.means
+        for i, gas in enumerate(gases):
+            if not bucket.counts[i]:
+                continue
+            row = [format_period(period), device, gas, int(bucket.counts[i]), _number(means[i]),
+                   _number(bucket.minima[i]), _number(bucket.maxima[i]), _time(bucket.peak_times[i])]
+            if thresholds:
+                share = 100.0 * bucket.above[i] / bucket.seconds if bucket.seconds else math.nan
+                row += [thresholds.get(gas, ""), round(bucket.above[i], 1) if gas in thresholds else "",
+                        round(share, 2) if gas in thresholds and bucket.seconds else ""]
+            yield row
+
+
+def table_header(thresholds):
+    return (["Period", "Device", "Gas", "Samples", "Mean", "Min", "Max", "Peak Time"]
+            + (["Threshold", "Above (s)", "Above (%)"] if thresholds else []))
+
+
+def write_table(path, table, gases, thresholds, format_period):
+    with open(path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(table_header(thresholds))
+        writer.writerows(table_rows(table, gases, thresholds, format_period))
+
+
+def write_pdf(path, daily, gases, thresholds, folder):
+    """Writes the daily table as a PDF with Qt, without a display."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QMarginsF, QRectF, Qt
+    from PyQt6.QtGui import QFont, QGuiApplication, QPageLayout, QPageSize, QPainter, QPdfWriter
+
+    # Schriften stehen erst mit einer QGuiApplication zur Verfügung
+    _app = QGuiApplication.instance() or QGuiApplication(["xstream"])
+    writer = QPdfWriter(path)
+    writer.setPageSize(QPageSize(QPageSize.PageSizeId.A4))
+    writer.setPageOrientation(QPageLayout.Orientation.Landscape)
+    writer.setPageMargins(QMarginsF(15, 15, 15, 15), QPageLayout.Unit.Millimeter)
+    writer.setResolution(72)  # Eine Einheit entspricht einem Punkt
+    writer.setTitle("X-STREAM report")
+    painter = QPainter(writer)
+    width = writer.width()
+    height = writer.height()
+    header = table_header(thresholds)
+    # Relative Spaltenbreiten, der Zeitpunkt des Maximums braucht am meisten Platz
+    weights = [1.2, 1.2, 0.7, 0.9, 1.0, 1.0, 1.0, 1.8] + [0.9, 0.9, 0.9][:len(header) - 8]
+    edges = np.concatenate(([0], np.cumsum(weights) / sum(weights) * width)).tolist()
+    line = 14
+    font = QFont("Helvetica", 8)
+    bold = QFont("Helvetica", 8, QFont.Weight.Bold)
+
+    def draw_row(y, cells, row_font):
+        painter.setFont(row_font)
+        for i, cell in enumerate(cells):
+            align = Qt.AlignmentFlag.AlignLeft if i < 3 or i == 7 else Qt.AlignmentFlag.AlignRight
+            painter.drawText(QRectF(edges[i] + 2, y, edges[i + 1] - edges[i] - 4, line),
+                             align | Qt.AlignmentFlag.AlignVCenter, str(cell))
+
+    painter.setFont(QFont("Helvetica", 14, QFont.Weight.Bold))
+    painter.drawText(QRectF(0, 0, width, 24), Qt.AlignmentFlag.AlignLeft, "X-STREAM daily report")
+    painter.setFont(font)
+    painter.drawText(QRectF(0, 24, width, line), Qt.AlignmentFlag.AlignLeft,
+                     f"{os.path.abspath(folder)}, created {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    y = 24 + 2 * line
+    draw_row(y, header, bold)
+    y += line
+    previous = None
+    for row in table_rows(daily, gases, thresholds, str):
+        if y + line > height:
+            writer.newPage()
+            y = 0
+            draw_row(y, header, bold)
+            y += line
+        if row[0] != previous and previous is not None:
+            painter.drawLine(0, int(y), int(width), int(y))  # Trennlinie zwischen den Tagen
+        previous = row[0]
+        draw_row(y, row, font)
+        y += line
+    painter.end()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# xstream/ringbuffer.py
+"""
+This module provides a preallocated NumPy ring buffer for the live time series. Every row is stored twice, at its
+position and one capacity further, so the newest samples always form one contiguous block and can be handed to
+the plot as views without copying.
+"""
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size ring buffer holding timestamps and one column per channel.
+
+    Args:
+        capacity: Maximum number of samples kept.
+        channels: Keys of the channels.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = int(capacity)
+        self.channels = list(channels)
+        self._index = {channel: i for i, channel in enumerate(self.channels)}
+        self._times = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._values = np.full((len(self.channels), 2 * self.capacity), np.nan, dtype=np.float64)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def clear(self):
+        self._count = 0
+
+    def append(self, timestamp, values):
+        """
+        Appends one sample.
+
+        Args:
+            timestamp: Epoch seconds.
+            values: Dictionary channel -> value, missing channels are stored as NaN.
+        """
+        position = self._count % self.capacity
+        row = [values.get(channel, np.nan) for channel in self.channels]
+        for offset in (position, position + self.capacity):
+            self._times[offset] = timestamp
+            self._values[:, offset] = row
+        self._count += 1
+
+    def extend(self, timestamps, values):
+        """Appends many samples at once, values with shape (n, channels)."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        for timestamp, row in zip(timestamps, values):
+            self.append(timestamp, dict(zip(self.channels, row)))
+
+    def _window(self, last):
+        size = len(self) if last is None else min(last, len(self))
+        # Die neueste Zeile liegt in der zweiten Hälfte, davor stehen die älteren lückenlos
+        end = (self._count - 1) % self.capacity + self.capacity + 1 if self._count else self.capacity
+        return slice(end - size, end)
+
+    def times(self, last=None):
+        """Returns a view of the newest timestamps in chronological order."""
+        return self._times[self._window(last)]
+
+    def column(self, channel, last=None):
+        """Returns a view of the newest values of a channel in chronological order."""
+        return self._values[self._index[channel], self._window(last)]
+
+    def latest(self):
+        """Returns the newest sample as (timestamp, {channel: value}) or None."""
+        if not self._count:
+            return None
+        end = self._window(1).stop - 1
+        return self._times[end], {channel: self._values[i, end] for i, channel in enumerate(self.channels)}
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# xstream/splash.py
+"""
+This module provides the splash screen. It only depends on the Qt widgets, so it can be shown before the plotting
+and acquisition modules are imported.
+"""
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QDialog, QLabel, QVBoxLayout
+
+
+class SplashScreen(QDialog):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle('Splash Screen')
+        self.setFixedSize(500, 270)
+        self.setWindowFlag(Qt.WindowType.FramelessWindowHint)
+        self.setStyleSheet('QDialog{background-color: #0000FF; color: white;}')
+
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # Titel mit großem "X"
+        label_title = QLabel(
+            '<span style="font-style:italic; font-size:120px; color: white;'
+            ' text-shadow: -1px -1px 0px white, 1px -1px 0px white, -1px 1px 0px white, 1px 1px 0px white,'
+            ' -2px -2px 0px blue, 2px -2px 0px blue, -2px 2px 0px blue, 2px 2px 0px blue;">X</span> STREAM'
+        )
+        label_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        label_title.setFont(QFont("Arial", 50, QFont.Weight.Bold))
+        label_title.setStyleSheet("color: white; border: 3px solid blue; padding: 10px;")
+        layout.addWidget(label_title)
+
+        layout.addStretch(1)
+
+        # Status-Label für Updates
+        self.status_label = QLabel("Initializing...")
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.status_label.setStyleSheet("font-size: 16px; color: lightgrey;")
+        layout.addWidget(self.status_label)
+
+        layout.addWidget(self.status_label)
+
+        label_version = QLabel('Version 1.0')
+        label_author = QLabel('by David Gansterer-Heider')
+        label_date = QLabel('20.11.2024 IVET')
+        for label in [label_version, label_author, label_date]:
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.setFont(QFont("Arial", 12))
+            label.setStyleSheet("color: white")
+            layout.addWidget(label)
+
+    def update_status(self, message):
+        """Aktualisiert die Statusnachricht."""
+        self.status_label.setText(message)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# xstream/startup.py
+"""
+This module measures the startup of XSTREAM. Phases are marked with `startup.mark(name)` and, if the environment
+variable XSTREAM_STARTUP_REPORT is set (or --startup-report is given), a report is written to stderr:
+
+    startup:    112.4 ms  qt          (+112.4 ms)
+    startup:    131.0 ms  splash      (+18.6 ms)
+    ...
+    startup:    498.7 ms  ready       (+2.3 ms)
+
+The phases up to "ready" (connection dialog shown) are reported at once, the remaining ones ("settings" includes
+the time the user spends in the dialog) when the main window is shown.
+
+The slowest imports of a phase can be found with  python -X importtime xstream.py 2> importtime.txt
+"""
+import os
+import sys
+import time
+
+# Referenzzeitpunkt: erster Import dieses Moduls durch xstream.py bzw. xstream.cli
+_START = time.perf_counter()
+
+enabled = bool(os.environ.get("XSTREAM_STARTUP_REPORT"))
+marks = []
+_reported = 0
+
+
+def mark(name):
+    """Records the end of a startup phase."""
+    marks.append((name, time.perf_counter()))
+
+
+def elapsed():
+    """Returns the seconds since the start."""
+    return time.perf_counter() - _START
+
+
+def report(file=None):
+    """Writes the phases marked since the last report to file (stderr) if the report is enabled."""
+    global _reported
+    if not enabled:
+        return
+    file = file or sys.stderr
+    previous = marks[_reported - 1][1] if _reported else _START
+    for name, moment in marks[_reported:]:
+        print(f"startup: {1000 * (moment - _START):9.1f} ms  {name:<12}(+{1000 * (moment - previous):.1f} ms)",
+              file=file)
+        previous = moment
+    _reported = len(marks)
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+# xstream/stats.py
+"""
+This module provides the streaming statistics of the gas channels and the threshold alarms evaluated on them. For
+every channel the rolling mean, minimum, maximum and standard deviation over one or more time windows, an
+exponentially weighted moving average (EWMA) and the rate of change are updated in O(1) per sample: the windows keep
+running sums and monotonic queues for the extremes instead of rescanning the history.
+
+The stage runs on the acquisition thread (see xstream.acquisition.AcquisitionLoop) and attaches its results to every
+sample, so the GUI, the headless recorder and the recorders all see the same values. Statistics and alarms are
+configured in a JSON file:
+
+    {
+        "windows": [60, 600],
+        "ewma_tau": 30,
+        "rate_window": 60,
+        "log": ["mean", "std", "rate"],
+        "alarms": [
+            {"channel": "O2", "low": 19.5, "hysteresis": 0.2},
+            {"channel": "CO", "high": 0.003, "rate_high": 0.001, "hysteresis": 0.0005}
+        ],
+        "adaptive": {"min_rate": 0.2, "max_rate": 5, "hold": 30, "rate": {"CO2": 0.5, "O2": 0.5},
+                     "deviation": {"CO2": 0.2, "O2": 0.3}}
+    }
+
+Windows are given in seconds of sample time, rates in units per minute. "log" selects the statistics written as extra
+columns of the recordings (true for all), the windowed ones are logged for the first window.
+
+"adaptive" lets the acquisition loop poll between min_rate and max_rate samples per second, see AdaptiveRate: fast
+while the rate of change or the deviation from the EWMA of a channel exceeds its threshold, slower again after hold
+seconds without. The effective rate is recorded in the extra column poll_rate.
+"""
+import json
+import math
+import threading
+from collections import deque
+from dataclasses import replace
+from typing import NamedTuple, Optional
+
+WINDOW_STATS = ("mean", "min", "max", "std")
+STATS = WINDOW_STATS + ("ewma", "rate")
+ALARM_KINDS = ("high", "low", "rate_high", "rate_low")
+ALARM_SOURCES = ("value", "mean", "ewma")
+# Extraspalte mit der effektiven Abfragerate bei adaptiver Abfrage
+POLL_RATE = "poll_rate"
+
+
+def window_label(span):
+    return f"{span:g}s"
+
+
+def column_name(key, stat, window=None):
+    """Returns the key of a statistic in Sample.stats and in the recordings, e.g. "CO2_mean_60s" or "CO2_rate"."""
+    return f"{key}_{stat}_{window_label(window)}" if stat in WINDOW_STATS else f"{key}_{stat}"
+
+
+class RollingWindow:
+    """
+    Statistics of the samples of the last span seconds. Sums are kept relative to an origin sample to avoid
+    cancellation and are recomputed from the window after it has been replaced once, so rounding errors do not
+    accumulate over a long run; this keeps the amortized cost per sample constant.
+
+    Args:
+        span: Length of the window in seconds.
+    """
+
+    def __init__(self, span):
+        self.span = span
+        self._samples = deque()  # (t, v) in zeitlicher Reihenfolge
+        self._minima = deque()  # Kandidaten für das Minimum, Werte aufsteigend
+        self._maxima = deque()  # Kandidaten für das Maximum, Werte absteigend
+        self._evicted = 0
+        self._rebase()
+
+    def _rebase(self):
+        self._origin = self._samples[0] if self._samples else None
+        self._evicted = 0
+        self._n = 0
+        self._sum_v = self._sum_vv = self._sum_t = self._sum_tt = self._sum_tv = 0.0
+        for t, v in self._samples:
+            self._accumulate(t, v, 1)
+
+    def _accumulate(self, t, v, sign):
+        t -= self._origin[0]
+        v -= self._origin[1]
+        self._n += sign
+        self._sum_v += sign * v
+        self._sum_vv += sign * v * v
+        self._sum_t += sign * t
+        self._sum_tt += sign * t * t
+        self._sum_tv += sign * t * v
+
+    def add(self, t, v):
+        if self._origin is None:
+            self._origin = (t, v)
+        self._samples.append((t, v))
+        self._accumulate(t, v, 1)
+        while self._minima and self._minima[-1][1] >= v:
+            self._minima.pop()
+        self._minima.append((t, v))
+        while self._maxima and self._maxima[-1][1] <= v:
+            self._maxima.pop()
+        self._maxima.append((t, v))
+
+        # Messungen entfernen, die aus dem Fenster gefallen sind
+        limit = t - self.span
+        while self._samples[0][0] <= limit:
+            self._accumulate(*self._samples.popleft(), -1)
+            self._evicted += 1
+        while self._minima[0][0] <= limit:
+            self._minima.popleft()
+        while self._maxima[0][0] <= limit:
+            self._maxima.popleft()
+        if self._evicted > len(self._samples):
+            self._rebase()
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def mean(self):
+        return self._origin[1] + self._sum_v / self._n
+
+    @property
+    def min(self):
+        return self._minima[0][1]
+
+    @property
+    def max(self):
+        return self._maxima[0][1]
+
+    @property
+    def std(self):
+        """Sample standard deviation, None for fewer than two samples."""
+        if self._n < 2:
+            return None
+        variance = (self._sum_vv - self._sum_v * self._sum_v / self._n) / (self._n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    @property
+    def slope(self):
+        """Least-squares slope in units per second, None if the window spans no time."""
+        denominator = self._n * self._sum_tt - self._sum_t * self._sum_t
+        if self._n < 2 or denominator <= 0:
+            return None
+        return (self._n * self._sum_tv - self._sum_t * self._sum_v) / denominator
+
+
+class ChannelStatistics:
+    """Rolling windows, EWMA and rate of change of one channel."""
+
+    def __init__(self, windows, ewma_tau, rate_window):
+        self.windows = [RollingWindow(span) for span in windows]
+        self.rate = RollingWindow(rate_window)
+        self.ewma_tau = ewma_tau
+        self.ewma = None
+        self._last_time = None
+
+    def update(self, t, value):
+        if self._last_time is not None:
+            # Uhrsprünge rückwärts würden die Fenster durcheinanderbringen
+            t = max(t, self._last_time)
+        for window in self.windows:
+            window.add(t, value)
+        self.rate.add(t, value)
+        if self.ewma is None or self.ewma_tau <= 0:
+            self.ewma = value
+        else:
+            self.ewma += (1.0 - math.exp(-(t - self._last_time) / self.ewma_tau)) * (value - self.ewma)
+        self._last_time = t
+
+    def results(self, key):
+        results = {}
+        for window in self.windows:
+            label = window_label(window.span)
+            results[f"{key}_mean_{label}"] = window.mean
+            results[f"{key}_min_{label}"] = window.min
+            results[f"{key}_max_{label}"] = window.max
+            results[f"{key}_std_{label}"] = window.std
+        results[f"{key}_ewma"] = self.ewma
+        slope = self.rate.slope
+        results[f"{key}_rate"] = None if slope is None else 60.0 * slope
+        return results
+
+
+class AlarmRule(NamedTuple):
+    """
+    A threshold alarm of one channel. "high" and "rate_high" are raised above the threshold and cleared below
+    threshold - hysteresis, "low" and "rate_low" are raised below the threshold and cleared above threshold +
+    hysteresis. Rate thresholds are given in units per minute.
+    """
+
+    channel: str
+    kind: str  # "high", "low", "rate_high" oder "rate_low"
+    threshold: float
+    hysteresis: float = 0.0
+    source: str = "value"  # Pegelalarme: Messwert, gleitender Mittelwert des ersten Fensters oder EWMA
+    device: Optional[str] = None  # None gilt für alle Analysatoren
+
+    @property
+    def rising(self):
+        return self.kind in ("high", "rate_high")
+
+
+class AlarmEvent(NamedTuple):
+    """An alarm being raised (active=True) or cleared."""
+
+    device: str
+    rule: AlarmRule
+    active: bool
+    value: float
+    timestamp: float
+
+    @property
+    def message(self):
+        prefix = f"{self.device}: " if self.device else ""
+        kind = self.rule.kind.replace("_", " ")
+        unit = "/min" if self.rule.kind.startswith("rate") else ""
+        if not self.active:
+            return f"{prefix}{self.rule.channel} {kind} alarm cleared ({self.value:.4g}{unit})"
+        comparison = ">" if self.rule.rising else "<"
+        return (f"{prefix}{self.rule.channel} {kind} alarm: {self.value:.4g}{unit} {comparison} "
+                f"{self.rule.threshold:g}{unit}")
+
+
+def rules_from_config(entries):
+    """
+    Creates alarm rules from a list of dictionaries {"channel", ["device"], ["source"], ["hysteresis"], and one or more
+    of "high", "low", "rate_high", "rate_low"}.
+    """
+    rules = []
+    for entry in entries:
+        source = entry.get("source", "value")
+        if source not in ALARM_SOURCES:
+            raise ValueError(f"Unknown alarm source {source!r}, expected one of {', '.join(ALARM_SOURCES)}.")
+        kinds = [kind for kind in ALARM_KINDS if kind in entry]
+        if not kinds:
+            raise ValueError(f"Alarm of {entry.get('channel')} has none of {', '.join(ALARM_KINDS)}.")
+        for kind in kinds:
+            rules.append(AlarmRule(entry["channel"], kind, float(entry[kind]), float(entry.get("hysteresis", 0.0)),
+                                   source, entry.get("device")))
+    return tuple(rules)
+
+
+class AdaptiveRate:
+    """
+    Chooses the polling period from the signal dynamics. A sample whose rate of change (linear fit over the rate
+    window) or deviation from the EWMA exceeds the threshold of its channel switches to max_rate at once. After hold
+    seconds of sample time without such a sample, the rate is halved, step by step down to min_rate. Polling starts at
+    max_rate.
+
+    Args:
+        min_rate: Samples per second while all channels are stable.
+        max_rate: Samples per second during transients.
+        rate: Threshold of the rate of change in units per minute, per channel key.
+        deviation: Threshold of the absolute deviation from the EWMA, per channel key.
+        hold: Seconds without an exceeded threshold before each halving of the rate.
+    """
+
+    def __init__(self, min_rate, max_rate, rate=None, deviation=None, hold=30.0):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError(f"Adaptive rates must satisfy 0 < min_rate <= max_rate, got {min_rate} and {max_rate}.")
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.rate = {key: float(value) for key, value in (rate or {}).items()}
+        self.deviation = {key: float(value) for key, value in (deviation or {}).items()}
+        self.hold = float(hold)
+        self.period = 1.0 / self.max_rate
+        self._since = None  # Zeitpunkt der letzten Überschreitung oder Verlangsamung
+        self._lock = threading.Lock()  # Mehrere Geräte werden auf verschiedenen Threads verarbeitet
+
+    @property
+    def keys(self):
+        return set(self.rate) | set(self.deviation)
+
+    def exceeded(self, values, stats):
+        """Returns True if a channel of a sample exceeds its rate or deviation threshold."""
+        for key, threshold in self.rate.items():
+            rate = stats.get(f"{key}_rate")
+            if rate is not None and abs(rate) > threshold:
+                return True
+        for key, threshold in self.deviation.items():
+            value, ewma = values.get(key), stats.get(f"{key}_ewma")
+            if value is not None and ewma is not None and abs(value - ewma) > threshold:
+                return True
+        return False
+
+    def update(self, timestamp, values, stats):
+        """Updates the period with the statistics of a sample and returns it."""
+        exceeded = self.exceeded(values, stats)
+        with self._lock:
+            if exceeded:
+                self.period = 1.0 / self.max_rate
+                self._since = timestamp
+            elif self._since is None or timestamp < self._since:
+                self._since = timestamp
+            elif timestamp - self._since >= self.hold and self.period < 1.0 / self.min_rate:
+                self.period = min(2 * self.period, 1.0 / self.min_rate)
+                self._since = timestamp
+            return self.period
+
+
+def adaptive_from_config(config, keys):
+    """Creates an AdaptiveRate from the "adaptive" dictionary of a statistics file."""
+    adaptive = AdaptiveRate(float(config.get("min_rate", 0.2)), float(config.get("max_rate", 1.0)),
+                            config.get("rate"), config.get("deviation"), float(config.get("hold", 30.0)))
+    unknown = sorted(adaptive.keys - set(keys))
+    if unknown:
+        raise ValueError(f"Adaptive threshold on unknown channel {', '.join(unknown)}.")
+    return adaptive
+
+
+class StatisticsStage:
+    """
+    Streaming statistics and alarms of all channels of one or more analyzers.
+
+    Args:
+        channels: Channel schema, see xstream.parser.
+        windows: Spans of the rolling windows in seconds.
+        ewma_tau: Time constant of the EWMA in seconds.
+        rate_window: Span in seconds of the linear fit that gives the rate of change.
+        rules: AlarmRule instances.
+        log_stats: Names of the statistics written as extra columns of the recordings, see STATS.
+        adaptive: AdaptiveRate choosing the polling period of the acquisition loop (optional). The period in effect
+            when a sample was polled is recorded as POLL_RATE in samples per second.
+    """
+
+    def __init__(self, channels, windows=(60.0,), ewma_tau=30.0, rate_window=60.0, rules=(), log_stats=(),
+                 adaptive=None):
+        self.keys = [channel.key for channel in channels]
+        self.windows = tuple(float(span) for span in windows)
+        if not self.windows or min(self.windows) <= 0 or rate_window <= 0:
+            raise ValueError("Statistics windows must be positive.")
+        self.ewma_tau = ewma_tau
+        self.rate_window = rate_window
+        unknown = sorted({rule.channel for rule in rules} - set(self.keys))
+        if unknown:
+            raise ValueError(f"Alarm on unknown channel {', '.join(unknown)}.")
+        self.rules = tuple(rules)
+        unknown = sorted(set(log_stats) - set(STATS))
+        if unknown:
+            raise ValueError(f"Unknown statistic {', '.join(unknown)}, expected {', '.join(STATS)}.")
+        self.log_stats = tuple(stat for stat in STATS if stat in log_stats)
+        self.adaptive = adaptive
+        self._devices = {}  # Gerätename -> ({Kanal: ChannelStatistics}, {Regelindex: aktiv})
+
+    def log_columns(self):
+        """Returns the names of the extra recording columns, the windowed statistics for the first window."""
+        return ([column_name(key, stat, self.windows[0]) for key in self.keys for stat in self.log_stats]
+                + ([POLL_RATE] if self.adaptive is not None else []))
+
+    def active_alarms(self, device=""):
+        """Returns the currently active alarm rules of a device."""
+        state = self._devices.get(device)
+        return [self.rules[index] for index, active in state[1].items() if active] if state else []
+
+    def process(self, sample):
+        """
+        Updates the statistics with a sample.
+
+        Returns:
+            Sample: The sample with the statistics in Sample.stats and the alarms raised or cleared by it in
+            Sample.alarms. Gap samples are returned unchanged.
+        """
+        if sample.gap or not sample.values:
+            return sample
+        state = self._devices.get(sample.device)
+        if state is None:
+            state = self._devices[sample.device] = (
+                {key: ChannelStatistics(self.windows, self.ewma_tau, self.rate_window) for key in self.keys}, {})
+        channels, alarm_states = state
+        stats = {}
+        for key in self.keys:
+            value = sample.values.get(key)
+            if value is None or value != value:
+                continue
+            channel = channels[key]
+            channel.update(sample.timestamp, value)
+            stats.update(channel.results(key))
+        if self.adaptive is not None:
+            stats[POLL_RATE] = 1.0 / self.adaptive.period
+            self.adaptive.update(sample.timestamp, sample.values, stats)
+
+        events = []
+        for index, rule in enumerate(self.rules):
+            if rule.device is not None and rule.device != sample.device:
+                continue
+            value = self._alarm_value(rule, sample.values, stats)
+            if value is None:
+                continue  # Keine Messung des Kanals, Zustand beibehalten
+            active = alarm_states.get(index, False)
+            if rule.rising:
+                raise_alarm, clear = value > rule.threshold, value < rule.threshold - rule.hysteresis
+            else:
+                raise_alarm, clear = value < rule.threshold, value > rule.threshold + rule.hysteresis
+            if (not active and raise_alarm) or (active and clear):
+                alarm_states[index] = not active
+                events.append(AlarmEvent(sample.device, rule, not active, value, sample.timestamp))
+        return replace(sample, stats=stats, alarms=tuple(events))
+
+    def _alarm_value(self, rule, values, stats):
+        if rule.kind.startswith("rate"):
+            return stats.get(f"{rule.channel}_rate")
+        if rule.source == "mean":
+            return stats.get(column_name(rule.channel, "mean", self.windows[0]))
+        if rule.source == "ewma":
+            return stats.get(f"{rule.channel}_ewma")
+        value = values.get(rule.channel)
+        return None if value is None or value != value else value
+
+
+def statistics_from_config(config, channels):
+    """Creates a StatisticsStage from the dictionary of a statistics file, see the module documentation."""
+    log_stats = config.get("log", ())
+    if log_stats is True:
+        log_stats = STATS
+    elif not log_stats:
+        log_stats = ()
+    return StatisticsStage(channels, windows=config.get("windows", (60.0,)),
+                           ewma_tau=float(config.get("ewma_tau", 30.0)),
+                           rate_window=float(config.get("rate_window", 60.0)),
+                           rules=rules_from_config(config.get("alarms", ())), log_stats=log_stats,
+                           adaptive=adaptive_from_config(config["adaptive"], [channel.key for channel in channels])
+                           if config.get("adaptive") else None)
+
+
+def load_statistics(path, channels):
+    """Reads a statistics file (JSON) and returns its StatisticsStage."""
+    with open(path, encoding="utf-8") as file:
+        return statistics_from_config(json.load(file), channels)
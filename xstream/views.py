@@ -3,23 +3,53 @@
 This module provides interfaces for managing the visualization and storage of gas volume percentages measured by the
 gas analyzer X-STREAM by Emerson. The data is fetched directly from the built-in user interface of the analyzer.
 """
-import csv
+import html
 import os
 import sys
-import collections
+import threading
 import time
-from datetime import datetime
-from PyQt6.QtCore import QTimer, Qt
-from PyQt6.QtGui import QFont, QAction
+from dataclasses import replace
+from PyQt6.QtCore import QCoreApplication, QDateTime, QEvent, QObject, QSettings, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QAction
 from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QGroupBox, \
-    QLabel, QLineEdit, QDialog, QMessageBox, QMenuBar, QFileDialog, QDialogButtonBox
+    QLabel, QLineEdit, QDialog, QMessageBox, QMenuBar, QFileDialog, QDialogButtonBox, QComboBox, QCheckBox, \
+    QTabWidget, QDoubleSpinBox, QDateTimeEdit, QProgressDialog, QApplication
 import pyqtgraph as pg
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import WebDriverException
+from xstream.acquisition import AcquisitionLoop
+from xstream.backends import AcquisitionBackend, AcquisitionError, EndOfData, HttpBackend, SeleniumBackend
+from xstream.decimation import MinMaxPyramid
+from xstream.history import HistoryError, open_history
+from xstream.journal import Journal, JournalError, compatible, finish, find_unfinished, is_unfinished, resume
+from xstream.live import LiveServer
+from xstream.metrics import PLOT, Metrics, MetricsFileWriter, MetricsServer, format_summary, \
+    register_process_metrics
+from xstream.parser import DEFAULT_CHANNELS, channel_keys
+from xstream.recorder import MANIFEST_EXTENSION, RecorderError, export_csv, export_range, open_recorders, \
+    recording_base_path, split_compression
+from xstream.replay import ReplayBackend
+from xstream.ringbuffer import RingBuffer
+from xstream.stats import StatisticsStage, column_name
+
+# Dateifilter der Dialoge zum Öffnen von Aufzeichnungen
+RECORDING_FILTER = "X-STREAM Recordings (*.csv *.xsb *.gz *.zst *.manifest.json)"
+BINARY_RECORDING_FILTER = "X-STREAM Recordings (*.xsb *.xsb.gz *.xsb.zst *.manifest.json)"
+# Anzahl der Messpunkte im Live-Plot (10 Stunden bei 1 Hz)
+PLOT_CAPACITY = 36000
+# Maximale Punktzahl je Kurve in der Gesamtansicht
+HISTORY_MAX_POINTS = 4000
+# Aktualisierungsintervall der Kennzahlen in der Statuszeile in ms
+METRICS_SUMMARY_INTERVAL = 2000
+# Kleinste einstellbare Abfrageperiode eines Analysators in s
+MIN_PERIOD = 0.05
+# Höchstens so viele Neuzeichnungen je Sekunde, unabhängig von der Abfragerate
+DEFAULT_MAX_FPS = 10
+# Verzögerung der Neuzeichnung in der Historienansicht nach Zoom oder Verschieben in ms
+HISTORY_REDRAW_DELAY = 30
+# Vorgeschlagenes Speicherverzeichnis, bis der Benutzer eines wählt
+DEFAULT_SAVE_DIRECTORY = "C:\\Users\\IVET74\\Desktop\\X_Stream_Data"
+# Einstellungen: zuletzt gewähltes Speicherverzeichnis und Journale der noch nicht sauber beendeten Läufe
+SAVE_DIRECTORY_KEY = "recording/save_directory"
+UNFINISHED_RUNS_KEY = "recording/unfinished_runs"
 
 
 def resource_path(relative_path):
@@ -31,65 +61,40 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-class SplashScreen(QDialog):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle('Splash Screen')
-        self.setFixedSize(500, 270)
-        self.setWindowFlag(Qt.WindowType.FramelessWindowHint)
-        self.setStyleSheet('QDialog{background-color: #0000FF; color: white;}')
-
-        self.initUI()
-
-    def initUI(self):
-        layout = QVBoxLayout()
-        self.setLayout(layout)
-
-        # Titel mit großem "X"
-        label_title = QLabel(
-            '<span style="font-style:italic; font-size:120px; color: white;'
-            ' text-shadow: -1px -1px 0px white, 1px -1px 0px white, -1px 1px 0px white, 1px 1px 0px white,'
-            ' -2px -2px 0px blue, 2px -2px 0px blue, -2px 2px 0px blue, 2px 2px 0px blue;">X</span> STREAM'
-        )
-        label_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        label_title.setFont(QFont("Arial", 50, QFont.Weight.Bold))
-        label_title.setStyleSheet("color: white; border: 3px solid blue; padding: 10px;")
-        layout.addWidget(label_title)
-
-        layout.addStretch(1)
-
-        # Status-Label für Updates
-        self.status_label = QLabel("Initializing...")
-        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.status_label.setStyleSheet("font-size: 16px; color: lightgrey;")
-        layout.addWidget(self.status_label)
-
-        layout.addWidget(self.status_label)
-
-        label_version = QLabel('Version 1.0')
-        label_author = QLabel('by David Gansterer-Heider')
-        label_date = QLabel('20.11.2024 IVET')
-        for label in [label_version, label_author, label_date]:
-            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            label.setFont(QFont("Arial", 12))
-            label.setStyleSheet("color: white")
-            layout.addWidget(label)
-
-    def update_status(self, message):
-        """Aktualisiert die Statusnachricht."""
-        self.status_label.setText(message)
-
 class ConnectionDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Connection Settings")
-        self.setFixedSize(400, 170)
+        self.setFixedSize(400, 485)
+
+        self.backend_label = QLabel("Backend:", self)
+        self.backend_input = QComboBox(self)
+        self.backend_input.addItem("HTTP (direct)", HttpBackend.name)
+        self.backend_input.addItem("Selenium (Chrome)", SeleniumBackend.name)
+        self.backend_input.addItem("Replay (recording file)", ReplayBackend.name)
+        self.backend_input.currentIndexChanged.connect(self.update_backend_fields)
 
-        self.login_label = QLabel("Login URL:", self)
+        self.login_label = QLabel("Login URL (several analyzers separated by ;):", self)
         self.login_input = QLineEdit("http://192.168.1.88/login.htm", self)
 
+        self.user_label = QLabel("User:", self)
+        self.user_input = QLineEdit(self)
+        self.password_label = QLabel("Password:", self)
+        self.password_input = QLineEdit(self)
+        self.password_input.setEchoMode(QLineEdit.EchoMode.Password)
+
         self.path_label = QLabel("Webdriver Path:", self)
         self.path_input = QLineEdit("C:\\webdriver\\chromedriver-win64\\chromedriver.exe", self)
+        # Änderungen der Statuszeile im Browser beobachten statt sie jede Sekunde abzufragen
+        self.observe_input = QCheckBox("Capture every change of the bottom line", self)
+        # Hängt der Browser oder wächst sein Speicher, wird nur der Kindprozess neu gestartet
+        self.isolate_input = QCheckBox("Run the analyzer session in a separate process", self)
+
+        self.schema_label = QLabel("Channel Schema (JSON, optional):", self)
+        self.schema_input = QLineEdit(self)
+
+        self.statistics_label = QLabel("Statistics and Alarms (JSON, optional):", self)
+        self.statistics_input = QLineEdit(self)
 
         self.connect_button = QPushButton("Connect", self)
         self.connect_button.clicked.connect(self.accept)
@@ -97,10 +102,22 @@ class ConnectionDialog(QDialog):
         self.cancel_button.clicked.connect(self.reject)
 
         layout = QVBoxLayout()
+        layout.addWidget(self.backend_label)
+        layout.addWidget(self.backend_input)
         layout.addWidget(self.login_label)
         layout.addWidget(self.login_input)
+        layout.addWidget(self.user_label)
+        layout.addWidget(self.user_input)
+        layout.addWidget(self.password_label)
+        layout.addWidget(self.password_input)
         layout.addWidget(self.path_label)
         layout.addWidget(self.path_input)
+        layout.addWidget(self.observe_input)
+        layout.addWidget(self.isolate_input)
+        layout.addWidget(self.schema_label)
+        layout.addWidget(self.schema_input)
+        layout.addWidget(self.statistics_label)
+        layout.addWidget(self.statistics_input)
         layout.addStretch(1)
 
         button_layout = QHBoxLayout()
@@ -109,19 +126,55 @@ class ConnectionDialog(QDialog):
 
         layout.addLayout(button_layout)
         self.setLayout(layout)
+        self.update_backend_fields()
+
+    def update_backend_fields(self):
+        """Aktiviert nur die Eingabefelder, die das gewählte Backend benötigt."""
+        selenium = self.get_backend_name() == SeleniumBackend.name
+        replay = self.get_backend_name() == ReplayBackend.name
+        for widget in (self.path_label, self.path_input, self.observe_input):
+            widget.setEnabled(selenium)
+        for widget in (self.user_label, self.user_input, self.password_label, self.password_input):
+            widget.setEnabled(not selenium and not replay)
+        self.isolate_input.setEnabled(not replay)
+        if replay:
+            self.login_label.setText("Recording (.csv, .xsb or .log):")
+        else:
+            self.login_label.setText("Login URL (several analyzers separated by ;):")
+
+    def get_backend_name(self):
+        return self.backend_input.currentData()
 
     def get_login_url(self):
         return self.login_input.text()
 
+    def get_login_urls(self):
+        return [url.strip() for url in self.login_input.text().split(";") if url.strip()]
+
+    def get_credentials(self):
+        return self.user_input.text(), self.password_input.text()
+
     def get_webdriver_path(self):
         return self.path_input.text()
 
+    def get_observe_changes(self):
+        return self.observe_input.isChecked()
+
+    def get_isolate(self):
+        return self.isolate_input.isEnabled() and self.isolate_input.isChecked()
+
+    def get_schema_path(self):
+        return self.schema_input.text().strip()
+
+    def get_statistics_path(self):
+        return self.statistics_input.text().strip()
+
 
 class SavePathDialog(QDialog):
     def __init__(self, default_path, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Select Save Directory")
-        self.setFixedSize(400, 150)
+        self.setFixedSize(400, 320)
 
         self.save_path = default_path
 
@@ -138,6 +191,30 @@ class SavePathDialog(QDialog):
         browse_button.clicked.connect(self.open_file_system)
         layout.addWidget(browse_button)
 
+        # Aufzeichnungsformat
+        self.format_input = QComboBox()
+        self.format_input.addItem("CSV", ("csv",))
+        self.format_input.addItem("Binary (.xsb)", ("xsb",))
+        self.format_input.addItem("CSV + Binary", ("csv", "xsb"))
+        layout.addWidget(QLabel("Format:"))
+        layout.addWidget(self.format_input)
+
+        # Aufteilung langer Aufzeichnungen in Segmente und deren Kompression
+        self.rotation_input = QComboBox()
+        self.rotation_input.addItem("One file", (None, None))
+        self.rotation_input.addItem("New file every hour", ("hourly", None))
+        self.rotation_input.addItem("New file every day", ("daily", None))
+        self.rotation_input.addItem("New file every 100 MB", (None, 100 * 2 ** 20))
+        self.rotation_input.addItem("New file every 1 GB", (None, 2 ** 30))
+        layout.addWidget(QLabel("Rotation:"))
+        layout.addWidget(self.rotation_input)
+        self.compression_input = QComboBox()
+        self.compression_input.addItem("None", None)
+        self.compression_input.addItem("gzip", "gzip")
+        self.compression_input.addItem("zstd", "zstd")
+        layout.addWidget(QLabel("Compress Closed Files:"))
+        layout.addWidget(self.compression_input)
+
         layout.addStretch(1)
 
         # Speicher- und Schließen-Buttons
@@ -166,6 +243,16 @@ class SavePathDialog(QDialog):
     def get_save_path(self):
         return self.save_path
 
+    def get_formats(self):
+        return self.format_input.currentData()
+
+    def get_rotation(self):
+        """Returns rotate_interval and rotate_size, see xstream.recorder.Recorder."""
+        return self.rotation_input.currentData()
+
+    def get_compression(self):
+        return self.compression_input.currentData()
+
 class StartAcquisitionDialog(QDialog):
             def __init__(self, parent=None):
                 super().__init__(parent)
@@ -204,207 +291,210 @@ class StartAcquisitionDialog(QDialog):
             def get_save_path(self):
                 return self.save_path if hasattr(self, 'save_path') else None
 
-class MainWindow(QMainWindow):
-    def __init__(self, path, login_url, driver, initial_data=None):
-        super().__init__()
-        self.path = path
-        self.login_url = login_url
-        self.driver = driver
-        self.initial_data = initial_data  # Speichere initial_data
-        self.save_directory = "C:\\Users\\IVET74\\Desktop\\X_Stream_Data"
-        self.csv_file = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.fetch_data)
-        self.resize(1000, 700)
-
-        # UI-Komponenten initialisieren
-        self.initialize_plot()
-        self.initUI()
-
-
-    def start_webdriver(self):
-        try:
-            service = Service(executable_path=self.path)
-            self.driver = webdriver.Chrome(service=service)
-
-            self.driver.get(self.login_url)
-            QMessageBox.information(self, "Login", "Please log in on the webpage. Then press OK.")
-
-            main_url = self.driver.current_url
-            self.driver.get(main_url)
-            self.driver.switch_to.frame("unten")
-            return True
-        except WebDriverException:
-            self.show_error_message("Connection failed. Please check WebDriver path.")
-            return False
-
-    def show_error_message(self, message):
-        msg = QMessageBox()
-        msg.setIcon(QMessageBox.Icon.Warning)
-        msg.setWindowTitle("Connection Error")
-        msg.setText(message)
-        msg.setStandardButtons(QMessageBox.StandardButton.Ok)
-        msg.exec()
+class AcquisitionWorker(QObject):
+    """
+    Runs the AcquisitionLoop on its own threads and delivers the parsed samples to the GUI thread through queued
+    signals, so a slow analyzer never blocks the event loop. A LiveServer (optional) receives the samples directly
+    from the acquisition threads, and so does the journal of a recording (set_journal): a sample is journaled before
+    it is queued for the GUI, so a crash or a stalled event loop cannot lose it.
+    """
+    sample_ready = pyqtSignal(object)
+    failed = pyqtSignal(str, str)
+    finished = pyqtSignal(str, str)
+    status_changed = pyqtSignal(str, str, str)
+
+    def __init__(self, backends, period=1.0, metrics=None, statistics=None, live_server=None, parent=None):
+        super().__init__(parent)
+        self.live_server = live_server
+        self.journal = None
+        # Journal und Signal in derselben Reihenfolge, in der die Aufzeichnungen die Messungen erhalten
+        self._journal_lock = threading.Lock()
+        self.loop = AcquisitionLoop(backends, period, on_sample=self._on_sample, on_error=self._on_error,
+                                    on_status=self.status_changed.emit, metrics=metrics, statistics=statistics)
+
+    def _on_sample(self, sample):
+        if self.live_server is not None:
+            self.live_server.publish(sample)
+        with self._journal_lock:
+            if self.journal is not None:
+                self.journal.append(sample)
+            self.sample_ready.emit(sample)
+
+    def set_journal(self, journal):
+        """Journals the samples from now on, None stops. Returns after a running append has finished."""
+        with self._journal_lock:
+            self.journal = journal
+
+    def _on_error(self, device, error):
+        if isinstance(error, EndOfData):
+            self.finished.emit(device, str(error))
+        else:
+            self.failed.emit(device, str(error))
 
-    def initUI(self):
-        self.setWindowTitle("X-Stream Gas Monitoring")
-        menubar = QMenuBar(self)
-        self.setMenuBar(menubar)
-        # Aktion zum Beenden der Anwendung hinzufügen
-        file_menu = menubar.addMenu("Exit")
-        exit_action = QAction("Exit", self)
-        exit_action.setShortcut("Cmd+Q")
+    def is_running(self):
+        return self.loop.is_running()
 
-        exit_action.triggered.connect(self.close)  # Verknüpft die Aktion mit der Schließfunktion
-        file_menu.addAction(exit_action)
+    def start(self):
+        self.loop.start()
 
+    def stop(self, wait=False):
+        self.loop.stop(wait)
 
-        main_layout = QVBoxLayout()
-        main_layout.addWidget(self.create_gas_volume_perc_groupbox())
-        main_layout.addWidget(self.plot_widget)
-
-        # Statusanzeige (Info-Text)
-        self.status_label = QLabel("Status: Ready")
-        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.status_label.setStyleSheet("font-size: 16px; font-weight: bold; color: #333333; padding: 10px;")
-        main_layout.addWidget(self.status_label)
+    def set_period(self, period):
+        self.loop.set_period(period)
 
-        button_layout = QHBoxLayout()
-        self.start_button = QPushButton("Start")
-        self.start_button.clicked.connect(self.start_or_stop_acquisition)
-        button_layout.addStretch(1)
-        button_layout.addWidget(self.start_button, alignment=Qt.AlignmentFlag.AlignRight)
-        main_layout.addLayout(button_layout)
 
-        container = QWidget()
-        container.setLayout(main_layout)
-        self.setCentralWidget(container)
+class LoginPrompt(QObject):
+    """
+    Asks the user to log in on the webpage and blocks until they confirm. Can be called from any thread: a
+    Selenium session restarted in a child process (see xstream.isolation) asks from its acquisition thread.
+    """
+    requested = pyqtSignal(object)
 
-    def update_status_message(self, message):
-        self.status_label.setText(message)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.requested.connect(self._ask)
+
+    def __call__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._ask(None)
+            return
+        # Dialoge nur im GUI-Thread, der aufrufende Thread wartet auf die Bestätigung
+        confirmed = threading.Event()
+        self.requested.emit(confirmed)
+        confirmed.wait()
+
+    def _ask(self, confirmed):
+        QMessageBox.information(None, "Login", "Please log in on the webpage. Then press OK.")
+        if confirmed is not None:
+            confirmed.set()
+
+
+class RenderScheduler(QObject):
+    """
+    Decouples drawing from the acquisition rate. Samples arriving between two frames are merged into one redraw per
+    panel, at most max_fps times per second. Panels that are not visible (another tab, minimized window) are not
+    drawn; they stay pending and are redrawn once as soon as render() is called while they are visible.
+
+    Args:
+        draw: Called with the key of a pending panel to redraw it.
+        is_visible: Called with the key of a panel, returns False while drawing it would be wasted.
+        max_fps: Upper limit of the redraws per second, 0 draws after every event loop pass.
+    """
+
+    def __init__(self, draw, is_visible, max_fps=DEFAULT_MAX_FPS, parent=None):
+        super().__init__(parent)
+        self.draw = draw
+        self.is_visible = is_visible
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.pending = set()
+        self._last_frame = None  # monotonic
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.render)
+
+    def request(self, key):
+        """Marks a panel as changed. The redraw follows with the next frame."""
+        self.pending.add(key)
+        if not self._timer.isActive():
+            wait = 0.0 if self._last_frame is None else self._last_frame + self.interval - time.monotonic()
+            self._timer.start(max(int(wait * 1000), 0))
+
+    def render(self):
+        """Redraws all pending panels that are visible."""
+        self._last_frame = time.monotonic()
+        for key in sorted(self.pending):
+            if self.is_visible(key):
+                self.pending.discard(key)
+                self.draw(key)
+
+
+class DevicePanel(QWidget):
+    """Live values, rolling statistics and plot of one analyzer."""
+
+    def __init__(self, channels, initial_data=None, stats_window=60.0, opengl=False, parent=None):
+        super().__init__(parent)
+        self.channels = channels  # Kanalschema (Schlüssel, Einheit, Farbe, Anzeigename)
+        self.initial_data = initial_data  # Speichere initial_data
+        self.stats_window = stats_window  # Fenster der angezeigten gleitenden Kennzahlen in s
+        self.opengl = opengl  # Kurven mit OpenGL zeichnen
+        self.active_alarms = {}  # Kanal -> Regeln der aktiven Alarme
+        self.latest_sample = None  # Letzte noch nicht angezeigte Messung
 
-    def change_save_path(self):
-        directory = QFileDialog.getExistingDirectory(self, "Select Directory")
-        if directory:
-            self.save_directory = directory
-            QMessageBox.information(self, "Directory Changed", f"Save path set to: {self.save_directory}")
+        self.initialize_plot()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.create_gas_volume_perc_groupbox())
+        layout.addWidget(self.plot_widget)
+        self.setLayout(layout)
 
     def create_gas_volume_perc_groupbox(self):
         """Erstellt die GroupBox für die Anzeige der Gasvolumenprozentsätze."""
-        groupbox = QGroupBox("Gas Volume Percentage")
+        units = {channel.unit for channel in self.channels}
+        groupbox = QGroupBox("Gas Volume Percentage" if units == {"Vol%"} else "Gas Concentration")
         groupbox.setStyleSheet("font-size: 16px; font-weight: bold;")
 
         layout = QHBoxLayout()
         layout.setSpacing(10)
 
         self.data_labels = {}
-        colors = {
-            "CO2": '#808080', "CO": '#000000', "CH4": '#008000', "H2": '#FF0000', "O2": '#0000FF'
-        }
-        gases = [("CO₂:", "CO2"), ("CO:", "CO"), ("CH₄:", "CH4"), ("H₂:", "H2"), ("O₂:", "O2")]
-
-        for gas_name, gas_key in gases:
-            label = QLabel(gas_name)
-            label.setStyleSheet(f"color: {colors[gas_key]}; font-size: 18px; font-weight: bold;")
+        self.stats_labels = {}
+        for channel in self.channels:
+            text = f"{channel.display_name}:" if len(units) == 1 else f"{channel.display_name} [{channel.unit}]:"
+            label = QLabel(text)
+            label.setStyleSheet(f"color: {channel.color}; font-size: 18px; font-weight: bold;")
             line_edit = QLineEdit("---")
             line_edit.setReadOnly(True)
             line_edit.setAlignment(Qt.AlignmentFlag.AlignCenter)
             line_edit.setFixedWidth(80)
-            line_edit.setStyleSheet(f"color: {colors[gas_key]}; font-size: 16px; padding: 5px;")
-            self.data_labels[gas_key] = line_edit
-
+            line_edit.setStyleSheet(f"color: {channel.color}; font-size: 16px; padding: 5px;")
+            self.data_labels[channel.key] = line_edit
+            # Gleitende Kennzahlen unter dem aktuellen Wert
+            stats_label = QLabel("")
+            stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            stats_label.setStyleSheet(f"color: {channel.color}; font-size: 10px; font-weight: normal;")
+            self.stats_labels[channel.key] = stats_label
+
+            value_layout = QVBoxLayout()
+            value_layout.setSpacing(2)
+            value_layout.addWidget(line_edit)
+            value_layout.addWidget(stats_label)
             layout.addWidget(label)
-            layout.addWidget(line_edit)
+            layout.addLayout(value_layout)
 
         layout.addStretch(1)
         groupbox.setLayout(layout)
         return groupbox
 
-    @staticmethod
-    def fetch_initial_data(path, login_url):
-        """
-        Fetches the initial gas data for scaling the Y-axis of the plot.
-        Initializes the WebDriver, navigates to the login page, and extracts data.
-
-        Args:
-            path: Path to the WebDriver executable.
-            login_url: URL of the login page.
-
-        Returns:
-            Tuple: A dictionary containing gas data and the WebDriver instance.
-                   Example: ({"CO2": 0.02, "CO": 0.0, "CH4": 0.01, "H2": 0.11, "O2": 20.95}, driver)
-            (None, None): If an error occurred.
-        """
-        try:
-            # Starte den WebDriver
-            service = Service(executable_path=path)
-            driver = webdriver.Chrome(service=service)
-
-            # Öffne die Login-Seite
-            driver.get(login_url)
-            QMessageBox.information(None, "Login", "Please log in on the webpage. Then press OK.")
-
-            # Wechsel in den richtigen Frame (falls notwendig)
-            driver.switch_to.frame("unten")
-
-            # Warte auf das Element und extrahiere die Daten
-            element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//td[@id="btmline"]'))
-            )
-            raw_text = element.text.strip()
-
-            # Parse die Gasvolumendaten
-            gas_values = {
-                "CO2": float(raw_text.split("Ch1/R4:")[1].split("Vol%")[0].strip()),
-                "CO": float(raw_text.split("Ch2/R4:")[1].split("Vol%")[0].strip()),
-                "CH4": float(raw_text.split("Ch3/R4:")[1].split("Vol%")[0].strip()),
-                "H2": float(raw_text.split("Ch4/R4:")[1].split("Vol%")[0].strip()),
-                "O2": float(raw_text.split("Ch5/R4:")[1].split("Vol%")[0].strip()),
-            }
-
-            #print(f"Initial gas values successfully parsed: {gas_values}")
-            return gas_values, driver
-        except Exception as e:
-            #print(f"Error initializing WebDriver or fetching data: {e}")
-            return None, None
-
-
     def initialize_plot(self):
-        self.plot_widget = pg.PlotWidget()
+        # Mit OpenGL zeichnet pyqtgraph die Kurven über den Viewport auf der Grafikkarte
+        self.plot_widget = pg.PlotWidget(useOpenGL=self.opengl)
         self.plot_widget.setBackground('w')
         self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
-        self.plot_widget.setLabel('left', 'Gas Vol%')
+        units = sorted({channel.unit for channel in self.channels})
+        self.plot_widget.setLabel('left', f"Gas {', '.join(units)}")
         self.plot_widget.setAxisItems({'bottom': pg.DateAxisItem()})
-        self.plot_widget.getViewBox().setMouseEnabled(x=False)
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.handle_x_range_changed)
         self.plot_widget.setLimits(yMin=0, yMax=100)
         self.plot_widget.setTitle("Gas Concentrations Over Time")
+        # Nur den sichtbaren Bereich zeichnen und auf die Pixelbreite reduzieren
+        self.plot_widget.setClipToView(True)
+        self.plot_widget.setDownsampling(auto=True, mode='peak')
 
-        self.time_data = collections.deque(maxlen=1000)
-        self.gas_data = {gas: collections.deque(maxlen=1000) for gas in ["CO2", "CO", "CH4", "H2", "O2"]}
-
-        # Farben für die Gase
-        colors = {
-            "CO2": '#808080', "CO": '#000000', "CH4": '#008000', "H2": '#FF0000', "O2": '#0000FF'
-        }
-
-        # Mapping für chemische Symbole mit tiefgestellten Zahlen
-        gas_labels = {
-            "CO2": "CO₂",
-            "CO": "CO",
-            "CH4": "CH₄",
-            "H2": "H₂",
-            "O2": "O₂",
-        }
+        # Live-Fenster der letzten Messpunkte und vollständige Historie des Laufs
+        self.plot_buffer = RingBuffer(PLOT_CAPACITY, channel_keys(self.channels))
+        self.history = MinMaxPyramid(channel_keys(self.channels))
+        self.show_full_run = True
+        self._updating_plot = False
 
         # Erstelle Kurven und Labels
         self.curves = {}
         self.labels = {}
-        # Schleife zur Erstellung von Kurven und Labels
-        for gas, color in colors.items():
-            self.curves[gas] = self.plot_widget.plot(pen=color, name=gas)
+        # Schleife zur Erstellung von Kurven und Labels (Farbe und Anzeigename aus dem Kanalschema)
+        for channel in self.channels:
+            self.curves[channel.key] = self.plot_widget.plot(pen=channel.color, name=channel.key, connect='finite')
             # Füge das Label mit dem tiefgestellten Text hinzu
-            self.labels[gas] = pg.TextItem(text=gas_labels[gas], color=color, anchor=(0, 1))
-            #self.plot_widget.addItem(self.labels[gas])
+            self.labels[channel.key] = pg.TextItem(text=channel.display_name, color=channel.color, anchor=(0, 1))
 
 
         self.plot_widget.addLegend()
@@ -414,121 +504,541 @@ class MainWindow(QMainWindow):
 
     def apply_initial_data(self):
         """Plottet Initialdaten, falls vorhanden."""
-        time_data = [time.time()]  # Initiale Zeit
-        for gas, value in self.initial_data.items():
-            self.gas_data[gas].append(value)
-            self.curves[gas].setData(x=time_data, y=[value])
-            #self.labels[gas].setPos(time_data[-1], value)
+        timestamp = time.time()  # Initiale Zeit
+        self.plot_buffer.append(timestamp, self.initial_data)
+        self.history.append(timestamp, self.initial_data)
+        self.update_plot()
+
+    def set_show_full_run(self, checked):
+        """Wechselt zwischen der dezimierten Gesamtansicht und dem Live-Fenster."""
+        self.show_full_run = checked
+        self.plot_widget.getViewBox().enableAutoRange(x=True)
+        self.update_plot()
+
+    def handle_x_range_changed(self, *args):
+        """Dezimiert nach Zoom oder Verschieben nur den sichtbaren Bereich neu."""
+        if self.show_full_run and not self._updating_plot:
+            self.update_plot()
 
     def update_plot(self):
         """Aktualisiert den Plot bei neuen Daten."""
-        if len(self.time_data) == 0:
+        if len(self.plot_buffer) == 0:
             return  # Keine Daten vorhanden
 
-        # Zeitdaten in hh:mm:ss umwandeln
-        time_labels = [datetime.fromtimestamp(t).strftime("%H:%M:%S") for t in self.time_data]
+        self._updating_plot = True
+        try:
+            if self.show_full_run:
+                view_box = self.plot_widget.getViewBox()
+                start, stop = self.history.time_range()
+                if not view_box.autoRangeEnabled()[0]:
+                    # Gezoomt: nur den sichtbaren Ausschnitt aus der passenden Ebene holen
+                    start, stop = view_box.viewRange()[0]
+                x_data, y_columns = self.history.query(start, stop, HISTORY_MAX_POINTS)
+                x_limits = self.history.time_range()
+            else:
+                # Zeitstempel und Werte sind Sichten auf den Ringpuffer, es wird nichts kopiert
+                x_data = self.plot_buffer.times()
+                y_columns = {gas: self.plot_buffer.column(gas) for gas in self.curves}
+                x_limits = x_data[0], x_data[-1]
+            self.draw_curves(x_data, y_columns, x_limits)
+        finally:
+            self._updating_plot = False
+
+    def draw_curves(self, x_data, y_columns, x_limits):
+        if len(x_data) == 0:
+            return
+        latest_time, latest_values = self.plot_buffer.latest()
+        for gas, curve in self.curves.items():
+            y_data = y_columns[gas]
+            curve.setData(x=x_data, y=y_data)
+
+            # Labels hinzufügen, falls nicht vorhanden, und ihre Position aktualisieren
+            if not self.labels[gas].parentItem():
+                self.plot_widget.addItem(self.labels[gas])
+            self.labels[gas].setPos(latest_time, latest_values[gas])
+
+        # Die DateAxisItem beschriftet nur die sichtbaren Ticks der echten Zeitstempel
+        self.plot_widget.setLimits(xMin=x_limits[0], xMax=x_limits[1] + 10)  # Pufferbereich für xMax
+
+    def add_sample(self, sample):
+        """Übernimmt eine Messung in die Puffer. Angezeigt wird sie erst mit dem nächsten refresh()."""
+        self.plot_buffer.append(sample.timestamp, sample.values)
+        self.history.append(sample.timestamp, sample.values)
+        self.latest_sample = sample
+        for event in sample.alarms:
+            self.set_alarm(event.rule, event.active)
+
+    def refresh(self):
+        """Zeigt die letzte Messung an und zeichnet den Plot neu, einmal je Frame statt je Messung."""
+        sample, self.latest_sample = self.latest_sample, None
+        if sample is not None:
+            for gas, line_edit in self.data_labels.items():
+                value = sample.values.get(gas)
+                line_edit.setText("---" if value is None else f"{value:.2f}")
+            if sample.stats:
+                self.update_statistics(sample.stats)
+        self.update_plot()
+
+    def update_statistics(self, stats):
+        """Zeigt Mittelwert, Standardabweichung, Spanne, EWMA und Änderungsrate des angezeigten Fensters an."""
+        for gas, label in self.stats_labels.items():
+            mean = stats.get(column_name(gas, "mean", self.stats_window))
+            if mean is None:
+                continue
+            std = stats.get(column_name(gas, "std", self.stats_window))
+            rate = stats.get(column_name(gas, "rate"))
+            label.setText(
+                f"⌀ {mean:.2f} ± {0.0 if std is None else std:.2f}\n"
+                f"{stats[column_name(gas, 'min', self.stats_window)]:.2f} … "
+                f"{stats[column_name(gas, 'max', self.stats_window)]:.2f}\n"
+                f"EWMA {stats[column_name(gas, 'ewma')]:.2f}, {'---' if rate is None else f'{rate:+.3f}'}/min")
+            label.setToolTip(f"Rolling statistics over {self.stats_window:g} s")
+
+    def set_alarm(self, rule, active):
+        """Hebt den Wert eines Kanals hervor, solange einer seiner Alarme aktiv ist."""
+        rules = self.active_alarms.setdefault(rule.channel, set())
+        if active:
+            rules.add(rule)
+        else:
+            rules.discard(rule)
+        line_edit = self.data_labels.get(rule.channel)
+        if line_edit is None:
+            return
+        channel = next(channel for channel in self.channels if channel.key == rule.channel)
+        background = " background-color: #FFC0C0;" if rules else ""
+        line_edit.setStyleSheet(f"color: {channel.color}; font-size: 16px; padding: 5px;{background}")
+        line_edit.setToolTip("\n".join(f"{rule.kind.replace('_', ' ')} alarm" for rule in rules))
 
-        # X-Daten basieren auf den Indizes (beginnend bei 0)
-        x_data = list(range(len(self.time_data)))
 
-        for gas, data in self.gas_data.items():
-            if len(data) > 0:
-                y_data = list(data)
+class MainWindow(QMainWindow):
+    """
+    Main window with one DevicePanel per analyzer.
+
+    Args:
+        backends: Connected backend or dictionary device name -> backend.
+        initial_data: Gas values shown before the acquisition is started, per device.
+        metrics_port: If given, the metrics are served on http://127.0.0.1:<port>/metrics.
+        metrics_file: If given, the metrics are written to this file every 10 seconds.
+        statistics: xstream.stats.StatisticsStage with the windows, logged statistics and alarms, defaults to a
+            60 s window without alarms.
+        max_fps: Upper limit of the plot redraws per second, see RenderScheduler.
+        opengl: If True, the curves are drawn with OpenGL.
+        live_port: If given, the samples are published on http://127.0.0.1:<port>/events, see xstream.live.
+        settings: QSettings keeping the save directory and the journals of running recordings, so the run is
+            recovered after a crash wherever it was recorded. Defaults to the settings of the user.
+    """
+
+    def __init__(self, backends, initial_data=None, metrics_port=None, metrics_file=None, statistics=None,
+                 max_fps=DEFAULT_MAX_FPS, opengl=False, live_port=None, settings=None):
+        super().__init__()
+        if isinstance(backends, AcquisitionBackend):
+            backends, initial_data = {"": backends}, {"": initial_data}
+        self.backends = backends  # Gerätename -> Backend
+        self.channels = next(iter(backends.values())).parser.channels
+        self.initial_data = initial_data or {}  # Speichere initial_data je Gerät
+        self.statistics = statistics or StatisticsStage(self.channels)
+        self.settings = settings if settings is not None else QSettings("X-STREAM", "X-STREAM")
+        self.save_directory = self.settings.value(SAVE_DIRECTORY_KEY, DEFAULT_SAVE_DIRECTORY)
+        self.csv_file = None
+        self.recorders = []
+        self.journal = None
+        self.history_windows = []
+        self.metrics = Metrics()
+        register_process_metrics(self.metrics)
+        self.metrics_exporters = []
+        # Ein belegter Port beendet nicht die Anwendung, die Analysatoren sind bereits verbunden
+        try:
+            if metrics_port:
+                self.metrics_exporters.append(MetricsServer(self.metrics, metrics_port).start())
+            if metrics_file:
+                self.metrics_exporters.append(MetricsFileWriter(self.metrics, metrics_file).start())
+        except OSError as e:
+            self.show_error_message(f"Cannot export metrics: {e}")
+        live_server = None
+        if live_port:
+            try:
+                live_server = LiveServer(live_port, metrics=self.metrics).start()
+                self.metrics_exporters.append(live_server)
+            except OSError as e:
+                self.show_error_message(f"Cannot serve live samples: {e}")
+        # Eine Wiedergabe gibt ihre Periode vor, sonst wird jede Sekunde abgefragt
+        period = min((backend.period for backend in backends.values() if backend.period is not None), default=1.0)
+        self.worker = AcquisitionWorker(backends, period, metrics=self.metrics, statistics=self.statistics,
+                                        live_server=live_server, parent=self)
+        self.worker.sample_ready.connect(self.handle_sample)
+        self.worker.failed.connect(self.handle_acquisition_error)
+        self.worker.finished.connect(self.handle_acquisition_finished)
+        self.worker.status_changed.connect(self.handle_connection_status)
+        self.resize(1000, 700)
 
-                # Synchronisiere die Längen von x_data und y_data
-                min_length = min(len(x_data), len(y_data))
-                x_data_synced = x_data[-min_length:]
-                y_data_synced = y_data[-min_length:]
+        # UI-Komponenten initialisieren
+        self.panels = {device: DevicePanel(self.channels, self.initial_data.get(device), self.statistics.windows[0],
+                                           opengl) for device in backends}
+        self.plot_times = {device: self.metrics.histogram(PLOT, "Time to redraw the live values and the plot of a "
+                                                          "device in seconds.", device=device) for device in backends}
+        self.render_scheduler = RenderScheduler(self.render_panel, self.is_panel_visible, max_fps, parent=self)
+        self.status_message = "Status: Ready"
+        self.initUI()
+        self.recover_unfinished_run()
 
-                # Aktualisiere den Plot
-                self.curves[gas].setData(x=x_data_synced, y=y_data_synced)
+        # Kennzahlen (p95-Zeiten, verspätete Takte, Speicher) regelmäßig unter der Statusmeldung anzeigen
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.refresh_status_label)
+        self.metrics_timer.start(METRICS_SUMMARY_INTERVAL)
 
-                # Labels hinzufügen, falls nicht vorhanden, und ihre Position aktualisieren
-                if not self.labels[gas].parentItem():
-                    self.plot_widget.addItem(self.labels[gas])
 
+    def show_error_message(self, message):
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Icon.Warning)
+        msg.setWindowTitle("Connection Error")
+        msg.setText(message)
+        msg.setStandardButtons(QMessageBox.StandardButton.Ok)
+        msg.exec()
 
-                self.labels[gas].setPos(x_data_synced[-1], y_data_synced[-1])
+    def initUI(self):
+        self.setWindowTitle("X-Stream Gas Monitoring")
+        menubar = QMenuBar(self)
+        self.setMenuBar(menubar)
+        # Aktion zum Beenden der Anwendung hinzufügen
+        file_menu = menubar.addMenu("Exit")
+        exit_action = QAction("Exit", self)
+        exit_action.setShortcut("Cmd+Q")
 
+        exit_action.triggered.connect(self.close)  # Verknüpft die Aktion mit der Schließfunktion
+        file_menu.addAction(exit_action)
 
-        # Dynamische Skalierung der x-Achse basierend auf der Anzahl der Datenpunkte
-        max_x = max(len(self.time_data), 1)
-        self.plot_widget.setLimits(xMin=0, xMax=max_x + 10)  # Pufferbereich für xMax
+        tools_menu = menubar.addMenu("Tools")
+        export_action = QAction("Export Recording to CSV...", self)
+        export_action.triggered.connect(self.export_binary_recording)
+        tools_menu.addAction(export_action)
+        history_action = QAction("Open Recording in History View...", self)
+        history_action.triggered.connect(self.open_history)
+        tools_menu.addAction(history_action)
 
-        # Setze die Ticks der x-Achse mit den Zeitlabels
-        tick_positions = [(i, time_labels[i]) for i in range(len(time_labels)) if
-                          i % max(1, len(time_labels) // 10) == 0]
-        self.plot_widget.getAxis('bottom').setTicks([tick_positions])
 
-    def fetch_data(self):
-        current_time = time.time()
-        self.time_data.append(current_time)
+        main_layout = QVBoxLayout()
+        if len(self.panels) == 1:
+            main_layout.addWidget(next(iter(self.panels.values())))
+        else:
+            # Mehrere Analysatoren: ein Tab je Gerät
+            tabs = QTabWidget()
+            for device, panel in self.panels.items():
+                tabs.addTab(panel, device)
+            # Ein zurückgestellter Tab wird beim Umschalten einmal nachgezeichnet
+            tabs.currentChanged.connect(lambda index: self.render_scheduler.render())
+            main_layout.addWidget(tabs)
 
+        # Statusanzeige (Info-Text)
+        self.status_label = QLabel("Status: Ready")
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.status_label.setStyleSheet("font-size: 16px; font-weight: bold; color: #333333; padding: 10px;")
+        main_layout.addWidget(self.status_label)
+
+        button_layout = QHBoxLayout()
+        self.full_run_checkbox = QCheckBox("Show full run")
+        self.full_run_checkbox.setChecked(True)
+        self.full_run_checkbox.toggled.connect(self.set_show_full_run)
+        button_layout.addWidget(self.full_run_checkbox)
+        button_layout.addSpacing(20)
+        button_layout.addWidget(QLabel("Period (s):"))
+        self.period_input = QDoubleSpinBox()
+        self.period_input.setDecimals(2)
+        self.period_input.setRange(MIN_PERIOD, 3600.0)
+        self.period_input.setSingleStep(0.1)
+        if any(backend.period is not None for backend in self.backends.values()):
+            # Eine Wiedergabe kann auch ohne Wartezeit laufen
+            self.period_input.setMinimum(0.0)
+            self.period_input.setSpecialValueText("max. speed")
+        self.period_input.setValue(self.worker.loop.period)
+        self.period_input.setToolTip("Sampling period, also changeable while the acquisition is running")
+        self.period_input.valueChanged.connect(self.worker.set_period)
+        adaptive = self.worker.loop.adaptive
+        if adaptive is not None:
+            # Die Periode folgt der Signaldynamik, die aktuelle Rate steht in der Statuszeile
+            self.period_input.setEnabled(False)
+            self.period_input.setToolTip(f"Adaptive polling between {adaptive.min_rate:g} and {adaptive.max_rate:g} "
+                                         f"samples per second, see the statistics file")
+        button_layout.addWidget(self.period_input)
+        self.start_button = QPushButton("Start")
+        self.start_button.clicked.connect(self.start_or_stop_acquisition)
+        button_layout.addStretch(1)
+        button_layout.addWidget(self.start_button, alignment=Qt.AlignmentFlag.AlignRight)
+        main_layout.addLayout(button_layout)
+
+        container = QWidget()
+        container.setLayout(main_layout)
+        self.setCentralWidget(container)
+
+    def unfinished_runs(self):
+        """
+        Returns the journals of the runs that were not stopped cleanly (crash, power failure), oldest first: those
+        remembered in the settings, wherever they were recorded, and those in the save directory.
+        """
+        unfinished = set(path for path in self.settings.value(UNFINISHED_RUNS_KEY, [], type=list)
+                         if is_unfinished(path))
+        if self.save_directory and os.path.isdir(self.save_directory):
+            unfinished.update(os.path.abspath(path) for path in find_unfinished(self.save_directory))
+        # Die Namen der Aufzeichnungen enthalten ihre Startzeit
+        return sorted(unfinished, key=lambda path: (os.path.basename(path), path))
+
+    def remember_runs(self):
+        """Stores the journals of the unfinished runs, including the current one, in the settings."""
+        runs = [path for path in self.settings.value(UNFINISHED_RUNS_KEY, [], type=list) if is_unfinished(path)]
+        if self.journal is not None and os.path.abspath(self.journal.directory) not in runs:
+            runs.append(os.path.abspath(self.journal.directory))
+        self.settings.setValue(UNFINISHED_RUNS_KEY, runs)
+        self.settings.sync()
+
+    def recover_unfinished_run(self):
+        """
+        Looks for the journal of a run that was not stopped cleanly, see unfinished_runs(). The samples its
+        recordings are missing are written, the plot is refilled from the journal, and Start continues the same
+        recording. Runs recording other columns are only completed.
+        """
+        unfinished = self.unfinished_runs()
+        if not unfinished:
+            return
+        devices = list(self.backends) if len(self.backends) > 1 else None
+        resumable = compatible(unfinished[-1], channel_keys(self.channels), self.statistics.log_columns(), devices)
         try:
-            element = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//td[@id="btmline"]')))
-            raw_text = element.text.strip()
-
-            gas_values = {
-                "CO2": float(raw_text.split("Ch1/R4:")[1].split("Vol%")[0].strip()),
-                "CO": float(raw_text.split("Ch2/R4:")[1].split("Vol%")[0].strip()),
-                "CH4": float(raw_text.split("Ch3/R4:")[1].split("Vol%")[0].strip()),
-                "H2": float(raw_text.split("Ch4/R4:")[1].split("Vol%")[0].strip()),
-                "O2": float(raw_text.split("Ch5/R4:")[1].split("Vol%")[0].strip()),
-            }
-            for gas, value in gas_values.items():
-                self.gas_data[gas].append(value)
-                self.data_labels[gas].setText(f"{value:.2f}")
-
-            if self.csv_file:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.save_data_to_csv(timestamp, gas_values)
+            for directory in unfinished[:-1] if resumable else unfinished:
+                finish(directory, metrics=self.metrics)
+            if resumable:
+                self.recorders, self.journal, samples, recovered = resume(unfinished[-1], metrics=self.metrics,
+                                                                          tail=PLOT_CAPACITY)
+        except (OSError, RecorderError, JournalError) as e:
+            self.show_error_message(f"Cannot recover the unfinished run {unfinished[-1]}: {e}")
+            return
+        finally:
+            self.remember_runs()
+        if not resumable:
+            return
+        # Ohne Geräteliste wurde mit einem einzigen Analysator aufgezeichnet
+        single = next(iter(self.panels.values())) if len(self.panels) == 1 else None
+        for sample in samples:
+            panel = self.panels.get(sample.device, single)
+            if panel is not None:
+                panel.add_sample(sample)
+        for panel in self.panels.values():
+            if panel.latest_sample is not None:
+                # Das Journal enthält nur die aufgezeichneten Kennzahlen, nicht alle der Anzeige
+                panel.latest_sample = replace(panel.latest_sample, stats={})
+            panel.refresh()
+        self.csv_file = self.recorders[0].path
+        self.update_status_message(f"Recovered unfinished run {self.recorders[0].path} ({recovered} samples "
+                                   f"written), Start continues it")
 
-            self.update_plot()
+    def update_status_message(self, message):
+        self.status_message = message
+        self.refresh_status_label()
+
+    def refresh_status_label(self):
+        self.status_label.setText(
+            f"{html.escape(self.status_message)}<br><span style='font-size: 11px; font-weight: normal;'>"
+            f"{html.escape(format_summary(self.metrics))}</span>")
 
-        except WebDriverException:
-            self.timer.stop()
-            self.show_error_message("Connection lost. Webdriver is closing.")
-            self.driver.quit()
+    def set_save_directory(self, directory):
+        self.save_directory = directory
+        if directory:
+            self.settings.setValue(SAVE_DIRECTORY_KEY, directory)
 
-    def save_data_to_csv(self, timestamp, gas_values):
-        if not os.path.isfile(self.csv_file):
-            with open(self.csv_file, mode="w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["Timestamp", "CO2", "CO", "CH4", "H2", "O2"])
+    def change_save_path(self):
+        directory = QFileDialog.getExistingDirectory(self, "Select Directory")
+        if directory:
+            self.set_save_directory(directory)
+            QMessageBox.information(self, "Directory Changed", f"Save path set to: {self.save_directory}")
 
-        with open(self.csv_file, mode="a", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow([timestamp] + list(gas_values.values()))
+    def set_show_full_run(self, checked):
+        for panel in self.panels.values():
+            panel.set_show_full_run(checked)
+
+    @staticmethod
+    def fetch_initial_data(backend):
+        """
+        Fetches the initial gas data for scaling the Y-axis of the plot.
+        Connects the acquisition backend (HTTP or Selenium) and extracts data.
+
+        Args:
+            backend: Acquisition backend, see xstream.backends.
+
+        Returns:
+            dict: Gas data, e.g. {"CO2": 0.02, "CO": 0.0, "CH4": 0.01, "H2": 0.11, "O2": 20.95}
+            None: If an error occurred. The backend is closed in this case.
+        """
+        try:
+            backend.connect()
+            return backend.read()
+        except AcquisitionError:
+            backend.close()
+            return None
+
+
+    def handle_sample(self, sample):
+        """Übernimmt eine bereits geparste Messung des Erfassungsthreads."""
+        panel = self.panels[sample.device]
+        panel.add_sample(sample)
+        if sample.errors and not sample.gap:
+            prefix = f"{sample.device}: " if sample.device else ""
+            self.update_status_message(f"{prefix}Malformed bottom line: {'; '.join(sample.errors)}")
+        for event in sample.alarms:
+            self.update_status_message(event.message)
+
+        if self.recorders:
+            try:
+                # Im Journal steht die Messung bereits (AcquisitionWorker), die Aufzeichnungen puffern bis zu
+                # flush_interval im Speicher
+                for recorder in self.recorders:
+                    recorder.write(sample)
+            except RecorderError as e:
+                self.stop_recording()
+                self.show_error_message(str(e))
+
+        self.render_scheduler.request(sample.device)
+
+    def render_panel(self, device):
+        with self.plot_times[device].time():
+            self.panels[device].refresh()
+
+    def is_panel_visible(self, device):
+        return not self.isMinimized() and self.panels[device].isVisible()
+
+    def changeEvent(self, event):
+        """Zeichnet nach dem Wiederherstellen des minimierten Fensters einmal nach."""
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange and not self.isMinimized():
+            self.render_scheduler.render()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.render_scheduler.render()
+
+    def handle_connection_status(self, device, state, message):
+        """Zeigt Verbindungsverlust und Wiederverbindung eines Analysators an, die Erfassung läuft weiter."""
+        prefix = f"{device}: " if device else ""
+        self.update_status_message(f"{prefix}{message}")
+
+    def handle_acquisition_finished(self, device, message):
+        """Eine Wiedergabe ist am Ende der Aufzeichnung angekommen."""
+        if self.worker.is_running():
+            self.update_status_message(message)
+            return
+        self.start_button.setText("Start")
+        self.update_status_message(message)
+        self.stop_acquisition()
+
+    def handle_acquisition_error(self, device, message):
+        self.backends[device].close()
+        if self.worker.is_running():
+            # Die übrigen Analysatoren werden weiter abgefragt
+            self.update_status_message(f"{device}: Connection lost. {message}")
+            return
+        self.start_button.setText("Start")
+        self.update_status_message("Connection lost.")
+        self.show_error_message(f"Connection lost. Backend is closing.\n{message}")
+        self.stop_acquisition()
+
+    def stop_acquisition(self):
+        """
+        Stops the acquisition and then the recording. Samples journaled until the acquisition threads have finished
+        are still queued for handle_sample and are written first, so a stopped run leaves no unfinished journal.
+        """
+        self.worker.stop(wait=True)
+        self.worker.set_journal(None)
+        # Nur die wartenden Signale, keine Benutzereingaben. PyQt stellt sie an ein Hilfsobjekt je Verbindung zu.
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.MetaCall)
+        self.stop_recording()
+
+    def stop_recording(self):
+        """Schreibt alle gepufferten Zeilen und schließt die Aufzeichnung, danach das Journal des Laufs."""
+        for recorder in self.recorders:
+            recorder.close()
+        self.recorders = []
+        if self.journal is not None:
+            self.worker.set_journal(None)
+            self.journal.close()
+            self.journal = None
+            self.remember_runs()
+
+    def open_history(self):
+        """Öffnet eine Aufzeichnung in einem eigenen Fenster, die Erfassung läuft weiter."""
+        path, _ = QFileDialog.getOpenFileName(self, "Open Recording", self.save_directory, RECORDING_FILTER)
+        if not path:
+            return
+        window = HistoryWindow(channels=self.channels)
+        self.history_windows = [other for other in self.history_windows if other.isVisible()] + [window]
+        window.show()
+        window.open_recording(path)
+
+    def export_binary_recording(self):
+        """Exportiert eine Binäraufzeichnung (.xsb) oder eine segmentierte Aufzeichnung als CSV-Datei."""
+        source, _ = QFileDialog.getOpenFileName(self, "Open Binary Recording", self.save_directory,
+                                                BINARY_RECORDING_FILTER)
+        if not source:
+            return
+        segmented = source.lower().endswith(MANIFEST_EXTENSION)
+        stem = os.path.splitext(split_compression(source[:-len(MANIFEST_EXTENSION)] if segmented else source)[0])[0]
+        destination, _ = QFileDialog.getSaveFileName(self, "Export CSV", stem + "_export.csv" if segmented
+                                                     else stem + ".csv", "CSV Files (*.csv)")
+        if not destination:
+            return
+        try:
+            if segmented:
+                export_range(source, destination)
+            else:
+                export_csv(source, destination)
+        except (OSError, RecorderError) as e:
+            self.show_error_message(f"Export failed: {e}")
+            return
+        self.update_status_message(f"Exported {source} to {destination}")
 
     def start_or_stop_acquisition(self):
-        if not self.timer.isActive():
+        if not self.worker.is_running():
             path_dialog = SavePathDialog(self.save_directory)
             if path_dialog.exec() == QDialog.DialogCode.Accepted:
-                self.save_directory = path_dialog.get_save_path()
-                if self.save_directory:
-                    now = datetime.now().strftime("%Y-%m-%d_%H-%M")
-                    self.csv_file = os.path.join(self.save_directory, f"xtream_data_{now}.csv")
-                    with open(self.csv_file, mode="w", newline="") as file:
-                        writer = csv.writer(file)
-                        writer.writerow(["Timestamp", "CO2", "CO", "CH4", "H2", "O2"])
-                    self.update_status_message(f"Save selected - Data will be saved to: {self.csv_file}")
+                self.set_save_directory(path_dialog.get_save_path())
+                # Ein wiederhergestellter Lauf wird fortgesetzt, wenn er im gewählten Verzeichnis liegt und dieselben
+                # Formate hat, sonst abgeschlossen
+                if self.recorders and (not self.save_directory or os.path.abspath(self.save_directory)
+                                       != os.path.dirname(os.path.abspath(self.journal.directory))
+                                       or [recorder.extension for recorder in self.recorders]
+                                       != list(path_dialog.get_formats())):
+                    self.stop_recording()
+                if self.save_directory and not self.recorders:
+                    base = recording_base_path(self.save_directory)
+                    rotate_interval, rotate_size = path_dialog.get_rotation()
+                    try:
+                        self.recorders = open_recorders(
+                            base, path_dialog.get_formats(), channel_keys(self.channels),
+                            devices=list(self.backends) if len(self.backends) > 1 else None, metrics=self.metrics,
+                            extra_columns=self.statistics.log_columns(), rotate_interval=rotate_interval,
+                            rotate_size=rotate_size, compression=path_dialog.get_compression())
+                        self.journal = Journal(base, self.recorders, metrics=self.metrics)
+                        self.remember_runs()
+                    except (OSError, RecorderError) as e:
+                        self.stop_recording()
+                        self.show_error_message(f"Cannot create recording {base}: {e}")
+                        return
+                if self.recorders:
+                    self.csv_file = self.recorders[0].path
+                    paths = ", ".join(recorder.path for recorder in self.recorders)
+                    self.update_status_message(f"Save selected - Data will be saved to: {paths}")
                 else:
                     self.csv_file = None
                     self.update_status_message("Discard selected - No data will be saved.")
 
-                self.timer.start(1000)
+                self.worker.set_journal(self.journal)
+                self.worker.start()
                 self.start_button.setText("Stop")
             else:
                 self.update_status_message("Acquisition cancelled.")
         else:
-            self.timer.stop()
+            self.stop_acquisition()
             self.update_status_message("Saving and Plotting stopped.")
             self.start_button.setText("Start")
 
     def closeEvent(self, event):
         """Blockiert das Schließen, wenn der Prozess aktiv ist."""
-        if self.timer.isActive():  # Prüft, ob der Prozess läuft
+        if self.worker.is_running():  # Prüft, ob der Prozess läuft
             reply = QMessageBox.warning(
                 self,
                 "Process Running",
@@ -537,5 +1047,180 @@ class MainWindow(QMainWindow):
             )
             event.ignore()  # Schließen verhindern
         else:
+            self.stop_acquisition()
+            for exporter in self.metrics_exporters:
+                exporter.stop()
+            self.metrics_exporters = []
             event.accept()  # Schließen erlauben
 
+
+class HistoryWindow(QMainWindow):
+    """
+    Viewer for large recordings (.csv, .xsb, compressed or segmented). The recording is opened through its block index
+    (see xstream.history), so only the visible time range is read and drawn with a bounded number of points.
+
+    Args:
+        path: Recording opened on start (optional).
+        channels: Channel schema providing the colors and names of the gas columns.
+    """
+
+    def __init__(self, path=None, channels=DEFAULT_CHANNELS, parent=None):
+        super().__init__(parent)
+        self.channels = {channel.key: channel for channel in channels}
+        self.history = None
+        self.curves = {}
+        self.setWindowTitle("X-Stream History")
+        self.resize(1000, 650)
+
+        # Neu zeichnen erst, wenn sich der sichtbare Bereich eine Weile nicht geändert hat
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(HISTORY_REDRAW_DELAY)
+        self.redraw_timer.timeout.connect(self.redraw)
+
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setBackground('w')
+        self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
+        self.plot_widget.setAxisItems({'bottom': pg.DateAxisItem()})
+        self.plot_widget.setClipToView(True)
+        self.plot_widget.addLegend()
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(lambda *args: self.redraw_timer.start())
+
+        open_button = QPushButton("Open...")
+        open_button.clicked.connect(self.choose_recording)
+        self.device_input = QComboBox()
+        self.device_input.currentIndexChanged.connect(lambda index: self.redraw())
+        self.start_input = QDateTimeEdit()
+        self.stop_input = QDateTimeEdit()
+        for widget in (self.start_input, self.stop_input):
+            widget.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+            widget.setCalendarPopup(True)
+        show_button = QPushButton("Show Range")
+        show_button.clicked.connect(self.show_selected_range)
+        full_button = QPushButton("Full Recording")
+        full_button.clicked.connect(self.show_full_range)
+
+        controls = QHBoxLayout()
+        controls.addWidget(open_button)
+        controls.addWidget(self.device_input)
+        controls.addSpacing(20)
+        controls.addWidget(QLabel("From:"))
+        controls.addWidget(self.start_input)
+        controls.addWidget(QLabel("To:"))
+        controls.addWidget(self.stop_input)
+        controls.addWidget(show_button)
+        controls.addWidget(full_button)
+        controls.addStretch(1)
+
+        self.status_label = QLabel("No recording opened.")
+        self.status_label.setStyleSheet("font-size: 12px; color: #333333; padding: 5px;")
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.plot_widget)
+        layout.addWidget(self.status_label)
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        if path:
+            self.open_recording(path)
+
+    def choose_recording(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Recording", "", RECORDING_FILTER)
+        if path:
+            self.open_recording(path)
+
+    def open_recording(self, path):
+        """Öffnet eine Aufzeichnung, der Index einer CSV-Datei wird beim ersten Öffnen erstellt."""
+        progress_dialog = QProgressDialog(f"Indexing {os.path.basename(path)}...", "Cancel", 0, 1000, self)
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def progress(fraction):
+            progress_dialog.setValue(int(1000 * fraction))
+            QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                raise HistoryError("Indexing cancelled.")
+
+        start = time.perf_counter()
+        try:
+            history = open_history(path, progress=progress)
+        except HistoryError as e:
+            QMessageBox.warning(self, "History", str(e))
+            return
+        finally:
+            progress_dialog.close()
+        if self.history is not None:
+            self.history.close()
+        self.history = history
+        elapsed = time.perf_counter() - start
+
+        self.setWindowTitle(f"X-Stream History - {os.path.basename(path)}")
+        self.device_input.blockSignals(True)
+        self.device_input.clear()
+        self.device_input.addItems(history.devices)
+        self.device_input.setVisible(len(history.devices) > 1)
+        self.device_input.blockSignals(False)
+        self.create_curves()
+
+        time_range = history.time_range()
+        if time_range is None:
+            self.status_label.setText(f"{path}: no samples.")
+            return
+        first, last = (QDateTime.fromSecsSinceEpoch(int(value)) for value in time_range)
+        for widget in (self.start_input, self.stop_input):
+            widget.setDateTimeRange(first, last.addSecs(1))
+        self.start_input.setDateTime(first)
+        self.stop_input.setDateTime(last.addSecs(1))
+        self.status_label.setText(
+            f"{path}: {history.rows} rows from {first.toString('yyyy-MM-dd HH:mm:ss')} to "
+            f"{last.toString('yyyy-MM-dd HH:mm:ss')}, index {'updated from cache' if history.from_cache else 'built'} "
+            f"in {elapsed:.2f} s")
+        self.show_full_range()
+
+    def create_curves(self):
+        """Eine Kurve je Gaskanal des Schemas, ohne passende Kanäle je Spalte der Aufzeichnung."""
+        for curve in self.curves.values():
+            self.plot_widget.removeItem(curve)
+        self.curves = {}
+        columns = [column for column in self.history.columns if column in self.channels] or self.history.columns
+        for i, column in enumerate(columns):
+            channel = self.channels.get(column)
+            pen = channel.color if channel else pg.intColor(i, len(columns))
+            self.curves[column] = self.plot_widget.plot(pen=pen, name=channel.display_name if channel else column,
+                                                        connect='finite')
+        units = sorted({self.channels[column].unit for column in columns if column in self.channels})
+        self.plot_widget.setLabel('left', f"Gas {', '.join(units)}" if units else "")
+
+    def show_full_range(self):
+        if self.history is None or self.history.time_range() is None:
+            return
+        self.plot_widget.setXRange(*self.history.time_range(), padding=0.02)
+        self.redraw()
+
+    def show_selected_range(self):
+        if self.history is None:
+            return
+        start = self.start_input.dateTime().toSecsSinceEpoch()
+        stop = self.stop_input.dateTime().toSecsSinceEpoch()
+        if stop > start:
+            self.plot_widget.setXRange(start, stop, padding=0)
+            self.redraw()
+
+    def redraw(self):
+        """Liest nur den sichtbaren Bereich, dezimiert auf die Breite des Plots."""
+        self.redraw_timer.stop()
+        if self.history is None or not self.curves:
+            return
+        start, stop = self.plot_widget.getViewBox().viewRange()[0]
+        device = self.device_input.currentText() if self.device_input.count() else ""
+        x_data, y_columns = self.history.query(start, stop, device, HISTORY_MAX_POINTS)
+        for column, curve in self.curves.items():
+            curve.setData(x=x_data, y=y_columns[column])
+
+    def closeEvent(self, event):
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        event.accept()